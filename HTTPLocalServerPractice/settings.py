@@ -51,9 +51,71 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'HTTPLocalServerPractice.urls'
 BACKUP_BUCKET_NAME = 'crud-app-404'
+# AWS clients are cached per process; size of each client's connection pool, keep it >= BACKUP_UPLOAD_CONCURRENCY
+AWS_MAX_POOL_CONNECTIONS = 10
+# backups are streamed to S3 as a multipart upload of parts of this size (at least 5 MiB)
+BACKUP_PART_SIZE = 8 * 1024 * 1024
+# number of parts uploaded at the same time
+BACKUP_UPLOAD_CONCURRENCY = 4
+# 'csv', 'csv.gz', 'csv.zst' (needs zstandard) or 'parquet' (needs pyarrow); restore detects the format
+BACKUP_FORMAT = 'csv.gz'
+# backups only upload the rows changed since the previous one; every BACKUP_FULL_EVERY of them a full one is taken
+BACKUP_FULL_EVERY = 24
+# rows written per transaction when restoring a backup
+BACKUP_RESTORE_BATCH_SIZE = 5000
+# split backups into this many objects by objectId range, restored by up to BACKUP_RESTORE_WORKERS processes at once
+BACKUP_SHARDS = 1
+BACKUP_RESTORE_WORKERS = 1
+
+# number of rows inserted per bulk_create call when ingesting CSV files
+CSV_INGEST_BATCH_SIZE = 1000
+# 'python' converts rows one at a time, 'pandas' converts whole columns at once (faster for bulk loads)
+CSV_INGEST_ENGINE = 'python'
+# 'upsert' updates rows whose objectId already exists, 'insert' leaves them untouched
+CSV_INGEST_MODE = 'upsert'
+# number of processes used to ingest a CSV file, 1 ingests it in the calling process
+CSV_INGEST_PROCESSES = 1
+# number of rows of an upload type-checked by its job before anything is written
+CSV_VALIDATION_SAMPLE_ROWS = 100
+# uploads are spooled to this directory and ingested by a background thread pool
+CSV_UPLOAD_SPOOL_DIR = BASE_DIR / 'spool'
+CSV_UPLOAD_WORKERS = 2
+# set to False to ingest uploads inside the request (used by the tests)
+CSV_UPLOAD_JOBS_ASYNC = True
+# rows per page of the listing, and the largest page_size a client may request
+CSV_LIST_PAGE_SIZE = 50
+CSV_LIST_MAX_PAGE_SIZE = 500
+# columns shown when the client does not pick any
+CSV_LIST_DEFAULT_COLUMNS = ['objectId', 'title', 'artistDisplayName', 'department', 'objectDate']
+# number of rows read per query when exporting or backing up the table
+CSV_EXPORT_CHUNK_SIZE = 2000
 
 # for SNS
 SNS_TOPIC_ARN = 'arn:aws:sns:ap-south-1:614238911080:CRUD-App'
+# notifications are queued in the database and published by a background thread; set to False to leave them to
+# the dispatch_notifications command
+NOTIFICATIONS_ASYNC = True
+# failed notifications are retried after NOTIFICATION_RETRY_DELAY seconds, doubling up to NOTIFICATION_MAX_RETRY_DELAY
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_RETRY_DELAY = 2
+NOTIFICATION_MAX_RETRY_DELAY = 600
+# row edits, additions and deletes are sent as one digest per NOTIFICATION_DIGEST_WINDOW seconds, or sooner once
+# NOTIFICATION_DIGEST_MAX_EVENTS of them are waiting
+NOTIFICATION_DIGEST_WINDOW = 60
+NOTIFICATION_DIGEST_MAX_EVENTS = 500
+# only the best SEARCH_MAX_RANKED_MATCHES rows matching a search are listed, 0 lists every match
+SEARCH_MAX_RANKED_MATCHES = 10000
+# listing pages are cached for LISTING_CACHE_TIMEOUT seconds, 0 disables the cache; use a cache backend shared by
+# all processes, such as memcached or redis, when running more than one
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crud-app',
+    },
+}
+LISTING_CACHE_TIMEOUT = 300
+# seconds between two looks of the facet index for rows changed by other processes
+FACET_SYNC_INTERVAL = 5
 
 TEMPLATE_DIR = Path.joinpath(BASE_DIR, Path('templates'))
 
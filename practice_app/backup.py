@@ -0,0 +1,576 @@
+"""
+    Contains the S3 backup and restore of the MuseumAPICSV table.
+
+    Backups are either full or incremental. A manifest in the bucket chains
+    the incremental backups to the full one they build on, and restore
+    replays the chain in order.
+
+    The export is piped straight into an S3 multipart upload: rows are
+    serialized and compressed on the calling thread while the parts already
+    cut are uploaded by a small thread pool, so nothing is written to local
+    disk and the upload overlaps the export.
+"""
+
+import datetime
+import io
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from operator import itemgetter
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from practice_app.events import ACTION_DELETED, send_change
+from practice_app.formats import FORMATS, get_backup_format, ingest_backup, iter_backup_bytes
+from practice_app.ingest import IngestStats, MODE_UPSERT, get_ingest_batch_size, get_ingest_mode
+from practice_app.models import DeletedRow, MuseumAPICSV
+from practice_app.processes import get_process_pool, run_in_worker
+from practice_app.search import suspend_search_index
+from .utils import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+BACKUP_KEY_PREFIX = 'museum_data'
+MANIFEST_KEY = f'{BACKUP_KEY_PREFIX}/manifest.json'
+DEFAULT_FULL_BACKUP_INTERVAL = 24
+# S3 rejects multipart parts smaller than 5 MiB, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_CONCURRENCY = 4
+# modifiedAt and deletedAt are stamped when a row is written, not when its
+# transaction commits: deltas re-read this much before the previous backup
+DELTA_OVERLAP = datetime.timedelta(seconds=60)
+
+
+class TransferStats:
+    """
+    Counts the bytes and parts moved to or from S3 and the time it took.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.parts = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def finish(self):
+        self.finished = time.perf_counter()
+        return self
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def mb_per_sec(self):
+        elapsed = self.elapsed
+        return self.bytes / (1024 * 1024) / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'bytes': self.bytes,
+            'parts': self.parts,
+            'seconds': round(self.elapsed, 3),
+            'mb_per_sec': round(self.mb_per_sec, 2),
+        }
+
+
+def get_backup_part_size():
+    """
+    :return: size in bytes of the parts of a multipart backup upload
+    """
+    return max(getattr(settings, 'BACKUP_PART_SIZE', DEFAULT_PART_SIZE), MIN_PART_SIZE)
+
+
+def get_backup_concurrency():
+    """
+    :return: number of parts uploaded at the same time
+    """
+    return max(getattr(settings, 'BACKUP_UPLOAD_CONCURRENCY', DEFAULT_CONCURRENCY), 1)
+
+
+def iter_parts(chunks, part_size):
+    """
+    Regroups a stream of byte strings into parts of exactly part_size bytes,
+    the last part holding whatever is left. At least one part is yielded.
+    :param chunks: iterable of bytes
+    :param part_size: size of the parts in bytes
+    :return: generator of bytes
+    """
+    buffer = bytearray()
+    yielded = False
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+            yielded = True
+    if buffer or not yielded:
+        yield bytes(buffer)
+
+
+def _upload_part(s3, bucket, key, upload_id, number, body):
+    response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+    return {'PartNumber': number, 'ETag': response['ETag']}
+
+
+def upload_stream(s3, bucket, key, chunks, part_size=None, concurrency=None):
+    """
+    Uploads a stream of byte strings to S3 as a multipart upload. At most
+    concurrency parts are in flight, so memory use is bounded by about
+    (concurrency + 1) * part_size. The upload is aborted if anything fails.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param key: object key
+    :param chunks: iterable of bytes
+    :param part_size: size of the parts in bytes, defaults to BACKUP_PART_SIZE
+    :param concurrency: number of parts uploaded at the same time, defaults
+        to BACKUP_UPLOAD_CONCURRENCY
+    :return: TransferStats object
+    """
+    part_size = part_size or get_backup_part_size()
+    concurrency = concurrency or get_backup_concurrency()
+    stats = TransferStats()
+
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+    parts = []
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='s3-part') as executor:
+            pending = set()
+            for number, body in enumerate(iter_parts(chunks, part_size), start=1):
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    parts.extend(future.result() for future in done)
+                pending.add(executor.submit(_upload_part, s3, bucket, key, upload_id, number, body))
+                stats.bytes += len(body)
+                stats.parts += 1
+            parts.extend(future.result() for future in pending)
+
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': sorted(parts, key=itemgetter('PartNumber'))},
+        )
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+    return stats.finish()
+
+
+def get_backup_key(backup_format):
+    """
+    :param backup_format: one of FORMATS
+    :return: S3 key of a single file backup in that format, e.g.
+        museum_data.csv.gz, as written before incremental backups
+    """
+    return f'{BACKUP_KEY_PREFIX}.{backup_format}'
+
+
+def get_full_backup_interval():
+    """
+    :return: number of incremental backups taken before the next full one
+    """
+    return getattr(settings, 'BACKUP_FULL_EVERY', DEFAULT_FULL_BACKUP_INTERVAL)
+
+
+def load_manifest(s3, bucket):
+    """
+    Loads the manifest chaining the incremental backups to the last full one.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :return: dict with the 'full' entry and the list of 'deltas' entries,
+        or None if no backup was taken yet
+    """
+    try:
+        body = s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)['Body']
+    except ClientError as cl_e:
+        if cl_e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+    try:
+        return json.loads(body.read())
+    finally:
+        body.close()
+
+
+def save_manifest(s3, bucket, manifest):
+    """
+    Writes the manifest. It is written after the backup it describes, so a
+    failed backup leaves the previous chain intact.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param manifest: dict as returned by load_manifest
+    """
+    s3.put_object(Bucket=bucket, Key=MANIFEST_KEY, Body=json.dumps(manifest, indent=2).encode('utf-8'))
+
+
+def get_backup_shards():
+    """
+    :return: number of objects a backup is split into, by objectId range
+    """
+    return max(getattr(settings, 'BACKUP_SHARDS', 1), 1)
+
+
+def get_restore_workers():
+    """
+    :return: number of processes restoring the shards of a backup at once,
+        1 restoring them one after the other in the calling process
+    """
+    return max(getattr(settings, 'BACKUP_RESTORE_WORKERS', 1), 1)
+
+
+def compute_shard_bounds(queryset, shards):
+    """
+    Splits a queryset into at most shards objectId ranges holding roughly
+    the same number of rows. The first and last ranges are open ended, so
+    rows written while the backup runs still fall in a shard.
+    :param queryset: QuerySet of MuseumAPICSV
+    :param shards: desired number of shards
+    :return: list of (first, end) tuples; first is the smallest objectId of
+        the range and end the first objectId after it, None meaning unbounded
+    """
+    count = queryset.count() if shards > 1 else 0
+    shards = min(shards, count)
+    if shards <= 1:
+        return [(None, None)]
+    ordered = queryset.order_by('pk').values_list('pk', flat=True)
+    # one OFFSET query per boundary, run once per backup
+    starts = [None] + [ordered[count * index // shards] for index in range(1, shards)]
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def get_entry_keys(entry):
+    """
+    :param entry: manifest entry
+    :return: S3 keys of the objects holding the backup of the entry
+    """
+    if 'shards' in entry:
+        return [shard['key'] for shard in entry['shards']]
+    return [entry['key']]
+
+
+def get_delta_start(manifest):
+    """
+    :param manifest: manifest of the current chain
+    :return: time from which the next incremental backup reads the changes
+    """
+    return parse_datetime(manifest['until']) - DELTA_OVERLAP
+
+
+def has_pending_deletes(s3, bucket):
+    """
+    Tells whether rows were deleted since the last backup, which the next
+    one must carry even if the table is now empty.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :return: bool
+    """
+    manifest = load_manifest(s3, bucket)
+    return manifest is not None and DeletedRow.objects.filter(deletedAt__gte=get_delta_start(manifest)).exists()
+
+
+def backup_to_s3(s3, bucket, backup_format=None, full=None, shards=None, part_size=None, concurrency=None):
+    """
+    Streams a backup of the table to S3 and records it in the manifest.
+
+    A full backup exports every row. An incremental one exports only the
+    rows whose modifiedAt is not older than the start of the previous
+    backup, less DELTA_OVERLAP, plus the objectIds deleted since then, so
+    its cost follows the write volume rather than the table size. Tombstones
+    are purged by a full backup only once its manifest is saved. Every
+    BACKUP_FULL_EVERY incremental backups a full one is taken instead, which
+    starts a new chain.
+
+    With more than one shard the rows are split by objectId range into
+    separate objects, which restore can load concurrently.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param backup_format: one of FORMATS, defaults to settings.BACKUP_FORMAT
+    :param full: True or False to force the kind of backup, by default it is
+        full when there is no manifest yet or the chain is long enough
+    :param shards: number of objects to split the backup into, defaults to
+        settings.BACKUP_SHARDS
+    :param part_size: size of the parts in bytes
+    :param concurrency: number of parts uploaded at the same time
+    :return: tuple of manifest entry of the backup and TransferStats object
+    """
+    backup_format = backup_format or get_backup_format()
+    manifest = load_manifest(s3, bucket)
+    if manifest is None:
+        full = True
+    elif full is None:
+        full = len(manifest['deltas']) >= get_full_backup_interval()
+
+    # taken before reading any row, so that the next delta starts from here
+    started_at = timezone.now()
+    kind = 'full' if full else 'delta'
+    name = f'{BACKUP_KEY_PREFIX}/{kind}-{started_at:%Y%m%dT%H%M%S%fZ}'
+    entry = {
+        'format': backup_format,
+        'since': None if full else manifest['until'],
+        'until': started_at.isoformat(),
+        'deleted': [],
+    }
+    if full:
+        queryset = MuseumAPICSV.objects.all()
+    else:
+        # rows written by a transaction that was still open when the previous
+        # backup read the table are stamped before its start; restoring a
+        # delta is an upsert, so rows read twice are harmless
+        since = get_delta_start(manifest)
+        queryset = MuseumAPICSV.objects.filter(modifiedAt__gte=since)
+        entry['deleted'] = list(
+            DeletedRow.objects.filter(deletedAt__gte=since).order_by('pk').values_list('pk', flat=True)
+        )
+
+    bounds = compute_shard_bounds(queryset, shards or get_backup_shards())
+    if len(bounds) == 1:
+        entry['key'] = f'{name}.{backup_format}'
+        stats = upload_stream(s3, bucket, entry['key'], iter_backup_bytes(backup_format, queryset), part_size,
+                              concurrency)
+    else:
+        entry['shards'] = []
+        stats = TransferStats()
+        for index, (first, end) in enumerate(bounds):
+            shard = queryset
+            if first is not None:
+                shard = shard.filter(pk__gte=first)
+            if end is not None:
+                shard = shard.filter(pk__lt=end)
+            key = f'{name}.part{index:03d}.{backup_format}'
+            shard_stats = upload_stream(s3, bucket, key, iter_backup_bytes(backup_format, shard), part_size,
+                                        concurrency)
+            entry['shards'].append({'key': key, 'first': first, 'end': end})
+            stats.bytes += shard_stats.bytes
+            stats.parts += shard_stats.parts
+        stats.finish()
+
+    if full:
+        manifest = {'full': entry, 'deltas': []}
+    else:
+        manifest['deltas'].append(entry)
+    manifest['until'] = entry['until']
+    save_manifest(s3, bucket, manifest)
+    if full:
+        # the snapshot now in the manifest already reflects these deletes;
+        # until then the previous chain still needs them
+        DeletedRow.objects.filter(deletedAt__lt=started_at - DELTA_OVERLAP).delete()
+
+    logger.info('Backed up to s3://%s/%s: %s', bucket, name, stats.as_dict())
+    return entry, stats
+
+
+def find_latest_backup(s3, bucket):
+    """
+    Returns the key of the most recent single file backup, whatever its
+    format, for buckets backed up before the manifest existed.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :return: S3 key or None if there is no backup
+    """
+    latest = None
+    for backup_format in FORMATS:
+        key = get_backup_key(backup_format)
+        try:
+            modified = s3.head_object(Bucket=bucket, Key=key)['LastModified']
+        except ClientError as cl_e:
+            if cl_e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                continue
+            raise
+        if latest is None or modified > latest[0]:
+            latest = (modified, key)
+    return latest and latest[1]
+
+
+class CountingStream(io.RawIOBase):
+    """
+    Read-only file object over an S3 body counting the bytes read, so
+    restores can report how much of a backup was consumed.
+    """
+
+    def __init__(self, raw, counter):
+        super().__init__()
+        self.raw = raw
+        self.counter = counter
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.raw.read() if size is None or size < 0 else self.raw.read(size)
+        self.counter[0] += len(data)
+        return data
+
+    def readinto(self, target):
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def get_restore_batch_size():
+    """
+    :return: number of rows written per transaction when restoring
+    """
+    return getattr(settings, 'BACKUP_RESTORE_BATCH_SIZE', None) or get_ingest_batch_size()
+
+
+def get_restore_chain(s3, bucket):
+    """
+    Returns the backups to replay, oldest first: the last full backup and the
+    incremental ones taken after it, or the most recent single file backup
+    when the bucket has no manifest.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :return: list of manifest entries, empty if there is nothing to restore
+    """
+    manifest = load_manifest(s3, bucket)
+    if manifest is not None:
+        return [manifest['full'], *manifest['deltas']]
+    key = find_latest_backup(s3, bucket)
+    return [] if key is None else [{'key': key, 'deleted': []}]
+
+
+def get_chain_size(s3, bucket, chain):
+    """
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param chain: list of manifest entries
+    :return: total size in bytes of the backups of the chain
+    """
+    return sum(
+        s3.head_object(Bucket=bucket, Key=key)['ContentLength'] for entry in chain for key in get_entry_keys(entry)
+    )
+
+
+def restore_object(s3, bucket, key, mode=None, batch_size=None, progress=None, counter=None):
+    """
+    Streams one backup object from S3 into the table, writing batch_size
+    rows per transaction. The format is detected from the first bytes of
+    the object, so it does not depend on the key.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param key: S3 key of the backup
+    :param mode: 'insert' or 'upsert', defaults to settings.CSV_INGEST_MODE
+    :param batch_size: number of rows per batch, defaults to
+        settings.BACKUP_RESTORE_BATCH_SIZE
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param counter: optional one item list the number of bytes read from S3
+        is added to
+    :return: IngestStats object
+    """
+    counter = counter if counter is not None else [0]
+    body = CountingStream(s3.get_object(Bucket=bucket, Key=key)['Body'], counter)
+    try:
+        stats = ingest_backup(body, batch_size=batch_size or get_restore_batch_size(), progress=progress, mode=mode)
+    finally:
+        body.close()
+    logger.info('Restored s3://%s/%s: %s', bucket, key, stats.as_dict())
+    return stats
+
+
+def _restore_shard(bucket, key, mode, batch_size):
+    # runs in a worker process, which has its own S3 client and connection
+    counter = [0]
+    stats = restore_object(get_s3_client('default'), bucket, key, mode, batch_size, counter=counter)
+    return stats, counter[0]
+
+
+def restore_chain(s3, bucket, chain, mode=None, batch_size=None, progress=None, workers=None):
+    """
+    Replays backups in order, each one deleting its tombstoned rows and
+    then writing its rows. Memory use is bounded by the batch size whatever
+    the size of the backups.
+
+    The shards of a sharded backup cover disjoint objectId ranges, so with
+    more than one worker they are restored concurrently by a pool of
+    processes, each with its own database connection.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param chain: list of manifest entries, as returned by get_restore_chain
+    :param mode: 'insert' or 'upsert' for the first backup, defaults to
+        settings.CSV_INGEST_MODE; the incremental ones are always upserted
+    :param batch_size: number of rows per batch
+    :param progress: optional callable invoked with an IngestStats covering
+        the whole chain, whose bytes_read is the number of bytes read from
+        S3 so far; called after every batch, or after every shard when
+        shards are restored by worker processes
+    :param workers: number of worker processes, defaults to
+        settings.BACKUP_RESTORE_WORKERS
+    :return: IngestStats object
+    """
+    mode = mode or get_ingest_mode()
+    batch_size = batch_size or get_restore_batch_size()
+    workers = workers or get_restore_workers()
+    total = IngestStats(mode)
+    counter = [0]
+
+    def report(stats):
+        current = IngestStats(mode)
+        current.add(total)
+        current.add(stats)
+        current.bytes_read = counter[0]
+        progress(current)
+
+    # one reindex of the search once the whole chain is replayed
+    with suspend_search_index():
+        for position, entry in enumerate(chain):
+            entry_mode = mode if position == 0 else MODE_UPSERT
+            if entry['deleted']:
+                with transaction.atomic(using=router.db_for_write(MuseumAPICSV)):
+                    MuseumAPICSV.objects.filter(pk__in=entry['deleted']).delete()
+                    send_change(MuseumAPICSV, ACTION_DELETED, entry['deleted'], bulk=True)
+            keys = get_entry_keys(entry)
+
+            if workers == 1 or len(keys) == 1:
+                for key in keys:
+                    total.add(restore_object(
+                        s3, bucket, key, entry_mode, batch_size, report if progress is not None else None, counter
+                    ))
+                continue
+
+            with get_process_pool(min(workers, len(keys)), router.db_for_write(MuseumAPICSV)) as executor:
+                futures = [
+                    executor.submit(run_in_worker, _restore_shard, bucket, key, entry_mode, batch_size)
+                    for key in keys
+                ]
+                for future in as_completed(futures):
+                    stats, size = future.result()
+                    total.add(stats)
+                    counter[0] += size
+                    if progress is not None:
+                        report(IngestStats(mode))
+
+    total.bytes_read = counter[0]
+    total.finish()
+    return total
+
+
+def restore_from_s3(s3, bucket, mode=None, batch_size=None, progress=None, workers=None):
+    """
+    Restores the last full backup and replays the incremental backups taken
+    after it, falling back to the most recent single file backup when the
+    bucket has no manifest.
+    :param s3: S3 client
+    :param bucket: bucket name
+    :param mode: 'insert' or 'upsert' for the full backup
+    :param batch_size: number of rows per batch
+    :param progress: optional callable, see restore_chain
+    :param workers: number of worker processes restoring shards at once
+    :return: IngestStats object or None if there is nothing to restore
+    """
+    chain = get_restore_chain(s3, bucket)
+    if not chain:
+        return None
+    return restore_chain(s3, bucket, chain, mode, batch_size, progress, workers)
@@ -0,0 +1,98 @@
+"""
+    Contains the cache of the data derived from the MuseumAPICSV table. Cache
+    keys include the version of the table the entry was built from, which
+    every committed change increments, so stale entries are never read again
+    and simply expire.
+
+    Cache hits and misses of a view are counted in the cache too, with the
+    time the responses took, so that every process sharing the cache backend
+    reports the same figures.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+METRICS_PREFIX = 'museum_data:metrics'
+DEFAULT_LISTING_CACHE_TIMEOUT = 300
+
+
+def get_listing_cache_timeout():
+    """
+    :return: number of seconds listing pages are cached for, 0 to disable
+        the cache
+    """
+    return getattr(settings, 'LISTING_CACHE_TIMEOUT', DEFAULT_LISTING_CACHE_TIMEOUT)
+
+
+def make_cache_key(prefix, version, *parts):
+    """
+    Builds the key of an entry built from a given version of the table.
+    :param prefix: kind of the entry, e.g. 'museum_data:listing'
+    :param version: version of the data the entry is built from, such as
+        the ETag of the table
+    :param parts: JSON serializable values the entry depends on
+    :return: cache key
+    """
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'{prefix}:{version}:{digest}'
+
+
+def _get_metric_keys(name):
+    return {
+        suffix: f'{METRICS_PREFIX}:{name}:{suffix}' for suffix in ('hits', 'misses', 'hit_us', 'miss_us')
+    }
+
+
+def _add_to_metric(key, value):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # evicted since it was added
+        cache.set(key, value, timeout=None)
+
+
+def record_cache_use(name, hit, seconds):
+    """
+    Counts a response of a cached view.
+    :param name: name of the view
+    :param hit: whether the response was served from the cache
+    :param seconds: time taken to build the response
+    """
+    keys = _get_metric_keys(name)
+    _add_to_metric(keys['hits' if hit else 'misses'], 1)
+    _add_to_metric(keys['hit_us' if hit else 'miss_us'], int(seconds * 1000000))
+
+
+def get_cache_metrics(name):
+    """
+    Returns the hit rate of the cache of a view and the time it saves.
+    :param name: name of the view
+    :return: dict with the hits, misses, hit_rate, mean_hit_ms, mean_miss_ms
+        and saved_ms, the time hits would have taken as misses minus the
+        time they took; means and savings are None until known
+    """
+    keys = _get_metric_keys(name)
+    values = cache.get_many(keys.values())
+    hits, misses, hit_us, miss_us = (values.get(keys[suffix], 0) for suffix in ('hits', 'misses', 'hit_us', 'miss_us'))
+    mean_hit_ms = hit_us / hits / 1000 if hits else None
+    mean_miss_ms = miss_us / misses / 1000 if misses else None
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else None,
+        'mean_hit_ms': mean_hit_ms,
+        'mean_miss_ms': mean_miss_ms,
+        'saved_ms': hits * (mean_miss_ms - mean_hit_ms) if hits and misses else None,
+    }
+
+
+def reset_cache_metrics(name):
+    """
+    Sets the counters of a view back to zero.
+    :param name: name of the view
+    """
+    cache.delete_many(_get_metric_keys(name).values())
@@ -0,0 +1,55 @@
+"""
+    Contains the change-event bus of the MuseumAPICSV table. Every write
+    path sends a rows_changed signal carrying a ChangeEvent: single row
+    saves and deletes send one per row, bulk ingest and restore one per
+    batch, so the cost of the handlers does not grow with the row count of
+    bulk loads. Handlers are registered in signals.py.
+
+    Events are sent inside the transaction of the change. Handlers with side
+    effects outside the database should defer them with
+    transaction.on_commit.
+"""
+
+from django.dispatch import Signal
+
+ACTION_ADDED = 'added'
+ACTION_UPDATED = 'updated'
+ACTION_DELETED = 'deleted'
+# rows inserted or updated by a bulk write, which does not tell them apart
+ACTION_WRITTEN = 'written'
+
+# sent with sender=MuseumAPICSV and event=ChangeEvent
+rows_changed = Signal()
+
+
+class ChangeEvent:
+    """
+    Change of one or more MuseumAPICSV rows.
+    """
+
+    def __init__(self, action, object_ids, bulk=False):
+        self.action = action
+        self.object_ids = tuple(object_ids)
+        self.bulk = bulk
+
+    @property
+    def rows(self):
+        return len(self.object_ids)
+
+    def __repr__(self):
+        return f'<ChangeEvent {self.action} {self.rows} row(s){" bulk" if self.bulk else ""}>'
+
+
+def send_change(sender, action, object_ids, bulk=False):
+    """
+    Sends a ChangeEvent to the registered handlers.
+    :param sender: model class of the changed rows
+    :param action: one of ACTION_ADDED, ACTION_UPDATED, ACTION_DELETED or
+        ACTION_WRITTEN
+    :param object_ids: objectIds of the changed rows
+    :param bulk: True when the rows were written by a bulk ingest or restore
+    :return: ChangeEvent object
+    """
+    event = ChangeEvent(action, object_ids, bulk)
+    rows_changed.send(sender=sender, event=event)
+    return event
@@ -0,0 +1,91 @@
+"""
+    Contains the streaming CSV export used by the download endpoint and the
+    S3 backup.
+
+    Rows are read in keyset batches on objectId rather than with one big
+    query, since mysqlclient buffers the whole result set of a query in
+    memory even when it is consumed with QuerySet.iterator().
+"""
+
+import csv
+import io
+
+from django.conf import settings
+
+from practice_app.models import MuseumAPICSV
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# the columns of a backup, in the order ingest_csv expects them
+EXPORT_COLUMNS = tuple(f.name for f in MuseumAPICSV._meta.concrete_fields if f.editable)
+
+
+def get_export_chunk_size():
+    """
+    :return: number of rows read per query and written per chunk of output
+    """
+    return getattr(settings, 'CSV_EXPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def iter_export_rows(queryset=None, columns=EXPORT_COLUMNS, chunk_size=None):
+    """
+    Yields the rows of a queryset as tuples of values, reading chunk_size
+    rows per query in objectId order.
+    :param queryset: QuerySet of MuseumAPICSV, defaults to all rows
+    :param columns: names of the columns to read
+    :param chunk_size: number of rows per query
+    :return: generator of tuples
+    """
+    if queryset is None:
+        queryset = MuseumAPICSV.objects.all()
+    chunk_size = chunk_size or get_export_chunk_size()
+    queryset = queryset.order_by('pk').values_list('pk', *columns)
+
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row[1:]
+        if len(rows) < chunk_size:
+            return
+        last_pk = rows[-1][0]
+
+
+def iter_csv(queryset=None, columns=EXPORT_COLUMNS, chunk_size=None):
+    """
+    Yields a CSV export of a queryset as strings, the header first and then
+    one string per chunk of rows, so memory use does not grow with the table.
+    :param queryset: QuerySet of MuseumAPICSV, defaults to all rows
+    :param columns: names of the columns to export
+    :param chunk_size: number of rows per query and per yielded string
+    :return: generator of str
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    pending = 0
+    for row in iter_export_rows(queryset, columns, chunk_size):
+        writer.writerow(row)
+        pending += 1
+        if pending == chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def iter_csv_bytes(queryset=None, columns=EXPORT_COLUMNS, chunk_size=None, encoding='utf-8'):
+    """
+    Same as iter_csv, encoded.
+    :param queryset: QuerySet of MuseumAPICSV, defaults to all rows
+    :param columns: names of the columns to export
+    :param chunk_size: number of rows per query and per yielded chunk
+    :param encoding: encoding of the output
+    :return: generator of bytes
+    """
+    for text in iter_csv(queryset, columns, chunk_size):
+        yield text.encode(encoding)
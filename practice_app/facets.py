@@ -0,0 +1,423 @@
+"""
+    Contains the in-memory facet engine used for faceted browsing of the
+    MuseumAPICSV table by department, classification, culture and
+    artistNationality.
+
+    Each process keeps, for every value of these columns, the posting list
+    of the objectIds having it as a sorted numpy int32 array, plus the
+    sorted array of the objectIds indexed and, per column, the value code of
+    each of them, found by binary search. Memory is proportional to the
+    number of rows whatever their objectIds. Values of a column are ORed by
+    merging their posting lists, columns are ANDed by looking up the codes
+    of the smallest candidate set, and facet counts are a bincount of the
+    codes of the selected rows, so queries never touch the database.
+
+    The index is loaded on first use and then kept up to date from the
+    rows_changed events of this process. Changes made by other processes
+    (parallel ingest and restore workers, other web workers) are picked up
+    every FACET_SYNC_INTERVAL seconds from the rows whose modifiedAt is
+    recent and the DeletedRow tombstones. Rows deleted in bulk by another
+    process leave no tombstone and stay listed until the index is reloaded.
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, router
+from django.utils import timezone
+
+from practice_app.events import ACTION_DELETED
+from practice_app.models import DeletedRow, MuseumAPICSV
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ('department', 'classification', 'culture', 'artistNationality')
+DEFAULT_FACET_LIMIT = 10
+DEFAULT_SYNC_INTERVAL = 5
+# changes stamped this long before a sync are read again by the next one, in
+# case their transaction committed after the sync read the table
+SYNC_OVERLAP = datetime.timedelta(seconds=2)
+LOAD_CHUNK_SIZE = 5000
+
+_EMPTY = np.empty(0, dtype=np.int32)
+# objectIds outside this range cannot be stored in the posting lists
+MAX_OBJECT_ID = np.iinfo(np.int32).max
+# code of the rows without a value, so that code arrays can index count and
+# lookup tables directly
+NO_VALUE = 0
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+
+def get_sync_interval():
+    """
+    :return: number of seconds between two looks for changes made by other
+        processes
+    """
+    return getattr(settings, 'FACET_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL)
+
+
+def _group_by_code(codes, object_ids):
+    # yields (code, sorted objectIds) for every code but NO_VALUE
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    object_ids = object_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    ends = np.append(starts[1:], len(codes))
+    for start, end in zip(starts, ends):
+        if codes[start] != NO_VALUE:
+            yield int(codes[start]), np.sort(object_ids[start:end])
+
+
+class FacetResult:
+    """
+    Answer of a faceted query.
+    """
+
+    def __init__(self, count, object_ids, facets):
+        self.count = count
+        self.object_ids = object_ids
+        self.facets = facets
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'object_ids': self.object_ids,
+            'facets': {field: [[value, count] for value, count in counts] for field, counts in self.facets.items()},
+        }
+
+
+class FacetIndex:
+    """
+    Inverted index of the facet columns of MuseumAPICSV. All methods are
+    thread-safe.
+    """
+
+    def __init__(self, fields=FACET_FIELDS):
+        self.fields = tuple(fields)
+        self.rows = 0
+        # rows and tombstones stamped from this time on are read by the next sync
+        self.synced_to = None
+        self.checked_at = None
+        self._lock = threading.RLock()
+        # value and posting list of each code, the first ones standing for NO_VALUE
+        self._values = {field: [None] for field in self.fields}
+        self._postings = {field: [_EMPTY] for field in self.fields}
+        self._totals = {field: np.zeros(1, dtype=np.int64) for field in self.fields}
+        self._codes = {field: {} for field in self.fields}
+        # sorted objectIds of the rows, and the code of each of them
+        self._ids = _EMPTY
+        self._row_codes = {field: _EMPTY for field in self.fields}
+        # slots of the posting lists queried since the rows last changed
+        self._posting_slots = {}
+
+    def _locate(self, object_ids):
+        # returns the slots of objectIds in self._ids, and whether each one
+        # is there
+        slots = np.searchsorted(self._ids, object_ids)
+        found = slots < len(self._ids)
+        found[found] = self._ids[slots[found]] == object_ids[found]
+        return slots, found
+
+    def _slots(self, object_ids):
+        # slots of objectIds known to be indexed
+        return np.searchsorted(self._ids, object_ids)
+
+    def _get_posting_slots(self, field, code):
+        key = (field, code)
+        slots = self._posting_slots.get(key)
+        if slots is None:
+            slots = self._posting_slots[key] = self._slots(self._postings[field][code])
+        return slots
+
+    def _insert(self, object_ids):
+        # gives the new sorted objectIds a slot, without a value yet
+        self._posting_slots.clear()
+        positions = np.searchsorted(self._ids, object_ids)
+        self._ids = np.insert(self._ids, positions, object_ids)
+        for field in self.fields:
+            self._row_codes[field] = np.insert(self._row_codes[field], positions, NO_VALUE)
+
+    def _get_code(self, field, value):
+        if value is None or value == '':
+            return NO_VALUE
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[field])
+            self._values[field].append(value)
+            self._postings[field].append(_EMPTY)
+            self._totals[field] = np.append(self._totals[field], 0)
+        return code
+
+    def _move(self, field, object_ids, slots, old_codes, new_codes):
+        changed = old_codes != new_codes
+        if not changed.any():
+            return
+        self._posting_slots.clear()
+        postings = self._postings[field]
+        totals = self._totals[field]
+        # a row is never in the posting list of its new code, and always in
+        # the one of its old code
+        for code, members in _group_by_code(old_codes[changed], object_ids[changed]):
+            postings[code] = np.delete(postings[code], np.searchsorted(postings[code], members))
+            totals[code] -= len(members)
+        for code, members in _group_by_code(new_codes[changed], object_ids[changed]):
+            postings[code] = np.insert(postings[code], np.searchsorted(postings[code], members), members)
+            totals[code] += len(members)
+        self._row_codes[field][slots[changed]] = new_codes[changed]
+
+    def update_rows(self, rows):
+        """
+        Adds rows to the index or replaces their values, ignoring objectIds
+        that are negative or do not fit in 32 bits.
+        :param rows: iterable of (objectId, value of each of self.fields)
+            tuples, as returned by values_list('pk', *self.fields)
+        :return: number of rows applied
+        """
+        rows = {row[0]: row[1:] for row in rows if 0 <= row[0] <= MAX_OBJECT_ID}
+        if not rows:
+            return 0
+        object_ids = np.fromiter(rows.keys(), dtype=np.int32, count=len(rows))
+        with self._lock:
+            slots, found = self._locate(object_ids)
+            if not found.all():
+                self._insert(np.sort(object_ids[~found]))
+                slots = self._slots(object_ids)
+            for position, field in enumerate(self.fields):
+                new_codes = np.fromiter(
+                    (self._get_code(field, values[position]) for values in rows.values()),
+                    dtype=np.int32, count=len(rows)
+                )
+                self._move(field, object_ids, slots, self._row_codes[field][slots], new_codes)
+            self.rows = len(self._ids)
+        return len(rows)
+
+    def remove_rows(self, object_ids):
+        """
+        Removes rows from the index, ignoring objectIds it does not hold.
+        :param object_ids: iterable of objectIds
+        :return: number of rows removed
+        """
+        object_ids = np.unique(np.fromiter(object_ids, dtype=np.int64))
+        object_ids = object_ids[(object_ids >= 0) & (object_ids <= MAX_OBJECT_ID)].astype(np.int32)
+        with self._lock:
+            slots, found = self._locate(object_ids)
+            object_ids, slots = object_ids[found], slots[found]
+            for field in self.fields:
+                self._move(
+                    field, object_ids, slots, self._row_codes[field][slots], np.zeros(len(object_ids), np.int32)
+                )
+            self._posting_slots.clear()
+            self._ids = np.delete(self._ids, slots)
+            for field in self.fields:
+                self._row_codes[field] = np.delete(self._row_codes[field], slots)
+            self.rows = len(self._ids)
+        return len(object_ids)
+
+    def _read_rows(self, queryset):
+        # applies the rows of a queryset chunk by chunk
+        rows = []
+        applied = 0
+        for row in queryset.values_list('pk', *self.fields).iterator(chunk_size=LOAD_CHUNK_SIZE):
+            rows.append(row)
+            if len(rows) == LOAD_CHUNK_SIZE:
+                applied += self.update_rows(rows)
+                rows = []
+        return applied + self.update_rows(rows)
+
+    def load(self, using=None):
+        """
+        Indexes every row of the table, in one pass so that each posting
+        list is built once.
+        :param using: database alias, defaults to the router's choice
+        :return: number of rows indexed
+        """
+        using = using or router.db_for_read(MuseumAPICSV)
+        started_at = timezone.now()
+        rows = self.update_rows(
+            MuseumAPICSV.objects.using(using).values_list('pk', *self.fields).iterator(chunk_size=LOAD_CHUNK_SIZE)
+        )
+        with self._lock:
+            self.synced_to = started_at - SYNC_OVERLAP
+            self.checked_at = time.monotonic()
+        logger.info('Loaded the facet index: %s rows in %.2fs', rows, (timezone.now() - started_at).total_seconds())
+        return rows
+
+    def refresh_rows(self, object_ids, using=None):
+        """
+        Reads the current values of rows from the database and applies them.
+        :param object_ids: objectIds of the rows
+        :param using: database alias, defaults to the router's choice
+        :return: number of rows applied
+        """
+        using = using or router.db_for_read(MuseumAPICSV)
+        object_ids = list(object_ids)
+        chunk_size = connections[using].ops.bulk_batch_size(['pk'], object_ids) or len(object_ids)
+        applied = 0
+        for start in range(0, len(object_ids), chunk_size):
+            applied += self.update_rows(
+                MuseumAPICSV.objects.using(using).filter(pk__in=object_ids[start:start + chunk_size])
+                .values_list('pk', *self.fields)
+            )
+        return applied
+
+    def sync(self, using=None):
+        """
+        Applies the rows written and the tombstones left since the previous
+        sync, which includes the changes made by other processes.
+        :param using: database alias, defaults to the router's choice
+        :return: tuple of number of rows updated and removed
+        """
+        using = using or router.db_for_read(MuseumAPICSV)
+        started_at = timezone.now()
+        since = self.synced_to
+        removed = self.remove_rows(
+            DeletedRow.objects.using(using).filter(deletedAt__gte=since).values_list('pk', flat=True)
+        )
+        updated = self._read_rows(MuseumAPICSV.objects.using(using).filter(modifiedAt__gte=since).order_by('pk'))
+        with self._lock:
+            self.synced_to = max(since, started_at - SYNC_OVERLAP)
+            self.checked_at = time.monotonic()
+        return updated, removed
+
+    def sync_if_due(self):
+        """
+        Calls sync when FACET_SYNC_INTERVAL seconds have passed since the
+        last one.
+        """
+        if time.monotonic() - self.checked_at >= get_sync_interval():
+            self.sync()
+
+    def _lookup(self, field, codes):
+        # boolean table telling whether a code is one of codes
+        lookup = np.zeros(len(self._values[field]), dtype=bool)
+        lookup[codes] = True
+        return lookup
+
+    def _select(self, filters):
+        # returns the sorted slots of the rows matching the filters, None
+        # for all rows
+        terms = []
+        for field, values in filters.items():
+            if field not in self._codes:
+                raise ValueError(f'{field} is not a facet')
+            if not values:
+                continue
+            codes = [self._codes[field][value] for value in set(values) if value in self._codes[field]]
+            if not codes:
+                return _EMPTY
+            terms.append((int(self._totals[field][codes].sum()), field, codes))
+        if not terms:
+            return None
+
+        # OR the values of the most selective column, then keep the rows
+        # whose codes match every other column; a row has one value per
+        # column, so the posting lists of a column never overlap
+        terms.sort(key=lambda term: term[0])
+        _, field, codes = terms[0]
+        postings = [self._get_posting_slots(field, code) for code in codes]
+        slots = postings[0] if len(postings) == 1 else np.sort(np.concatenate(postings), kind='stable')
+        for _, field, codes in terms[1:]:
+            if not len(slots):
+                break
+            slots = slots[self._lookup(field, codes)[self._row_codes[field][slots]]]
+        return slots
+
+    def _count(self, field, slots, limit):
+        if slots is None:
+            counts = self._totals[field]
+        else:
+            counts = np.bincount(self._row_codes[field][slots], minlength=len(self._values[field]))
+        candidates = np.flatnonzero(counts[1:]) + 1
+        if limit and len(candidates) > limit:
+            candidates = candidates[np.argpartition(-counts[candidates], limit - 1)[:limit]]
+        values = self._values[field]
+        return sorted(((values[code], int(counts[code])) for code in candidates), key=lambda item: (-item[1], item[0]))
+
+    def query(self, filters=None, offset=0, page_size=None, limit=DEFAULT_FACET_LIMIT):
+        """
+        Selects the rows having any of the given values in each filtered
+        column, and counts the values of every facet among them. The counts
+        of a filtered column ignore its own filter, so they tell how many
+        rows picking another of its values would add.
+        :param filters: dict of facet column to list of values
+        :param offset: number of matching objectIds to skip
+        :param page_size: number of matching objectIds to return, None for all
+        :param limit: number of values returned per facet, the most frequent
+            first, 0 for all of them
+        :return: FacetResult object
+        """
+        filters = {field: list(values) for field, values in (filters or {}).items()}
+        with self._lock:
+            slots = self._select(filters)
+            facets = {}
+            for field in self.fields:
+                selected = slots
+                if filters.get(field):
+                    selected = self._select({name: values for name, values in filters.items() if name != field})
+                facets[field] = self._count(field, selected, limit)
+
+            end = None if page_size is None else offset + page_size
+            if slots is None:
+                count = self.rows
+                page = self._ids[offset:end]
+            else:
+                count = len(slots)
+                page = self._ids[slots[offset:end]]
+            page = page.tolist()
+        return FacetResult(count, page, facets)
+
+
+def get_facet_index():
+    """
+    Returns the facet index of the process, loading it on first use and in
+    a forked child, and applying the changes made by other processes when
+    FACET_SYNC_INTERVAL has passed.
+    :return: FacetIndex object
+    """
+    global _index, _index_pid
+    with _index_lock:
+        if _index is None or _index_pid != os.getpid():
+            index = FacetIndex()
+            index.load()
+            _index, _index_pid = index, os.getpid()
+        index = _index
+    index.sync_if_due()
+    return index
+
+
+def reset_facet_index():
+    """
+    Drops the facet index of the process, which is loaded again on next use.
+    """
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def apply_change(event):
+    """
+    Applies a committed ChangeEvent to the facet index of the process, if it
+    has been loaded. Should that fail, the index is dropped rather than left
+    out of date.
+    :param event: ChangeEvent object
+    """
+    index = _index
+    if index is None or _index_pid != os.getpid():
+        return
+    try:
+        if event.action == ACTION_DELETED:
+            index.remove_rows(event.object_ids)
+        else:
+            index.refresh_rows(event.object_ids)
+    except Exception:
+        logger.exception('Could not apply %r to the facet index', event)
+        reset_facet_index()
@@ -0,0 +1,162 @@
+"""
+    Contains the filters and sort orders of the listing, read from the query
+    string. Only the columns indexed on MuseumAPICSV can be filtered or
+    sorted on, so that every page stays an index range scan instead of a
+    table scan.
+
+    Filters are exact matches, repeated parameters matching any of the
+    values (?department=Asian Art&department=Islamic Art), and numeric
+    ranges on the years (?objectBeginDate__gte=1800&objectEndDate__lt=1900).
+    ?sort=department sorts ascending, ?sort=-department descending; rows are
+    in objectId order by default, or in year order when a range is given.
+"""
+
+import json
+
+from django.db import NotSupportedError, connections, router
+
+from practice_app.ingest import FALSE_VALUES, TRUE_VALUES
+from practice_app.models import YEAR_FIELDS, MuseumAPICSV
+
+KEY_COLUMN = MuseumAPICSV._meta.pk.name
+EXACT_FILTERS = ('accessionNumber', 'department', 'artistDisplayName', 'classification', 'isHighlight')
+# stored as text, compared as numbers through their indexed year columns
+RANGE_FILTERS = tuple(date_field for date_field, _ in YEAR_FIELDS)
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte')
+SORT_FIELDS = (KEY_COLUMN,) + EXACT_FILTERS + RANGE_FILTERS
+SORT_CHOICES = (('', KEY_COLUMN), (f'-{KEY_COLUMN}', f'{KEY_COLUMN} (descending)')) + tuple(
+    choice for name in SORT_FIELDS[1:] for choice in ((name, name), (f'-{name}', f'{name} (descending)'))
+)
+
+
+def get_range_alias(name):
+    """
+    :param name: one of RANGE_FILTERS
+    :return: name of the field holding the year of the column
+    """
+    return dict(YEAR_FIELDS)[name]
+
+
+def _parse_bool(value):
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_filters(params):
+    """
+    Reads the filters of a query string, ignoring unknown names and values
+    that cannot be parsed.
+    :param params: QueryDict object, usually request.GET
+    :return: dict of lookup to value, as accepted by QuerySet.filter
+    """
+    filters = {}
+    for name in EXACT_FILTERS:
+        values = [value for value in params.getlist(name) if value != '']
+        if name == 'isHighlight':
+            # a boolean exact lookup is rendered as a bare column, which no
+            # index can serve, IN (...) is an index lookup
+            values = sorted({value for value in map(_parse_bool, values) if value is not None})
+            if values:
+                filters[f'{name}__in'] = values
+            continue
+        if len(values) == 1:
+            filters[name] = values[0]
+        elif values:
+            filters[f'{name}__in'] = sorted(set(values))
+    for name in RANGE_FILTERS:
+        for lookup in RANGE_LOOKUPS:
+            value = _parse_int(params.get(f'{name}__{lookup}'))
+            if value is not None:
+                filters[f'{get_range_alias(name)}__{lookup}'] = value
+    return filters
+
+
+def get_sort(value):
+    """
+    Reads the sort parameter of a query string.
+    :param value: column name, prefixed with '-' for descending order
+    :return: tuple of column name (one of SORT_FIELDS) and whether the
+        order is descending, or (None, False) for the default objectId order
+    """
+    value = (value or '').strip()
+    descending = value.startswith('-')
+    name = value.lstrip('-')
+    if name not in SORT_FIELDS or (name == KEY_COLUMN and not descending):
+        return None, False
+    return name, descending
+
+
+def get_default_sort(filters):
+    """
+    Returns the column to sort on when the query string has no sort
+    parameter. Rows matching a range filter are sorted on its column: in
+    objectId order the planner prefers walking the primary key over reading
+    the range from its index, which reads most of the table when few rows
+    match.
+    :param filters: dict returned by get_filters
+    :return: one of RANGE_FILTERS or None for the objectId order
+    """
+    for name in RANGE_FILTERS:
+        alias = get_range_alias(name)
+        if any(lookup.startswith(f'{alias}__') for lookup in filters):
+            return name
+    return None
+
+
+def get_order_by(sort, descending):
+    """
+    :param sort: column name returned by get_sort
+    :param descending: whether the order is descending
+    :return: order_by value for KeysetPage, None for the objectId order
+    """
+    if sort is None:
+        return None
+    name = get_range_alias(sort) if sort in RANGE_FILTERS else sort
+    if name == KEY_COLUMN:
+        name = 'pk'
+    return f'-{name}' if descending else name
+
+
+def find_table_scans(sql, using=None):
+    """
+    Returns the steps of the query plan of a SELECT statement that read the
+    whole table instead of going through an index, using EXPLAIN.
+    :param sql: SQL statement with its parameters inlined, as captured by
+        django.test.utils.CaptureQueriesContext
+    :param using: database alias, defaults to the router's choice
+    :return: list of plan steps, empty if every table is read through an index
+    :raises NotSupportedError: if plans are not inspected on the database
+    """
+    connection = connections[using or router.db_for_read(MuseumAPICSV)]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN FORMAT=JSON {sql}')
+            scans = []
+
+            def walk(node):
+                if isinstance(node, dict):
+                    if node.get('access_type') == 'ALL':
+                        scans.append(f'full scan of {node.get("table_name")}')
+                    for child in node.values():
+                        walk(child)
+                elif isinstance(node, list):
+                    for child in node:
+                        walk(child)
+
+            walk(json.loads(cursor.fetchone()[0]))
+            return scans
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+            return [detail for detail in details if detail.startswith('SCAN') and ' USING ' not in detail]
+    raise NotSupportedError(f'Query plans are not inspected on {connection.vendor}')
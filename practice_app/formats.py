@@ -0,0 +1,342 @@
+"""
+    Contains the file formats a backup can be written in: plain, gzip or
+    zstd compressed CSV, and Parquet. Encoders turn the table into a stream
+    of bytes, decoders turn a backup back into rows for the ingest pipeline.
+"""
+
+import gzip
+import io
+import logging
+import shutil
+import tempfile
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd backups are optional
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet backups are optional
+    pa = pq = None
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import models
+
+from practice_app.export import EXPORT_COLUMNS, iter_csv_bytes, iter_export_rows
+from practice_app.ingest import HASH_FIELD, IngestStats, get_ingest_batch_size, get_ingest_mode, get_key_positions, \
+    ingest_csv, iter_batches, write_batch
+from practice_app.models import MuseumAPICSV, compute_content_hash, get_content_fields
+from practice_app.search import suspend_search_index
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = 'csv'
+FORMAT_GZIP = 'csv.gz'
+FORMAT_ZSTD = 'csv.zst'
+FORMAT_PARQUET = 'parquet'
+FORMATS = (FORMAT_CSV, FORMAT_GZIP, FORMAT_ZSTD, FORMAT_PARQUET)
+
+DEFAULT_FORMAT = FORMAT_GZIP
+DEFAULT_COMPRESSION_LEVEL = {FORMAT_GZIP: 6, FORMAT_ZSTD: 3}
+# rows per parquet row group, large enough for good compression
+DEFAULT_ROW_GROUP_SIZE = 20000
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+PARQUET_MAGIC = b'PAR1'
+MAGIC_LENGTH = 4
+READ_BUFFER_SIZE = 1024 * 1024
+
+
+def get_backup_format():
+    """
+    :return: format new backups are written in, one of FORMATS
+    """
+    backup_format = getattr(settings, 'BACKUP_FORMAT', DEFAULT_FORMAT)
+    if backup_format not in FORMATS:
+        raise ImproperlyConfigured(f'BACKUP_FORMAT must be one of {", ".join(FORMATS)}')
+    return backup_format
+
+
+def get_compression_level(backup_format):
+    """
+    :param backup_format: FORMAT_GZIP or FORMAT_ZSTD
+    :return: compression level, from BACKUP_COMPRESSION_LEVEL if set
+    """
+    return getattr(settings, 'BACKUP_COMPRESSION_LEVEL', None) or DEFAULT_COMPRESSION_LEVEL[backup_format]
+
+
+def _require(module, backup_format, package):
+    if module is None:
+        raise ImproperlyConfigured(f'The {package} package is required for {backup_format} backups')
+
+
+def detect_format(head):
+    """
+    Detects the format of a backup from its first bytes.
+    :param head: at least the first MAGIC_LENGTH bytes of the backup
+    :return: one of FORMATS
+    """
+    if head.startswith(GZIP_MAGIC):
+        return FORMAT_GZIP
+    if head.startswith(ZSTD_MAGIC):
+        return FORMAT_ZSTD
+    if head.startswith(PARQUET_MAGIC):
+        return FORMAT_PARQUET
+    return FORMAT_CSV
+
+
+def iter_gzip(chunks, level=None):
+    """
+    Gzip compresses a stream of bytes.
+    :param chunks: iterable of bytes
+    :param level: compression level
+    :return: generator of bytes
+    """
+    compressor = zlib.compressobj(level or get_compression_level(FORMAT_GZIP), zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_zstd(chunks, level=None):
+    """
+    Zstandard compresses a stream of bytes.
+    :param chunks: iterable of bytes
+    :param level: compression level
+    :return: generator of bytes
+    """
+    _require(zstandard, FORMAT_ZSTD, 'zstandard')
+    compressor = zstandard.ZstdCompressor(level=level or get_compression_level(FORMAT_ZSTD)).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def get_arrow_schema(columns=EXPORT_COLUMNS):
+    """
+    Returns the parquet schema of the given MuseumAPICSV columns.
+    :param columns: names of the columns
+    :return: pyarrow Schema object
+    """
+    _require(pa, FORMAT_PARQUET, 'pyarrow')
+    arrow_fields = []
+    for name in columns:
+        field = MuseumAPICSV._meta.get_field(name)
+        if isinstance(field, models.BooleanField):
+            arrow_type = pa.bool_()
+        elif isinstance(field, models.DateTimeField):
+            arrow_type = pa.timestamp('us', tz='UTC')
+        elif isinstance(field, models.FloatField):
+            arrow_type = pa.float64()
+        elif isinstance(field, models.IntegerField):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        arrow_fields.append(pa.field(name, arrow_type))
+    return pa.schema(arrow_fields)
+
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only file object collecting what pyarrow writes, so it can be
+    yielded as soon as each row group is flushed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(queryset=None, columns=EXPORT_COLUMNS, row_group_size=None):
+    """
+    Writes a queryset as a Parquet file, one row group at a time.
+    :param queryset: QuerySet of MuseumAPICSV, defaults to all rows
+    :param columns: names of the columns to export
+    :param row_group_size: number of rows per row group
+    :return: generator of bytes
+    """
+    schema = get_arrow_schema(columns)
+    row_group_size = row_group_size or getattr(settings, 'BACKUP_PARQUET_ROW_GROUP_SIZE', DEFAULT_ROW_GROUP_SIZE)
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression='zstd' if zstandard is not None else 'snappy') as writer:
+        for rows in iter_batches(iter_export_rows(queryset, columns), row_group_size):
+            values = list(zip(*rows))
+            # write_table rather than write_batch, which pyarrow 6 lacks
+            writer.write_table(pa.Table.from_batches([pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(values, schema)],
+                schema=schema
+            )]))
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_backup_bytes(backup_format, queryset=None):
+    """
+    Returns the encoded export of a queryset in the given format.
+    :param backup_format: one of FORMATS
+    :param queryset: QuerySet of MuseumAPICSV, defaults to all rows
+    :return: generator of bytes
+    """
+    if backup_format == FORMAT_PARQUET:
+        return iter_parquet(queryset)
+    chunks = iter_csv_bytes(queryset)
+    if backup_format == FORMAT_GZIP:
+        return iter_gzip(chunks)
+    if backup_format == FORMAT_ZSTD:
+        return iter_zstd(chunks)
+    return chunks
+
+
+class PeekableStream(io.RawIOBase):
+    """
+    Read-only file object over another one, whose first bytes can be looked
+    at without consuming them.
+    """
+
+    def __init__(self, raw):
+        super().__init__()
+        self.raw = raw
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def peek(self, size):
+        while len(self.buffer) < size:
+            data = self.raw.read(size - len(self.buffer))
+            if not data:
+                break
+            self.buffer += data
+        return self.buffer[:size]
+
+    def readinto(self, target):
+        if self.buffer:
+            size = min(len(target), len(self.buffer))
+            target[:size] = self.buffer[:size]
+            self.buffer = self.buffer[size:]
+            return size
+        data = self.raw.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_csv_backup(file_obj, backup_format):
+    """
+    Returns a binary file object yielding the decompressed CSV of a backup.
+    :param file_obj: binary file object of the backup
+    :param backup_format: FORMAT_CSV, FORMAT_GZIP or FORMAT_ZSTD
+    :return: binary file object
+    """
+    if backup_format == FORMAT_GZIP:
+        return gzip.GzipFile(fileobj=file_obj, mode='rb')
+    if backup_format == FORMAT_ZSTD:
+        _require(zstandard, FORMAT_ZSTD, 'zstandard')
+        return zstandard.ZstdDecompressor().stream_reader(file_obj)
+    return file_obj
+
+
+def _iter_parquet_rows(parquet_file, batch_size):
+    meta = MuseumAPICSV._meta
+    names = set(parquet_file.schema_arrow.names)
+    if meta.pk.name not in names:
+        raise ValidationError(f'Parquet backup is missing the {meta.pk.name} column')
+    content_positions = [meta.concrete_fields.index(field) for field in get_content_fields()]
+    hash_position = get_key_positions()[1]
+
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size):
+        columns = []
+        for field in meta.concrete_fields:
+            if field.name in names and field.name != HASH_FIELD:
+                columns.append(record_batch.column(field.name).to_pylist())
+            else:
+                columns.append([field.get_default()] * record_batch.num_rows)
+        for values in zip(*columns):
+            values = list(values)
+            values[hash_position] = compute_content_hash([values[position] for position in content_positions])
+            yield tuple(values)
+
+
+def ingest_parquet(file_obj, batch_size=None, progress=None, mode=None):
+    """
+    Streams a Parquet backup into the MuseumAPICSV table in fixed-size
+    batches. Values are already typed, so no conversion is needed.
+    :param file_obj: seekable binary file object or path of the Parquet file
+    :param batch_size: number of rows written per batch
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param mode: 'insert' or 'upsert', defaults to settings.CSV_INGEST_MODE
+    :return: IngestStats object
+    """
+    _require(pq, FORMAT_PARQUET, 'pyarrow')
+    batch_size = batch_size or get_ingest_batch_size()
+    mode = mode or get_ingest_mode()
+    stats = IngestStats(mode)
+    rows = _iter_parquet_rows(pq.ParquetFile(file_obj), batch_size)
+    with suspend_search_index():
+        for batch in iter_batches(rows, batch_size):
+            write_batch(batch, stats, mode)
+            if progress is not None:
+                progress(stats)
+    stats.finish()
+
+    logger.info('Ingested Parquet backup: %s', stats.as_dict())
+    return stats
+
+
+def ingest_backup(file_obj, backup_format=None, batch_size=None, progress=None, mode=None):
+    """
+    Ingests a backup in any of FORMATS, detecting the format from its first
+    bytes when it is not given.
+    :param file_obj: binary file object of the backup; Parquet backups are
+        copied to a temporary file first if it is not seekable
+    :param backup_format: one of FORMATS, detected when None
+    :param batch_size: number of rows written per batch
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param mode: 'insert' or 'upsert', defaults to settings.CSV_INGEST_MODE
+    :return: IngestStats object
+    """
+    if backup_format is None:
+        stream = PeekableStream(file_obj)
+        backup_format = detect_format(stream.peek(MAGIC_LENGTH))
+        file_obj = io.BufferedReader(stream, READ_BUFFER_SIZE)
+
+    if backup_format == FORMAT_PARQUET:
+        if not (hasattr(file_obj, 'seekable') and file_obj.seekable()):
+            with tempfile.TemporaryFile() as local_copy:
+                shutil.copyfileobj(file_obj, local_copy)
+                local_copy.seek(0)
+                return ingest_parquet(local_copy, batch_size, progress, mode)
+        return ingest_parquet(file_obj, batch_size, progress, mode)
+
+    return ingest_csv(open_csv_backup(file_obj, backup_format), batch_size=batch_size, progress=progress, mode=mode)
@@ -1,6 +1,3 @@
-from io import TextIOWrapper, StringIO
-
-import pandas as pd
 from django import forms
 
 from practice_app.models import MuseumAPICSV
@@ -8,7 +5,8 @@ from practice_app.models import MuseumAPICSV
 
 class UploadCSVFileForm(forms.Form):
     """
-    Form that allows the user to upload CSV file.
+    Form that allows the user to upload CSV file. Its header and first rows
+    are validated by the upload job, while it ingests them.
     """
     csv_file = forms.FileField(label='Upload CSV File')
 
@@ -16,21 +14,6 @@ class UploadCSVFileForm(forms.Form):
         self.request = kwargs.pop('request', None)
         super(UploadCSVFileForm, self).__init__(*args, **kwargs)
 
-    def clean(self):
-        cleaned_data = super(UploadCSVFileForm, self).clean()
-        f = TextIOWrapper(self.request.FILES['csv_file'].file, encoding='utf-8')
-        f.seek(0)
-
-        csv_data = StringIO(f.read())
-
-        df = pd.read_csv(csv_data, sep=",")
-        # validate_csv(df)
-
-        # first line (only) contains additional information about the event
-        # let's validate that against its form definition
-
-        return cleaned_data
-
 
 class EditCSVRowForm(forms.ModelForm):
     metadataDate = forms.DateTimeField(
@@ -0,0 +1,826 @@
+"""
+    Contains the streaming CSV ingest pipeline used to load Met Museum
+    exports into the MuseumAPICSV table.
+"""
+
+import csv
+import datetime
+import logging
+import time
+from functools import lru_cache
+from io import TextIOBase, TextIOWrapper
+from itertools import islice
+from operator import attrgetter, itemgetter
+
+try:
+    import resource
+except ImportError:  # resource is not available on Windows
+    resource = None
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import NotSupportedError, connections, models, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from practice_app.events import ACTION_WRITTEN, send_change
+from practice_app.models import CONTENT_SEPARATOR, YEAR_FIELDS, MuseumAPICSV, compute_content_hash, \
+    get_content_fields, get_year, hash_content_text
+from practice_app.search import suspend_search_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+# number of rows type-checked when validating an upload
+DEFAULT_SAMPLE_SIZE = 100
+# number of rows parsed at a time by the pandas engine
+DEFAULT_CHUNK_SIZE = 50000
+
+ENGINE_PYTHON = 'python'
+ENGINE_PANDAS = 'pandas'
+
+MODE_INSERT = 'insert'
+MODE_UPSERT = 'upsert'
+
+HASH_FIELD = 'contentHash'
+MODIFIED_FIELD = 'modifiedAt'
+# filled when the rows are written, never read from the CSV
+COMPUTED_FIELDS = frozenset(year_field for _, year_field in YEAR_FIELDS)
+
+# values stored for empty numeric columns such as galleryNumber
+EMPTY_NUMBER_VALUE = -1
+TRUE_VALUES = frozenset(('True', 'true', 'TRUE', '1', 't'))
+FALSE_VALUES = frozenset(('False', 'false', 'FALSE', '0', 'f'))
+# end of the date times that carry their UTC offset
+UTC_OFFSET_SUFFIX = r'\d:\d\d(?::\d\d(?:\.\d*)?)?\s*(?:Z|[+-]\d\d(?::?\d\d)?)$'
+
+
+def get_peak_rss_kb():
+    """
+    Returns the peak resident set size of the current process in kilobytes.
+    :return: peak RSS in KB or None if it cannot be determined on this platform
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class IngestStats:
+    """
+    Counters collected while ingesting a CSV file.
+    """
+
+    def __init__(self, mode=MODE_INSERT):
+        self.mode = mode
+        self.rows = 0
+        self.batches = 0
+        # outcome of the rows written in upsert mode
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        # set by ingest modes that can tell how much of the file was consumed
+        self.bytes_read = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    def add(self, other):
+        """
+        Adds the counters of another IngestStats, e.g. of a shard, to these.
+        :param other: IngestStats object
+        """
+        self.rows += other.rows
+        self.batches += other.batches
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+
+    @property
+    def elapsed(self):
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return end - self.started_at
+
+    @property
+    def rows_per_sec(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        result = {
+            'rows': self.rows,
+            'batches': self.batches,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'peak_rss_kb': get_peak_rss_kb(),
+        }
+        if self.mode == MODE_UPSERT:
+            result.update(inserted=self.inserted, updated=self.updated, unchanged=self.unchanged)
+        return result
+
+
+@lru_cache(maxsize=None)
+def get_content_positions():
+    """
+    Returns the positions, in model field order, of the fields covered by
+    the content hash.
+    :return: tuple of positions
+    """
+    concrete_fields = MuseumAPICSV._meta.concrete_fields
+    return tuple(concrete_fields.index(field) for field in get_content_fields())
+
+
+@lru_cache(maxsize=None)
+def get_key_positions():
+    """
+    Returns the positions, in model field order, of objectId and of the
+    content hash.
+    :return: tuple of the two positions
+    """
+    meta = MuseumAPICSV._meta
+    return meta.concrete_fields.index(meta.pk), meta.concrete_fields.index(meta.get_field(HASH_FIELD))
+
+
+@lru_cache(maxsize=None)
+def get_year_positions():
+    """
+    Returns the positions, in model field order, of the year columns and of
+    the date columns they are read from.
+    :return: tuple of (year position, date position) tuples
+    """
+    meta = MuseumAPICSV._meta
+    return tuple(
+        (meta.concrete_fields.index(meta.get_field(year_field)), meta.concrete_fields.index(meta.get_field(date_field)))
+        for date_field, year_field in YEAR_FIELDS
+    )
+
+
+def get_ingest_batch_size():
+    """
+    Returns the number of rows inserted per batch when ingesting CSV files.
+    :return: batch size
+    """
+    return getattr(settings, 'CSV_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def get_validation_sample_size():
+    """
+    Returns the number of rows of an upload that are type-checked before
+    anything is written.
+    :return: number of rows
+    """
+    return getattr(settings, 'CSV_VALIDATION_SAMPLE_ROWS', DEFAULT_SAMPLE_SIZE)
+
+
+def get_ingest_engine():
+    """
+    Returns the engine used to ingest CSV files, either 'python' or 'pandas'.
+    :return: engine name
+    """
+    return getattr(settings, 'CSV_INGEST_ENGINE', ENGINE_PYTHON)
+
+
+def get_ingest_mode():
+    """
+    Returns how rows whose objectId already exists are handled, either
+    'insert' (they are skipped) or 'upsert' (they are updated).
+    :return: mode name
+    """
+    return getattr(settings, 'CSV_INGEST_MODE', MODE_INSERT)
+
+
+def open_csv_text(file_obj, encoding='utf-8'):
+    """
+    Wraps a binary file object so that it can be read line by line as text.
+    :param file_obj: binary or text file object
+    :param encoding: encoding of the file
+    :return: text file object
+    """
+    if isinstance(file_obj, TextIOBase):
+        return file_obj
+    return TextIOWrapper(file_obj, encoding=encoding, newline='')
+
+
+def _to_bool(value):
+    if value in TRUE_VALUES:
+        return True
+    # like missing columns, empty values are false
+    if not value or value in FALSE_VALUES:
+        return False
+    raise ValueError(f'{value!r} is not a valid boolean')
+
+
+def _to_datetime(value):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f'{value!r} is not a valid date time')
+    if timezone.is_naive(parsed):
+        # read in the current time zone, like the model does on save
+        parsed = timezone.make_aware(parsed)
+    return parsed.astimezone(datetime.timezone.utc)
+
+
+def _make_number_converter(number_type, empty_value):
+    def convert(value):
+        return number_type(value) if value else empty_value
+    return convert
+
+
+def _make_default_converter(default):
+    def convert(value):
+        return value or default
+    return convert
+
+
+def get_field_converter(field):
+    """
+    Returns the function used to coerce a raw CSV value into the python value
+    stored on the given MuseumAPICSV field, or None if the raw string can be
+    used as it is.
+    :param field: model field
+    :return: callable or None
+    """
+    if field.primary_key:
+        return int
+    if isinstance(field, models.BooleanField):
+        return _to_bool
+    if isinstance(field, models.DateTimeField):
+        return _to_datetime
+    if isinstance(field, models.IntegerField):
+        return _make_number_converter(int, EMPTY_NUMBER_VALUE)
+    if isinstance(field, models.FloatField):
+        return _make_number_converter(float, float(EMPTY_NUMBER_VALUE))
+    if field.has_default():
+        return _make_default_converter(field.get_default())
+    return None
+
+
+class CSVColumnMapping:
+    """
+    Maps the columns of a CSV header onto the concrete fields of MuseumAPICSV.
+
+    The header is resolved once (case-insensitively, ignoring unknown columns)
+    and every row is then converted with a prebuilt itemgetter and converter
+    tuple, without building an intermediate dict per row.
+    """
+
+    def __init__(self, header):
+        columns = {name.strip().lower(): index for index, name in enumerate(header)}
+        self.width = len(header)
+        self.missing = []
+        self.missing_required = []
+
+        indexes = []
+        converters = []
+        for position, field in enumerate(MuseumAPICSV._meta.concrete_fields):
+            if field.name == HASH_FIELD:
+                # computed from the other columns once they are converted
+                self.hash_position = position
+                indexes.append(self.width)
+                continue
+            if field.name in COMPUTED_FIELDS:
+                # likewise, from the date columns
+                indexes.append(self.width)
+                continue
+            index = columns.get(field.name.lower())
+            if index is None:
+                if field.primary_key:
+                    raise ValidationError(f'CSV header is missing the {field.name} column')
+                self.missing.append(field.name)
+                if not field.null and not field.has_default():
+                    self.missing_required.append(field.name)
+                # missing columns read the empty string padded onto each row
+                index = self.width
+            indexes.append(index)
+            converter = get_field_converter(field)
+            if converter is not None:
+                converters.append((position, converter))
+
+        self.getter = itemgetter(*indexes)
+        self.converters = tuple(converters)
+        self.content_getter = itemgetter(*get_content_positions())
+        self.padding = [''] * (self.width + 1)
+
+    def to_object(self, row):
+        """
+        Builds an unsaved MuseumAPICSV object from a parsed CSV row.
+        :param row: list of column values
+        :return: MuseumAPICSV object
+        """
+        # pad short rows, and every row with the empty column read by
+        # missing and computed fields
+        row = row + self.padding[len(row):]
+        values = list(self.getter(row))
+        for position, converter in self.converters:
+            values[position] = converter(values[position])
+        values[self.hash_position] = compute_content_hash(self.content_getter(values))
+        for year_position, date_position in get_year_positions():
+            values[year_position] = get_year(values[date_position])
+        return MuseumAPICSV(*values)
+
+
+@lru_cache(maxsize=16)
+def get_column_mapping(header):
+    """
+    Returns the (cached) column mapping for a CSV header.
+    :param header: tuple of column names
+    :return: CSVColumnMapping object
+    """
+    return CSVColumnMapping(header)
+
+
+class CSVSource:
+    """
+    A CSV file that is parsed exactly once.
+
+    The header is resolved when the source is created and the first rows can
+    be converted up front by validate(); those rows are kept and replayed when
+    the source is iterated, so validation and ingest share the same pass
+    over the file.
+    """
+
+    def __init__(self, lines):
+        self.reader = csv.reader(lines)
+        header = self._read_row()
+        self.header = header or []
+        self.mapping = get_column_mapping(tuple(header)) if header else None
+        self.sample = []
+
+    def validate(self, sample_size=DEFAULT_SAMPLE_SIZE):
+        """
+        Checks that the header matches MuseumAPICSV and that the first
+        sample_size rows can be converted to model objects.
+        :param sample_size: number of rows to type-check
+        :raises ValidationError: if the header or one of the rows is invalid
+        """
+        if self.mapping is None:
+            raise ValidationError('CSV file is empty')
+        if self.mapping.missing_required:
+            raise ValidationError(
+                f'CSV header is missing required columns: {", ".join(self.mapping.missing_required)}'
+            )
+
+        # line 1 is the header
+        line_number = 1
+        while len(self.sample) < sample_size:
+            row = self._read_row()
+            if row is None:
+                break
+            line_number += 1
+            if not row:
+                continue
+            try:
+                self.sample.append(self.mapping.to_object(row))
+            except (TypeError, ValueError) as err:
+                raise ValidationError(f'Invalid value on line {line_number}: {err}')
+
+    def _read_row(self):
+        # next row, or None at the end of the file; what the file and the
+        # csv module raise on unreadable input becomes a ValidationError
+        try:
+            return next(self.reader, None)
+        except UnicodeDecodeError as err:
+            raise ValidationError(f'CSV file is not valid text: {err}')
+        except csv.Error as err:
+            raise ValidationError(f'Invalid CSV on line {self.reader.line_num}: {err}')
+
+    def __iter__(self):
+        if self.mapping is None:
+            return
+        sample, self.sample = self.sample, []
+        yield from sample
+
+        to_object = self.mapping.to_object
+        for row in self.reader:
+            if row:
+                yield to_object(row)
+
+
+def iter_museum_api_objects(lines):
+    """
+    Lazily parses CSV lines into unsaved MuseumAPICSV objects, using the
+    first line as the header.
+    :param lines: iterable of CSV lines (usually a text file object)
+    :return: generator of MuseumAPICSV objects
+    """
+    return iter(CSVSource(lines))
+
+
+def iter_batches(iterable, batch_size):
+    """
+    Splits an iterable into lists of at most batch_size items.
+    :param iterable: any iterable
+    :param batch_size: maximum number of items per batch
+    :return: generator of lists
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _prepare_rows(rows, connection):
+    """
+    Adapts the python values of rows built in model field order to what the
+    database driver expects, stamping modifiedAt with the current time and
+    filling the year columns. Only date time columns need adapting.
+    :param rows: list of tuples of python values
+    :param connection: database connection
+    :return: list of rows
+    """
+    adapt = connection.ops.adapt_datetimefield_value
+    concrete_fields = MuseumAPICSV._meta.concrete_fields
+    positions = [
+        position for position, field in enumerate(concrete_fields)
+        if isinstance(field, models.DateTimeField) and field.name != MODIFIED_FIELD
+    ]
+    modified_position = concrete_fields.index(MuseumAPICSV._meta.get_field(MODIFIED_FIELD))
+    modified = adapt(timezone.now())
+    year_positions = get_year_positions()
+    prepared = []
+    for row in rows:
+        row = list(row)
+        for position in positions:
+            if row[position] is not None:
+                row[position] = adapt(row[position])
+        row[modified_position] = modified
+        for year_position, date_position in year_positions:
+            row[year_position] = get_year(row[date_position])
+        prepared.append(row)
+    return prepared
+
+
+def _upsert_suffix_sql(connection, columns, pk_column):
+    quote_name = connection.ops.quote_name
+    updated = [column for column in columns if column != pk_column]
+    if connection.vendor == 'mysql':
+        return ' ON DUPLICATE KEY UPDATE %s' % ', '.join(
+            f'{quote_name(column)} = VALUES({quote_name(column)})' for column in updated
+        )
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return ' ON CONFLICT(%s) DO UPDATE SET %s' % (
+            quote_name(pk_column),
+            ', '.join(f'{quote_name(column)} = EXCLUDED.{quote_name(column)}' for column in updated)
+        )
+    raise NotSupportedError(f'Upsert ingest is not supported on {connection.vendor}')
+
+
+def insert_rows(rows, using=None, update=False, prepared=False):
+    """
+    Writes rows of python values, in model field order, to the MuseumAPICSV
+    table with a single executemany call.
+    :param rows: list of tuples of python values
+    :param using: database alias, defaults to the router's choice
+    :param update: if True rows whose objectId already exists are updated
+        with the database's native upsert, otherwise they are skipped
+    :param prepared: True when the values were already adapted for the
+        database driver and modifiedAt stamped, as by prepare_frame
+    """
+    connection = connections[using or router.db_for_write(MuseumAPICSV)]
+    ops = connection.ops
+    meta = MuseumAPICSV._meta
+    columns = [field.column for field in meta.concrete_fields]
+    if update:
+        statement = 'INSERT INTO'
+        suffix = _upsert_suffix_sql(connection, columns, meta.pk.column)
+    else:
+        statement = ops.insert_statement(ignore_conflicts=True)
+        suffix = ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+
+    sql = '%s %s (%s) VALUES (%s)%s' % (
+        statement,
+        ops.quote_name(meta.db_table),
+        ', '.join(ops.quote_name(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+        suffix,
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows if prepared else _prepare_rows(rows, connection))
+
+
+def load_content_hashes(ids, using=None):
+    """
+    Loads the stored content hashes of the given objectIds in bulk.
+    :param ids: list of objectIds
+    :param using: database alias, defaults to the router's choice
+    :return: dict of objectId to content hash
+    """
+    connection = connections[using or router.db_for_read(MuseumAPICSV)]
+    quote_name = connection.ops.quote_name
+    meta = MuseumAPICSV._meta
+    chunk_size = connection.ops.bulk_batch_size(['pk'], ids) or len(ids)
+    # plain SQL, the ORM spends longer building the IN lookup than the
+    # database does answering it
+    sql = 'SELECT %s, %s FROM %s WHERE %s IN (%%s)' % (
+        quote_name(meta.pk.column),
+        quote_name(meta.get_field(HASH_FIELD).column),
+        quote_name(meta.db_table),
+        quote_name(meta.pk.column),
+    )
+    hashes = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            cursor.execute(sql % ', '.join(['%s'] * len(chunk)), chunk)
+            hashes.update(cursor.fetchall())
+    return hashes
+
+
+def upsert_rows(rows, stats, using=None):
+    """
+    Upserts rows of python values, in model field order, keyed on objectId.
+    The stored content hashes of the rows are loaded first so that unchanged
+    rows are dropped before they reach the database; the outcome is counted
+    on stats.
+    :param rows: list of tuples of python values, including the content hash
+    :param stats: IngestStats object
+    :param using: database alias, defaults to the router's choice
+    :return: list of the rows that were inserted or updated
+    """
+    using = using or router.db_for_write(MuseumAPICSV)
+    pk_position, hash_position = get_key_positions()
+    stored = load_content_hashes([row[pk_position] for row in rows], using)
+
+    changed = []
+    for row in rows:
+        current = stored.get(row[pk_position])
+        if current is None:
+            stats.inserted += 1
+        elif current != row[hash_position]:
+            stats.updated += 1
+        else:
+            stats.unchanged += 1
+            continue
+        changed.append(row)
+
+    if changed:
+        insert_rows(changed, using=using, update=True)
+    return changed
+
+
+def write_batch(rows, stats, mode):
+    """
+    Writes a batch of rows in its own transaction, so an interrupted ingest
+    keeps every batch written before the failure and can simply be re-run.
+    A single change event covers the whole batch.
+    :param rows: list of tuples of python values, in model field order
+    :param stats: IngestStats object updated with the outcome
+    :param mode: 'insert' or 'upsert'
+    """
+    pk_position = get_key_positions()[0]
+    with transaction.atomic(using=router.db_for_write(MuseumAPICSV)):
+        if mode == MODE_UPSERT:
+            written = upsert_rows(rows, stats)
+        else:
+            insert_rows(rows)
+            written = rows
+        if written:
+            send_change(MuseumAPICSV, ACTION_WRITTEN, [row[pk_position] for row in written], bulk=True)
+    stats.rows += len(rows)
+    stats.batches += 1
+
+
+def ingest_objects(objects, batch_size=None, progress=None, mode=None):
+    """
+    Writes unsaved MuseumAPICSV objects to the database in fixed-size
+    batches, so peak memory is bounded by the batch size rather than the
+    number of objects.
+    :param objects: iterable of MuseumAPICSV objects (e.g. a CSVSource)
+    :param batch_size: number of rows written per batch, defaults to
+        settings.CSV_INGEST_BATCH_SIZE
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param mode: 'insert' to skip rows whose objectId already exists or
+        'upsert' to update them, defaults to settings.CSV_INGEST_MODE
+    :return: IngestStats object
+    """
+    batch_size = batch_size or get_ingest_batch_size()
+    mode = mode or get_ingest_mode()
+    stats = IngestStats(mode)
+    get_values = attrgetter(*[field.attname for field in MuseumAPICSV._meta.concrete_fields])
+    with suspend_search_index():
+        for batch in iter_batches(objects, batch_size):
+            write_batch([get_values(obj) for obj in batch], stats, mode)
+            if progress is not None:
+                progress(stats)
+    stats.finish()
+
+    logger.info('Ingested CSV: %s', stats.as_dict())
+    return stats
+
+
+def _convert_column(field, values):
+    """
+    Vectorized counterpart of get_field_converter: coerces a column of raw
+    CSV strings into the python values stored on the model.
+    :param field: model field
+    :param values: pandas Series of strings
+    :return: pandas Series of python objects
+    """
+    if field.primary_key:
+        return pd.to_numeric(values, errors='raise').astype(object)
+    if isinstance(field, models.BooleanField):
+        true = values.isin(TRUE_VALUES)
+        invalid = ~true & ~values.isin(FALSE_VALUES) & (values != '')
+        if invalid.any():
+            raise ValueError(f'{values[invalid].iloc[0]!r} is not a valid boolean')
+        return true.astype(object)
+    if not (field.has_default() or isinstance(field, (models.DateTimeField, models.IntegerField, models.FloatField))):
+        # text is stored as read
+        return values.astype(object)
+
+    empty = values == ''
+    if isinstance(field, models.DateTimeField):
+        parsed = pd.to_datetime(values.mask(empty), utc=True, errors='raise')
+        # pandas reads naive values as UTC, the model in the current time zone
+        zone = timezone.get_current_timezone_name()
+        if zone != 'UTC':
+            naive = ~empty & ~values.str.contains(UTC_OFFSET_SUFFIX, regex=True)
+            if naive.any():
+                parsed[naive] = parsed[naive].dt.tz_localize(None).dt.tz_localize(zone).dt.tz_convert('UTC')
+        return pd.Series(list(parsed.dt.to_pydatetime()), index=values.index, dtype=object).where(~empty, None)
+    elif isinstance(field, models.IntegerField):
+        values = pd.to_numeric(values.mask(empty, str(EMPTY_NUMBER_VALUE)), errors='raise').astype('int64')
+    elif isinstance(field, models.FloatField):
+        values = pd.to_numeric(values.mask(empty, str(EMPTY_NUMBER_VALUE)), errors='raise').astype('float64')
+    elif field.has_default():
+        values = values.mask(empty, field.get_default())
+    return values.astype(object)
+
+
+def convert_dataframe(chunk):
+    """
+    Converts a chunk of the Met Museum export, read with every column as a
+    string, into a frame holding one column per concrete MuseumAPICSV field
+    in model order.
+    :param chunk: pandas DataFrame whose columns are the CSV header
+    :return: pandas DataFrame of python values
+    """
+    columns = {name.strip().lower(): name for name in chunk.columns}
+    converted = {}
+    for field in MuseumAPICSV._meta.concrete_fields:
+        if field.name == HASH_FIELD or field.name in COMPUTED_FIELDS:
+            converted[field.column] = None
+            continue
+        name = columns.get(field.name.lower())
+        if name is None:
+            if field.primary_key:
+                raise ValidationError(f'CSV header is missing the {field.name} column')
+            values = pd.Series('', index=chunk.index, dtype=object)
+        else:
+            values = chunk[name]
+        converted[field.column] = _convert_column(field, values)
+    frame = pd.DataFrame(converted, index=chunk.index)
+    frame[MuseumAPICSV._meta.get_field(HASH_FIELD).column] = hash_frame(frame)
+    return frame
+
+
+def hash_frame(frame):
+    """
+    Vectorized counterpart of compute_content_hash: the values are turned
+    into text column by column, so that only the join and the digest are
+    left to do row by row.
+    :param frame: pandas DataFrame returned by convert_dataframe
+    :return: list of hex digests, one per row
+    """
+    texts = []
+    for field in get_content_fields():
+        values = frame[field.column].tolist()
+        # the other columns already hold the strings read from the CSV
+        if isinstance(field, (models.BooleanField, models.DateTimeField, models.IntegerField, models.FloatField)):
+            values = list(map(str, values))
+        texts.append(values)
+    return [hash_content_text(CONTENT_SEPARATOR.join(row)) for row in zip(*texts)]
+
+
+def prepare_frame(frame, connection):
+    """
+    Vectorized counterpart of _prepare_rows: adapts the date time columns
+    of a frame for the database driver, stamps modifiedAt and fills the
+    year columns.
+    :param frame: pandas DataFrame returned by convert_dataframe
+    :param connection: database connection
+    :return: list of rows ready for insert_rows(prepared=True)
+    """
+    adapt = connection.ops.adapt_datetimefield_value
+    date_fields = {year_field: date_field for date_field, year_field in YEAR_FIELDS}
+    columns = []
+    for field in MuseumAPICSV._meta.concrete_fields:
+        if field.name == MODIFIED_FIELD:
+            values = [adapt(timezone.now())] * len(frame)
+        elif field.name in date_fields:
+            values = frame[MuseumAPICSV._meta.get_field(date_fields[field.name]).column].map(get_year).tolist()
+        else:
+            values = frame[field.column].tolist()
+            if isinstance(field, models.DateTimeField):
+                values = [None if value is None else adapt(value) for value in values]
+        columns.append(values)
+    return list(zip(*columns))
+
+
+def write_frame(frame, stats, mode):
+    """
+    Vectorized counterpart of write_batch: unchanged rows are found by
+    comparing the hash columns, and only the rows left are turned into
+    tuples for the database.
+    :param frame: pandas DataFrame returned by convert_dataframe
+    :param stats: IngestStats object updated with the outcome
+    :param mode: 'insert' or 'upsert'
+    """
+    meta = MuseumAPICSV._meta
+    using = router.db_for_write(MuseumAPICSV)
+    object_ids = frame[meta.pk.column]
+    rows = len(frame)
+    with transaction.atomic(using=using):
+        if mode == MODE_UPSERT:
+            stored = object_ids.map(load_content_hashes(object_ids.tolist(), using))
+            new = stored.isna()
+            unchanged = stored == frame[meta.get_field(HASH_FIELD).column]
+            stats.inserted += int(new.sum())
+            stats.unchanged += int(unchanged.sum())
+            stats.updated += rows - int(new.sum()) - int(unchanged.sum())
+            frame = frame[~unchanged]
+            object_ids = object_ids[~unchanged]
+        if len(frame):
+            insert_rows(prepare_frame(frame, connections[using]), using=using, update=mode == MODE_UPSERT,
+                        prepared=True)
+            send_change(MuseumAPICSV, ACTION_WRITTEN, object_ids.tolist(), bulk=True)
+    stats.rows += rows
+    stats.batches += 1
+
+
+def ingest_csv_vectorized(file_obj, batch_size=None, chunk_size=DEFAULT_CHUNK_SIZE, encoding='utf-8',
+                          progress=None, mode=None):
+    """
+    Pandas based ingest for bulk loads. The CSV is read chunk_size rows at a
+    time with every column as a string, the null-to-default fills, boolean
+    coercion and date parsing are done column-wise, and the resulting rows
+    are written batch by batch without instantiating model objects.
+    :param file_obj: path, binary or text file object containing the CSV
+    :param batch_size: number of rows per executemany call
+    :param chunk_size: number of rows parsed per pandas chunk
+    :param encoding: encoding of the file
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param mode: 'insert' or 'upsert', defaults to settings.CSV_INGEST_MODE
+    :return: IngestStats object
+    """
+    batch_size = batch_size or get_ingest_batch_size()
+    mode = mode or get_ingest_mode()
+    stats = IngestStats(mode)
+    reader = pd.read_csv(
+        file_obj,
+        # plain python strings: the column-wise conversions are done on
+        # object arrays, which pandas' arrow backed strings would copy
+        dtype=object,
+        na_filter=False,
+        chunksize=chunk_size,
+        encoding=encoding,
+    )
+    with reader, suspend_search_index():
+        for chunk in reader:
+            frame = convert_dataframe(chunk)
+            for start in range(0, len(frame), batch_size):
+                write_frame(frame.iloc[start:start + batch_size], stats, mode)
+                if progress is not None:
+                    progress(stats)
+    stats.finish()
+
+    logger.info('Ingested CSV with the pandas engine: %s', stats.as_dict())
+    return stats
+
+
+def ingest_csv(file_obj, batch_size=None, encoding='utf-8', engine=None, progress=None, mode=None,
+               sample_size=None):
+    """
+    Streams a CSV file into the MuseumAPICSV table in fixed-size batches.
+    :param file_obj: binary or text file object containing the CSV
+    :param batch_size: number of rows written per batch
+    :param encoding: encoding of the file
+    :param engine: 'python' for the row by row pipeline or 'pandas' for the
+        vectorized one, defaults to settings.CSV_INGEST_ENGINE
+    :param progress: optional callable invoked with the IngestStats after
+        every batch
+    :param mode: 'insert' to skip rows whose objectId already exists or
+        'upsert' to update them, defaults to settings.CSV_INGEST_MODE
+    :param sample_size: if given, the header and the first sample_size rows
+        are validated before anything is written; the python engine then
+        ingests the validated rows without parsing them again, the pandas
+        engine converts every chunk before writing it anyway
+    :return: IngestStats object
+    :raises ValidationError: if the header or one of the sample rows is
+        invalid
+    """
+    if (engine or get_ingest_engine()) == ENGINE_PANDAS:
+        return ingest_csv_vectorized(file_obj, batch_size=batch_size, encoding=encoding, progress=progress,
+                                     mode=mode)
+    source = CSVSource(open_csv_text(file_obj, encoding))
+    if sample_size is not None:
+        source.validate(sample_size)
+    return ingest_objects(source, batch_size, progress, mode)
@@ -0,0 +1,225 @@
+"""
+    Contains the background job queue used to ingest uploaded CSV files and
+    restore S3 backups outside of the request/response cycle.
+"""
+
+import datetime
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from practice_app.backup import get_chain_size, get_restore_chain, restore_chain
+from practice_app.ingest import get_validation_sample_size, ingest_csv
+from practice_app.models import CSVUploadJob, JOB_STATUS_DONE, JOB_STATUS_FAILED, JOB_STATUS_RUNNING
+from practice_app.notifications import enqueue_notification
+from practice_app.parallel import get_ingest_processes, ingest_csv_parallel
+from .utils import get_s3_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide thread pool that runs upload jobs, creating it
+    on first use.
+    :return: ThreadPoolExecutor object
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CSV_UPLOAD_WORKERS', DEFAULT_WORKERS),
+                thread_name_prefix='csv-upload'
+            )
+    return _executor
+
+
+def get_spool_dir():
+    """
+    Returns the directory uploads are spooled to, creating it if needed.
+    :return: directory path
+    """
+    spool_dir = str(getattr(settings, 'CSV_UPLOAD_SPOOL_DIR', '') or tempfile.gettempdir())
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+def create_upload_job(uploaded_file):
+    """
+    Copies an uploaded file to the spool directory chunk by chunk and
+    records a pending job for it.
+    :param uploaded_file: UploadedFile object
+    :return: CSVUploadJob object
+    """
+    uploaded_file.seek(0)
+    fd, spool_path = tempfile.mkstemp(prefix='upload-', suffix='.csv', dir=get_spool_dir())
+    with os.fdopen(fd, 'wb') as spool_file:
+        for chunk in uploaded_file.chunks():
+            spool_file.write(chunk)
+
+    return CSVUploadJob.objects.create(
+        file_name=uploaded_file.name,
+        spool_path=spool_path,
+        bytes_total=os.path.getsize(spool_path),
+    )
+
+
+def create_restore_job(bucket):
+    """
+    Records a pending job restoring the backups of a bucket.
+    :param bucket: bucket name
+    :return: CSVUploadJob object
+    """
+    return CSVUploadJob.objects.create(file_name=f's3://{bucket}', spool_path='')
+
+
+def _submit(runner, job):
+    if getattr(settings, 'CSV_UPLOAD_JOBS_ASYNC', True):
+        get_executor().submit(_run_in_worker, runner, job.pk)
+    else:
+        runner(job.pk)
+
+
+def submit_upload_job(job):
+    """
+    Queues a job on the background thread pool. When CSV_UPLOAD_JOBS_ASYNC
+    is False the job runs immediately in the calling thread instead.
+    :param job: CSVUploadJob object
+    """
+    _submit(run_upload_job, job)
+
+
+def submit_restore_job(job):
+    """
+    Same as submit_upload_job, for a job created by create_restore_job.
+    :param job: CSVUploadJob object
+    """
+    _submit(run_restore_job, job)
+
+
+def _run_in_worker(runner, job_id):
+    try:
+        runner(job_id)
+    except Exception:
+        logger.exception('Job %s crashed', job_id)
+    finally:
+        # worker threads own their database connection
+        connection.close()
+
+
+def _start_job(job_id):
+    job = CSVUploadJob.objects.get(pk=job_id)
+    job.status = JOB_STATUS_RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def _record_progress(job_id, stats, bytes_processed, **extra):
+    CSVUploadJob.objects.filter(pk=job_id).update(
+        rows_processed=stats.rows,
+        rows_inserted=stats.inserted,
+        rows_updated=stats.updated,
+        rows_unchanged=stats.unchanged,
+        bytes_processed=bytes_processed,
+        **extra
+    )
+
+
+def _fail_job(job_id, error):
+    CSVUploadJob.objects.filter(pk=job_id).update(
+        status=JOB_STATUS_FAILED,
+        error=str(error),
+        finished_at=timezone.now(),
+    )
+
+
+def run_upload_job(job_id):
+    """
+    Ingests the spooled file of a job, recording progress after every batch,
+    and removes the spooled file once done. The header and the first rows
+    are validated before anything is written, in the same pass that ingests
+    them; an invalid file fails the job with the validation error.
+    :param job_id: primary key of the CSVUploadJob
+    """
+    job = _start_job(job_id)
+
+    try:
+        with open(job.spool_path, 'rb') as spool_file:
+            def progress(stats):
+                bytes_read = stats.bytes_read if stats.bytes_read is not None else spool_file.tell()
+                _record_progress(job_id, stats, min(bytes_read, job.bytes_total))
+
+            if get_ingest_processes() > 1:
+                stats = ingest_csv_parallel(job.spool_path, progress=progress)
+            else:
+                stats = ingest_csv(spool_file, progress=progress, sample_size=get_validation_sample_size())
+    except ValidationError as err:
+        logger.warning('Upload job %s refused: %s', job_id, err)
+        _fail_job(job_id, ' '.join(err.messages))
+        return
+    except Exception as err:
+        logger.exception('Upload job %s failed', job_id)
+        _fail_job(job_id, err)
+        return
+    finally:
+        if os.path.exists(job.spool_path):
+            os.remove(job.spool_path)
+
+    with transaction.atomic():
+        _record_progress(job_id, stats, job.bytes_total, status=JOB_STATUS_DONE, finished_at=timezone.now())
+        enqueue_notification(
+            f'[CRUD App] CSV file {job.file_name} has been successfully uploaded - {datetime.datetime.now()}',
+            f'Hi,\n\n A CSV file {job.file_name} has been successfully uploaded to the server.'
+            f' \n\nRegards,\nXYZ'
+        )
+    logger.info('Upload job %s finished: %s', job_id, stats.as_dict())
+
+
+def run_restore_job(job_id):
+    """
+    Restores the backups of the bucket of a job, streaming them from S3 in
+    BACKUP_RESTORE_BATCH_SIZE row transactions and recording progress after
+    every batch.
+    :param job_id: primary key of the CSVUploadJob
+    """
+    _start_job(job_id)
+    bucket = settings.BACKUP_BUCKET_NAME
+
+    try:
+        s3 = get_s3_client('default')
+        chain = get_restore_chain(s3, bucket)
+        if not chain:
+            _fail_job(job_id, 'Nothing to restore')
+            return
+        bytes_total = get_chain_size(s3, bucket, chain)
+        CSVUploadJob.objects.filter(pk=job_id).update(bytes_total=bytes_total)
+
+        def progress(stats):
+            _record_progress(job_id, stats, min(stats.bytes_read, bytes_total))
+
+        stats = restore_chain(s3, bucket, chain, progress=progress)
+    except Exception as err:
+        logger.exception('Restore job %s failed', job_id)
+        _fail_job(job_id, err)
+        return
+
+    with transaction.atomic():
+        _record_progress(job_id, stats, bytes_total, status=JOB_STATUS_DONE, finished_at=timezone.now())
+        enqueue_notification(
+            f'[CRUD App] Restoration Completed - {datetime.datetime.now()}',
+            'Hi,\n\nData has been successfully restored.\n\nRegards,\nXYZ'
+        )
+    logger.info('Restore job %s finished: %s', job_id, stats.as_dict())
@@ -0,0 +1,135 @@
+"""
+    Contains the column projection shared by the listing page and the rows
+    API. Only the columns picked by the client are read from the database.
+    Rows can be filtered and sorted on the indexed columns, see filters.py.
+
+    Pages are cached for LISTING_CACHE_TIMEOUT seconds under the version of
+    the table their ETag is built from, which every committed write
+    increments in the database, so that no process serves a page with the
+    ETag of newer data. The rows are cached rather than the rendered page,
+    whose forms carry the CSRF token of the user.
+"""
+
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from practice_app.caching import get_listing_cache_timeout, make_cache_key
+from practice_app.filters import get_default_sort, get_filters, get_order_by, get_sort
+from practice_app.models import MuseumAPICSV
+from practice_app.pagination import get_page_size, KeysetPage
+from practice_app.versions import get_etag, get_request_version
+
+# the model does not change at runtime, so its columns are only looked up once
+HEADINGS = tuple(f.name for f in MuseumAPICSV._meta.get_fields() if f.editable)
+KEY_COLUMN = MuseumAPICSV._meta.pk.name
+DEFAULT_COLUMNS = (KEY_COLUMN, 'title', 'artistDisplayName', 'department', 'objectDate')
+LISTING_CACHE_PREFIX = 'museum_data:listing'
+
+
+def get_listing_columns(values=None):
+    """
+    Returns the columns to display, in model order. Unknown names are
+    ignored, CSV_LIST_DEFAULT_COLUMNS is used when none are left, and
+    objectId is always included since the row links and cursors need it.
+    :param values: list of column names or comma separated column names,
+        usually request.GET.getlist('columns')
+    :return: list of column names
+    """
+    requested = set()
+    for value in values or ():
+        requested.update(name.strip() for name in value.split(','))
+    requested.intersection_update(HEADINGS)
+    if not requested:
+        requested = set(getattr(settings, 'CSV_LIST_DEFAULT_COLUMNS', None) or DEFAULT_COLUMNS)
+    requested.add(KEY_COLUMN)
+    return [name for name in HEADINGS if name in requested]
+
+
+class ListingPage:
+    """
+    Rows and cursors of a page of the listing, as kept in the cache.
+    """
+
+    def __init__(self, object_list, page_size, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # set on the copies read from the cache
+        self.from_cache = False
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['from_cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, from_cache=True)
+
+
+def _fetch_listing_page(columns, filters, sort, descending, after, before, page_size):
+    if sort is None:
+        sort = get_default_sort(filters)
+    order_by = get_order_by(sort, descending)
+    queryset = MuseumAPICSV.objects.filter(**filters)
+
+    selected = list(columns)
+    key = itemgetter(selected.index(KEY_COLUMN))
+    if order_by is not None:
+        # the cursor needs the sort value, read it even if it is not displayed
+        sort_column = order_by.lstrip('-')
+        sort_column = KEY_COLUMN if sort_column == 'pk' else sort_column
+        if sort_column not in selected:
+            selected.append(sort_column)
+        key = itemgetter(selected.index(sort_column), selected.index(KEY_COLUMN))
+
+    page = KeysetPage(
+        queryset.values_list(*selected),
+        after=after,
+        before=before,
+        page_size=page_size,
+        key=key,
+        order_by=order_by,
+    )
+    rows = page.object_list
+    if len(selected) > len(columns):
+        rows = [row[:len(columns)] for row in rows]
+    return ListingPage(rows, page.page_size, page.next_cursor, page.previous_cursor)
+
+
+def get_listing_page(request):
+    """
+    Fetches the page of rows addressed by the query string of a request,
+    reading only the selected columns of the rows matching its filters, in
+    the order of its sort parameter, from the cache when it holds the page.
+    :param request: HTTPRequest object
+    :return: tuple of list of column names and ListingPage object
+    """
+    columns = get_listing_columns(request.GET.getlist('columns'))
+    filters = get_filters(request.GET)
+    sort, descending = get_sort(request.GET.get('sort'))
+    after = request.GET.get('after')
+    before = None if after else request.GET.get('before')
+    page_size = get_page_size(request.GET.get('page_size'))
+
+    timeout = get_listing_cache_timeout()
+    if not timeout:
+        return columns, _fetch_listing_page(columns, filters, sort, descending, after, before, page_size)
+
+    cache_key = make_cache_key(
+        LISTING_CACHE_PREFIX, get_etag(get_request_version(request)),
+        columns, sorted(filters.items()), sort, descending, after, before, page_size,
+    )
+    page = cache.get(cache_key)
+    if page is None:
+        page = _fetch_listing_page(columns, filters, sort, descending, after, before, page_size)
+        cache.set(cache_key, page, timeout)
+    return columns, page
@@ -0,0 +1,96 @@
+"""
+    Helpers shared by the benchmark management commands.
+"""
+
+import csv
+import datetime
+import random
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from practice_app.models import MuseumAPICSV
+
+DEPARTMENTS = (
+    'The American Wing', 'Arms and Armor', 'Asian Art', 'Egyptian Art',
+    'European Paintings', 'Greek and Roman Art', 'Islamic Art', 'Medieval Art',
+)
+CLASSIFICATIONS = ('Coins', 'Ceramics', 'Paintings', 'Prints', 'Sculpture', 'Textiles', '')
+CULTURES = ('American', 'Chinese', 'Egyptian', 'French', 'Greek', 'Japanese', 'Roman', '')
+NATIONALITIES = ('American', 'British', 'Chinese', 'French', 'Japanese', 'Mexican', '')
+ARTISTS = ('James Barton Longacre', 'Christian Gobrecht', 'Augustus Saint-Gaudens', 'Katsushika Hokusai', '')
+
+
+@contextmanager
+def benchmark_database(using=DEFAULT_DB_ALIAS):
+    """
+    Runs the enclosed block against a freshly created test database, so that
+    benchmarks never touch the data in the configured database.
+    :param using: database alias
+    """
+    connection = connections[using]
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=False)
+
+
+def synthetic_row(object_id, rng):
+    """
+    Builds a row resembling one of the Met Museum export, keyed by field name.
+    :param object_id: objectId of the row
+    :param rng: random.Random instance
+    :return: dict of field name to CSV value
+    """
+    year = rng.randint(1800, 2020)
+    artist = rng.choice(ARTISTS)
+    metadata_date = datetime.datetime(2021, 4, 6, 4, 41, 4, tzinfo=datetime.timezone.utc) + \
+        datetime.timedelta(seconds=object_id)
+    row = {field.name: '' for field in MuseumAPICSV._meta.concrete_fields}
+    row.update({
+        'objectId': object_id,
+        'isHighlight': rng.random() < 0.05,
+        'accessionNumber': f'{year}.{object_id}',
+        'accessionYear': year,
+        'isPublicDomain': rng.random() < 0.5,
+        'department': rng.choice(DEPARTMENTS),
+        'objectName': 'Coin',
+        'title': f'Object {object_id}',
+        'culture': rng.choice(CULTURES),
+        'artistDisplayName': artist,
+        'artistNationality': rng.choice(NATIONALITIES),
+        'artistAlphaSort': artist,
+        'objectDate': year,
+        'objectBeginDate': year,
+        'objectEndDate': year + rng.randint(0, 5),
+        'medium': 'Gold',
+        'dimensions': 'Dimensions unavailable',
+        'creditLine': f'Gift of Donor {object_id % 997}, {year}',
+        'classification': rng.choice(CLASSIFICATIONS),
+        'metadataDate': metadata_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'repository': 'Metropolitan Museum of Art, New York, NY',
+        'objectURL': f'https://www.metmuseum.org/art/collection/search/{object_id}',
+        'isTimelineWork': rng.random() < 0.1,
+        'galleryNumber': rng.choice(('', rng.randint(100, 999))),
+        'constituentID': rng.choice(('', float(rng.randint(1000, 200000)))),
+        'gender': rng.choice(('', 'male', 'female')),
+    })
+    return row
+
+
+def write_synthetic_csv(path, rows, seed=404):
+    """
+    Writes a synthetic Met Museum export with the given number of rows.
+    :param path: destination file path
+    :param rows: number of rows to generate
+    :param seed: seed for the random generator, so runs are repeatable
+    """
+    rng = random.Random(seed)
+    header = [field.name for field in MuseumAPICSV._meta.concrete_fields]
+    with open(path, 'w', encoding='utf-8', newline='') as file_ptr:
+        writer = csv.DictWriter(file_ptr, fieldnames=header)
+        writer.writeheader()
+        for object_id in range(1, rows + 1):
+            writer.writerow(synthetic_row(object_id, rng))
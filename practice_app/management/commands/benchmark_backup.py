@@ -0,0 +1,64 @@
+"""
+    Management command that benchmarks the backup formats.
+"""
+
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from practice_app.formats import FORMATS, ingest_backup, iter_backup_bytes
+from practice_app.ingest import ENGINE_PANDAS, ingest_csv
+from practice_app.models import MuseumAPICSV
+from ._benchmark import benchmark_database, write_synthetic_csv
+
+
+class Command(BaseCommand):
+    help = 'Compares size, backup time and restore time of the backup formats on a synthetic Met Museum ' \
+           'export, using a throwaway test database. Backups are written to local temporary files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to generate')
+        parser.add_argument(
+            '--format',
+            action='append',
+            choices=FORMATS,
+            help='format to benchmark, may be repeated (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        backup_formats = options['format'] or FORMATS
+
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir, benchmark_database():
+            csv_path = os.path.join(tmp_dir, 'museum_data.csv')
+            self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+            write_synthetic_csv(csv_path, options['rows'])
+            with open(csv_path, 'rb') as file_ptr, transaction.atomic():
+                ingest_csv(file_ptr, engine=ENGINE_PANDAS)
+
+            for backup_format in backup_formats:
+                backup_path = os.path.join(tmp_dir, f'backup.{backup_format}')
+                started = time.perf_counter()
+                with open(backup_path, 'wb') as file_ptr:
+                    for chunk in iter_backup_bytes(backup_format):
+                        file_ptr.write(chunk)
+                backup_seconds = time.perf_counter() - started
+
+                MuseumAPICSV.objects.all().delete()
+                started = time.perf_counter()
+                with open(backup_path, 'rb') as file_ptr, transaction.atomic():
+                    ingest_backup(file_ptr)
+                restore_seconds = time.perf_counter() - started
+
+                results.append((backup_format, os.path.getsize(backup_path), backup_seconds, restore_seconds))
+
+        baseline = results[0][1] or 1
+        self.stdout.write(f'{"format":<8} {"MB":>9} {"ratio":>7} {"backup s":>9} {"restore s":>10}')
+        for backup_format, size, backup_seconds, restore_seconds in results:
+            self.stdout.write(
+                f'{backup_format:<8} {size / (1024 * 1024):>9.2f} {baseline / size:>6.1f}x '
+                f'{backup_seconds:>9.2f} {restore_seconds:>10.2f}'
+            )
@@ -0,0 +1,81 @@
+"""
+    Management command that benchmarks the facet index against the GROUP BY
+    queries it replaces.
+"""
+
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from practice_app.facets import FACET_FIELDS, FacetIndex
+from practice_app.ingest import ENGINE_PANDAS, ingest_csv
+from practice_app.models import MuseumAPICSV
+from ._benchmark import benchmark_database, write_synthetic_csv
+
+# from no filter at all to a handful of matching rows
+CASES = (
+    {},
+    {'department': ['Asian Art']},
+    {'department': ['Asian Art'], 'classification': ['Coins']},
+    {'department': ['Asian Art', 'Islamic Art'], 'culture': ['Chinese', 'Japanese']},
+    {'department': ['Asian Art'], 'classification': ['Coins'], 'culture': ['Chinese'],
+     'artistNationality': ['Japanese']},
+)
+
+
+def database_query(filters, page_size):
+    # the same answer read from the database, one GROUP BY per facet
+    counts = {}
+    for field in FACET_FIELDS:
+        queryset = MuseumAPICSV.objects.filter(
+            **{f'{name}__in': values for name, values in filters.items() if name != field}
+        )
+        counts[field] = list(
+            queryset.exclude(**{field: ''}).values(field).annotate(rows=Count('pk')).order_by('-rows')[:10]
+        )
+    queryset = MuseumAPICSV.objects.filter(**{f'{name}__in': values for name, values in filters.items()})
+    return queryset.count(), list(queryset.order_by('pk').values_list('pk', flat=True)[:page_size]), counts
+
+
+class Command(BaseCommand):
+    help = 'Times faceted queries answered by the facet index and by GROUP BY queries on a synthetic Met ' \
+           'Museum export, using a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='number of synthetic rows to generate')
+        parser.add_argument('--repeat', type=int, default=20, help='number of times each query is run')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+
+        def timed(func):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = func()
+            return result, (time.perf_counter() - started) * 1000 / repeat
+
+        with tempfile.TemporaryDirectory() as tmp_dir, benchmark_database():
+            csv_path = os.path.join(tmp_dir, 'museum_data.csv')
+            self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+            write_synthetic_csv(csv_path, options['rows'])
+            with open(csv_path, 'rb') as file_ptr, transaction.atomic():
+                ingest_csv(file_ptr, engine=ENGINE_PANDAS)
+
+            index = FacetIndex()
+            started = time.perf_counter()
+            index.load()
+            self.stdout.write(f'Index loaded in {time.perf_counter() - started:.2f}s')
+
+            self.stdout.write(f'{"filters":<60} {"rows":>7} {"index ms":>9} {"GROUP BY ms":>12}')
+            for filters in CASES:
+                result, index_ms = timed(lambda: index.query(filters, page_size=50))
+                count, _, _ = database_query(filters, 50)
+                _, database_ms = timed(lambda: database_query(filters, 50))
+                if count != result.count:
+                    self.stderr.write(f'Counts differ for {filters}: {result.count} != {count}')
+                label = ' & '.join(f'{name}={"|".join(values)}' for name, values in filters.items()) or 'all rows'
+                self.stdout.write(f'{label[:60]:<60} {result.count:>7} {index_ms:>9.3f} {database_ms:>12.2f}')
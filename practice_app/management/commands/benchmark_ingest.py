@@ -0,0 +1,124 @@
+"""
+    Management command that benchmarks the CSV ingest engines against the
+    row loop uploads used before them.
+"""
+
+import csv
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, transaction
+
+from practice_app.ingest import DEFAULT_BATCH_SIZE, ENGINE_PANDAS, ENGINE_PYTHON, IngestStats, ingest_csv
+from practice_app.models import MuseumAPICSV, get_content_fields
+from practice_app.parallel import ingest_csv_parallel
+from ._benchmark import benchmark_database, write_synthetic_csv
+
+ORIGINAL = 'original'
+# speedup of the pandas engine over the original loop it was written to beat
+DEFAULT_TARGET = 5.0
+# null-to-default fills of the original loop, every other column fell back to ''
+ORIGINAL_DEFAULTS = {'galleryNumber': -1, 'constituentID': -1, 'artistGender': 'm', 'gender': 'male'}
+
+
+def ingest_original(csv_path):
+    # what uploads did before the ingest pipeline: the whole file read into
+    # model objects by csv_to_museum_api_objects, then a single bulk_create
+    stats = IngestStats()
+    names = [MuseumAPICSV._meta.pk.name] + [field.name for field in get_content_fields()]
+    with open(csv_path, 'r', encoding='utf-8') as file_ptr:
+        csv_content = file_ptr.read()
+    objects = [
+        MuseumAPICSV(**{name: row[name] or ORIGINAL_DEFAULTS.get(name, '') for name in names})
+        for row in csv.DictReader(csv_content.split('\n'))
+    ]
+    MuseumAPICSV.objects.bulk_create(objects)
+    stats.rows = len(objects)
+    stats.batches = 1
+    stats.finish()
+    return stats
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the CSV ingest engines on a synthetic Met Museum export, using a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to generate')
+        parser.add_argument('--csv', help='ingest this CSV file instead of generating one')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            '--engine',
+            action='append',
+            choices=(ORIGINAL, ENGINE_PYTHON, ENGINE_PANDAS),
+            help='engine to benchmark, may be repeated (default: all); speedups are relative to the first one'
+        )
+        parser.add_argument(
+            '--target',
+            type=float,
+            default=DEFAULT_TARGET,
+            help='fail unless the pandas engine is at least this many times faster than the original loop'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            nargs='+',
+            help='benchmark the multi-process ingest with each of these process counts instead, '
+                 'e.g. --processes 1 2 4 8 16 (needs a database that accepts concurrent writers)'
+        )
+
+    def handle(self, *args, **options):
+        engines = options['engine'] or [ORIGINAL, ENGINE_PYTHON, ENGINE_PANDAS]
+        if options['processes']:
+            engine = (options['engine'] or [ENGINE_PYTHON])[0]
+            if engine == ORIGINAL:
+                raise CommandError('The original loop cannot be run by several processes')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = options['csv']
+            if csv_path is None:
+                csv_path = os.path.join(tmp_dir, 'museum_data.csv')
+                self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+                write_synthetic_csv(csv_path, options['rows'])
+
+            results = []
+            with benchmark_database():
+                if options['processes']:
+                    for processes in options['processes']:
+                        MuseumAPICSV.objects.all().delete()
+                        try:
+                            stats = ingest_csv_parallel(
+                                csv_path,
+                                processes=processes,
+                                batch_size=options['batch_size'],
+                                engine=engine
+                            )
+                        except NotSupportedError as err:
+                            raise CommandError(err)
+                        results.append((f'{processes} proc', stats.as_dict()))
+                else:
+                    for engine in engines:
+                        MuseumAPICSV.objects.all().delete()
+                        with open(csv_path, 'rb') as file_ptr, transaction.atomic():
+                            if engine == ORIGINAL:
+                                stats = ingest_original(csv_path)
+                            else:
+                                stats = ingest_csv(file_ptr, batch_size=options['batch_size'], engine=engine)
+                        results.append((engine, stats.as_dict()))
+
+        baseline = results[0][1]['rows_per_sec'] or 1
+        self.stdout.write(f'{"run":<8} {"rows":>10} {"seconds":>9} {"rows/sec":>11} {"speedup":>8} {"peak RSS KB":>12}')
+        for run, result in results:
+            self.stdout.write(
+                f'{run:<8} {result["rows"]:>10} {result["elapsed"]:>9.2f} {result["rows_per_sec"]:>11.1f} '
+                f'{result["rows_per_sec"] / baseline:>7.1f}x {result["peak_rss_kb"] or "n/a":>12}'
+            )
+
+        speeds = {run: result['rows_per_sec'] for run, result in results}
+        if ORIGINAL in speeds and ENGINE_PANDAS in speeds:
+            speedup = speeds[ENGINE_PANDAS] / (speeds[ORIGINAL] or 1)
+            if speedup < options['target']:
+                raise CommandError(
+                    f'The pandas engine is {speedup:.1f}x the original loop, below the {options["target"]}x target'
+                )
@@ -0,0 +1,106 @@
+"""
+    Management command that benchmarks the filters and sorts of the listing
+    and checks that each of them is served by an index.
+"""
+
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connection, transaction
+from django.http import QueryDict
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from practice_app.filters import find_table_scans
+from practice_app.ingest import ENGINE_PANDAS, ingest_csv
+from practice_app.listing import get_listing_page
+from practice_app.models import MuseumAPICSV
+from ._benchmark import benchmark_database, write_synthetic_csv
+
+# query strings of the listing, selective enough for an index to beat a scan
+CASES = (
+    'accessionNumber={accession_number}',
+    'department=Asian Art',
+    'artistDisplayName=Katsushika Hokusai',
+    'classification=Coins',
+    'isHighlight=true',
+    'objectBeginDate__gte=2019',
+    'objectEndDate__lte=1801',
+    'department=Asian Art&classification=Coins',
+    'department=Asian Art&isHighlight=true',
+    'department=Asian Art&objectBeginDate__gte=2010',
+    'department=Asian Art&sort=-objectBeginDate',
+    'classification=Coins&sort=department',
+    'sort=artistDisplayName',
+    'sort=-objectEndDate',
+)
+
+
+class Command(BaseCommand):
+    help = 'Times the first two pages of the listing for each supported filter and sort on a synthetic Met ' \
+           'Museum export, using a throwaway test database, and fails if any of them scans the whole table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='number of synthetic rows to generate')
+        parser.add_argument('--repeat', type=int, default=20, help='number of times each page is fetched')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        failures = []
+
+        # times the queries, not the cache of the listing
+        with tempfile.TemporaryDirectory() as tmp_dir, benchmark_database(), \
+                override_settings(LISTING_CACHE_TIMEOUT=0):
+            csv_path = os.path.join(tmp_dir, 'museum_data.csv')
+            self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+            write_synthetic_csv(csv_path, options['rows'])
+            with open(csv_path, 'rb') as file_ptr, transaction.atomic():
+                ingest_csv(file_ptr, engine=ENGINE_PANDAS)
+            with connection.cursor() as cursor:
+                # gives the planner the statistics a production database has
+                cursor.execute(
+                    'ANALYZE' if connection.vendor == 'sqlite' else f'ANALYZE TABLE {MuseumAPICSV._meta.db_table}'
+                )
+
+            accession_number = MuseumAPICSV.objects.values_list('accessionNumber', flat=True) \
+                .get(pk=options['rows'] // 2 or 1)
+
+            self.stdout.write(f'{"query":<50} {"page 1 ms":>10} {"page 2 ms":>10}  plan')
+            for case in CASES:
+                query = case.format(accession_number=accession_number)
+                params = QueryDict(query, mutable=True)
+                timings = []
+                scans = []
+                after = None
+                for _ in range(2):
+                    if after is not None:
+                        params['after'] = after
+                    request = factory.get('/', params)
+                    with CaptureQueriesContext(connection) as queries:
+                        _, page = get_listing_page(request)
+                    try:
+                        for captured in queries.captured_queries:
+                            scans.extend(find_table_scans(captured['sql']))
+                    except NotSupportedError as err:
+                        raise CommandError(err)
+
+                    started = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        get_listing_page(request)
+                    timings.append((time.perf_counter() - started) * 1000 / options['repeat'])
+                    after = page.next_cursor
+                    if after is None:
+                        timings.append(0.0)
+                        break
+
+                if scans:
+                    failures.append(query)
+                self.stdout.write(
+                    f'{query:<50} {timings[0]:>10.2f} {timings[1]:>10.2f}  {"; ".join(scans) or "index"}'
+                )
+
+        if failures:
+            raise CommandError(f'Table scans for: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('Every filter and sort is served by an index'))
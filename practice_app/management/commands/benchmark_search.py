@@ -0,0 +1,66 @@
+"""
+    Management command that benchmarks the full-text search against the
+    icontains filters it replaces.
+"""
+
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from practice_app.ingest import ENGINE_PANDAS, ingest_csv
+from practice_app.listing import DEFAULT_COLUMNS
+from practice_app.models import MuseumAPICSV
+from practice_app.search import get_search_terms, SEARCH_COLUMNS, SearchPage
+from ._benchmark import benchmark_database, write_synthetic_csv
+
+# from one matching row to a fifth of the table
+QUERIES = ('object 4242', 'hokusai', 'saint gaud', 'roman', 'gaudens japanese', 'unicorn')
+
+
+def icontains_page(query, page_size):
+    # what searching took without the index: every word in any column
+    queryset = MuseumAPICSV.objects.all()
+    for term in get_search_terms(query):
+        condition = Q()
+        for column in SEARCH_COLUMNS:
+            condition |= Q(**{f'{column}__icontains': term})
+        queryset = queryset.filter(condition)
+    return list(queryset.order_by('pk').values_list(*DEFAULT_COLUMNS)[:page_size])
+
+
+class Command(BaseCommand):
+    help = 'Times the first two pages of full-text search results and the first page of the equivalent ' \
+           'icontains filter on a synthetic Met Museum export, using a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='number of synthetic rows to generate')
+        parser.add_argument('--repeat', type=int, default=10, help='number of times each page is fetched')
+        parser.add_argument('--page-size', type=int, default=50, help='number of results per page')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        page_size = options['page_size']
+
+        def timed(func):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                result = func()
+            return result, (time.perf_counter() - started) * 1000 / repeat
+
+        with tempfile.TemporaryDirectory() as tmp_dir, benchmark_database():
+            csv_path = os.path.join(tmp_dir, 'museum_data.csv')
+            self.stdout.write(f'Generating {options["rows"]} synthetic rows...')
+            write_synthetic_csv(csv_path, options['rows'])
+            with open(csv_path, 'rb') as file_ptr, transaction.atomic():
+                ingest_csv(file_ptr, engine=ENGINE_PANDAS)
+
+            self.stdout.write(f'{"query":<20} {"rows":>6} {"page 1 ms":>10} {"page 2 ms":>10} {"icontains ms":>13}')
+            for query in QUERIES:
+                page, first = timed(lambda: SearchPage(query, DEFAULT_COLUMNS, page=1, page_size=page_size))
+                _, second = timed(lambda: SearchPage(query, DEFAULT_COLUMNS, page=2, page_size=page_size))
+                _, scan = timed(lambda: icontains_page(query, page_size))
+                self.stdout.write(f'{query:<20} {len(page):>6} {first:>10.2f} {second:>10.2f} {scan:>13.2f}')
@@ -0,0 +1,27 @@
+"""
+    Management command that publishes the pending SNS notifications.
+"""
+
+from django.core.management.base import BaseCommand
+
+from practice_app.notifications import dispatch_notifications, run_dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Publishes the notifications waiting in the outbox, retrying failed ones with backoff. ' \
+           'Runs until interrupted unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='publish the notifications that are due and exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            sent, failed = dispatch_notifications()
+            self.stdout.write(f'{sent} notifications published, {failed} failed')
+            return
+
+        self.stdout.write('Publishing notifications, press Ctrl+C to stop')
+        try:
+            run_dispatcher()
+        except KeyboardInterrupt:
+            pass
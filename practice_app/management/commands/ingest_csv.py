@@ -0,0 +1,66 @@
+"""
+    Management command that ingests a Met Museum CSV export from disk.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+from practice_app.ingest import ENGINE_PANDAS, ENGINE_PYTHON, MODE_INSERT, MODE_UPSERT
+from practice_app.parallel import get_ingest_processes, ingest_csv_parallel
+
+
+class Command(BaseCommand):
+    help = 'Ingests a Met Museum CSV export, splitting it into shards that can be ingested by a pool of processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='path of the CSV file to ingest')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='number of worker processes (default: settings.CSV_INGEST_PROCESSES, 1); '
+                 'SQLite only accepts 1'
+        )
+        parser.add_argument('--batch-size', type=int, help='number of rows inserted per batch')
+        parser.add_argument(
+            '--engine',
+            choices=(ENGINE_PYTHON, ENGINE_PANDAS),
+            help='ingest engine used by the workers'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=(MODE_INSERT, MODE_UPSERT),
+            help='skip (insert) or update (upsert) rows whose objectId already exists'
+        )
+
+    def handle(self, *args, **options):
+        csv_path = options['csv_path']
+        if not os.path.isfile(csv_path):
+            raise CommandError(f'{csv_path} not found')
+        processes = get_ingest_processes() if options['processes'] is None else options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1')
+
+        def progress(stats):
+            self.stdout.write(f'{stats.rows} rows ingested ({stats.rows_per_sec:.1f} rows/sec)')
+
+        try:
+            stats = ingest_csv_parallel(
+                csv_path,
+                processes=processes,
+                batch_size=options['batch_size'],
+                engine=options['engine'],
+                mode=options['mode'],
+                progress=progress,
+            )
+        except NotSupportedError as err:
+            raise CommandError(err)
+        result = stats.as_dict()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ingested {result["rows"]} rows in {result["elapsed"]}s ({result["rows_per_sec"]} rows/sec)'
+        ))
+        if stats.mode == MODE_UPSERT:
+            self.stdout.write(
+                f'{stats.inserted} inserted, {stats.updated} updated, {stats.unchanged} unchanged'
+            )
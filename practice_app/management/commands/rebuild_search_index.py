@@ -0,0 +1,23 @@
+"""
+    Management command that (re)creates the full-text search index.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections
+
+from practice_app.search import create_search_index
+
+
+class Command(BaseCommand):
+    help = 'Creates the full-text search index if it is missing and reindexes every row. ' \
+           'On SQLite, run it after a migration that rebuilds the MuseumAPICSV table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='database to index')
+
+    def handle(self, *args, **options):
+        try:
+            create_search_index(connections[options['database']])
+        except NotSupportedError as err:
+            raise CommandError(err)
+        self.stdout.write('Search index rebuilt')
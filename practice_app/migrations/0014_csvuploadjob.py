@@ -0,0 +1,39 @@
+# Generated by Django 4.0 on 2026-10-18 15:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0013_alter_museumapicsv_primaryimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CSVUploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255)),
+                ('spool_path', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('bytes_total', models.BigIntegerField(default=0)),
+                ('bytes_processed', models.BigIntegerField(default=0)),
+                ('rows_processed', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='museumapicsv',
+            name='accessionYear',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='museumapicsv',
+            name='metadataDate',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
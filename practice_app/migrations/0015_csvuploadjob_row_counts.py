@@ -0,0 +1,28 @@
+# Generated by Django 4.0 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0014_csvuploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvuploadjob',
+            name='rows_inserted',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='csvuploadjob',
+            name='rows_unchanged',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='csvuploadjob',
+            name='rows_updated',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0015_csvuploadjob_row_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='museumapicsv',
+            name='contentHash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=16),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0016_museumapicsv_contenthash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedRow',
+            fields=[
+                ('objectId', models.IntegerField(primary_key=True, serialize=False)),
+                ('deletedAt', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='museumapicsv',
+            name='modifiedAt',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
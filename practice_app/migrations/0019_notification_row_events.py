@@ -0,0 +1,23 @@
+# Generated by Django 4.0 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0018_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='action',
+            field=models.CharField(blank=True, choices=[('added', 'Added'), ('updated', 'Updated'), ('deleted', 'Deleted')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='object_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.0 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('practice_app', '0019_notification_row_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['accessionNumber'], name='museum_accession_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['department'], name='museum_department_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['artistDisplayName'], name='museum_artist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['classification'], name='museum_classification_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['isHighlight'], name='museum_highlight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['department', 'classification'], name='museum_dept_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['department', 'isHighlight'], name='museum_dept_highlight_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(django.db.models.functions.comparison.Cast('objectBeginDate', models.IntegerField()), name='museum_begin_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(django.db.models.functions.comparison.Cast('objectEndDate', models.IntegerField()), name='museum_end_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(django.db.models.expressions.F('department'), django.db.models.functions.comparison.Cast('objectBeginDate', models.IntegerField()), name='museum_dept_begin_idx'),
+        ),
+    ]
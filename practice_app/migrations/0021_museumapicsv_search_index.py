@@ -0,0 +1,64 @@
+import warnings
+
+from django.db import migrations
+
+TABLE = 'practice_app_museumapicsv'
+COLUMNS = 'title, artistDisplayName, medium, culture, tags'
+NEW_VALUES = 'new.objectId, new.title, new.artistDisplayName, new.medium, new.culture, new.tags'
+OLD_VALUES = 'old.objectId, old.title, old.artistDisplayName, old.medium, old.culture, old.tags'
+
+MYSQL_FORWARD = [
+    f'ALTER TABLE {TABLE} ADD FULLTEXT INDEX museum_search_idx ({COLUMNS})',
+]
+MYSQL_REVERSE = [
+    f'ALTER TABLE {TABLE} DROP INDEX museum_search_idx',
+]
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE museum_search USING fts5({COLUMNS}, content='{TABLE}', content_rowid='objectId', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "INSERT INTO museum_search(museum_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0, 2.0, 2.0)')",
+    f'CREATE TRIGGER museum_search_insert AFTER INSERT ON {TABLE} BEGIN '
+    f'INSERT INTO museum_search(rowid, {COLUMNS}) VALUES ({NEW_VALUES}); END',
+    f'CREATE TRIGGER museum_search_delete AFTER DELETE ON {TABLE} BEGIN '
+    f"INSERT INTO museum_search(museum_search, rowid, {COLUMNS}) VALUES ('delete', {OLD_VALUES}); END",
+    f'CREATE TRIGGER museum_search_update AFTER UPDATE OF objectId, {COLUMNS} ON {TABLE} BEGIN '
+    f"INSERT INTO museum_search(museum_search, rowid, {COLUMNS}) VALUES ('delete', {OLD_VALUES}); "
+    f'INSERT INTO museum_search(rowid, {COLUMNS}) VALUES ({NEW_VALUES}); END',
+    "INSERT INTO museum_search(museum_search) VALUES ('rebuild')",
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS museum_search_insert',
+    'DROP TRIGGER IF EXISTS museum_search_delete',
+    'DROP TRIGGER IF EXISTS museum_search_update',
+    'DROP TABLE IF EXISTS museum_search',
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor not in statements:
+            warnings.warn(f'Full-text search is not supported on {vendor}, skipping its index')
+            return
+        for statement in statements[vendor]:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Adds the full-text index of practice_app.search. On SQLite, a later
+    migration that rebuilds the MuseumAPICSV table drops its triggers: run
+    the rebuild_search_index command after it.
+    """
+
+    dependencies = [
+        ('practice_app', '0020_museumapicsv_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'mysql': MYSQL_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'mysql': MYSQL_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
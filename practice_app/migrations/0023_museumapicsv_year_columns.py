@@ -0,0 +1,107 @@
+# Generated by Django 4.0 on 2026-10-18 17:04
+
+import re
+
+from django.db import migrations, models
+
+YEAR_RE = re.compile(r'\s*([+-]?\d{1,9})(?!\d)')
+BATCH_SIZE = 1000
+
+TABLE = 'practice_app_museumapicsv'
+COLUMNS = 'title, artistDisplayName, medium, culture, tags'
+NEW_VALUES = 'new.objectId, new.title, new.artistDisplayName, new.medium, new.culture, new.tags'
+OLD_VALUES = 'old.objectId, old.title, old.artistDisplayName, old.medium, old.culture, old.tags'
+SEARCH_TRIGGERS = [
+    f'CREATE TRIGGER IF NOT EXISTS museum_search_insert AFTER INSERT ON {TABLE} BEGIN '
+    f'INSERT INTO museum_search(rowid, {COLUMNS}) VALUES ({NEW_VALUES}); END',
+    f'CREATE TRIGGER IF NOT EXISTS museum_search_delete AFTER DELETE ON {TABLE} BEGIN '
+    f"INSERT INTO museum_search(museum_search, rowid, {COLUMNS}) VALUES ('delete', {OLD_VALUES}); END",
+    f'CREATE TRIGGER IF NOT EXISTS museum_search_update AFTER UPDATE OF objectId, {COLUMNS} ON {TABLE} BEGIN '
+    f"INSERT INTO museum_search(museum_search, rowid, {COLUMNS}) VALUES ('delete', {OLD_VALUES}); "
+    f'INSERT INTO museum_search(rowid, {COLUMNS}) VALUES ({NEW_VALUES}); END',
+]
+
+
+def get_year(value):
+    match = YEAR_RE.match(value or '')
+    return int(match.group(1)) if match else None
+
+
+def fill_years(apps, schema_editor):
+    MuseumAPICSV = apps.get_model('practice_app', 'MuseumAPICSV')
+    rows = MuseumAPICSV.objects.using(schema_editor.connection.alias).only('objectBeginDate', 'objectEndDate')
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.objectBeginDateYear = get_year(row.objectBeginDate)
+        row.objectEndDateYear = get_year(row.objectEndDate)
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            MuseumAPICSV.objects.bulk_update(batch, ['objectBeginDateYear', 'objectEndDateYear'])
+            batch = []
+    MuseumAPICSV.objects.bulk_update(batch, ['objectBeginDateYear', 'objectEndDateYear'])
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds the table to add or remove a column, which drops the
+    # triggers keeping the full-text index of 0021 in sync
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'museum_search'")
+        if cursor.fetchone() is None:
+            return
+    for statement in SEARCH_TRIGGERS:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """
+    Replaces the indexes on CAST(objectBeginDate AS integer) and
+    CAST(objectEndDate AS integer), which MySQL in strict mode refuses to
+    build or update for text that is not a number, with integer columns
+    filled when the rows are written.
+    """
+
+    dependencies = [
+        ('practice_app', '0022_tableversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_triggers),
+        migrations.RemoveIndex(
+            model_name='museumapicsv',
+            name='museum_begin_year_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='museumapicsv',
+            name='museum_end_year_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='museumapicsv',
+            name='museum_dept_begin_idx',
+        ),
+        migrations.AddField(
+            model_name='museumapicsv',
+            name='objectBeginDateYear',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='museumapicsv',
+            name='objectEndDateYear',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['objectBeginDateYear'], name='museum_begin_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['objectEndDateYear'], name='museum_end_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='museumapicsv',
+            index=models.Index(fields=['department', 'objectBeginDateYear'], name='museum_dept_begin_idx'),
+        ),
+        migrations.RunPython(fill_years, migrations.RunPython.noop),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,20 @@
-from django.db import models
+import datetime
+import hashlib
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import models, router, transaction
+from django.utils import timezone
+
+from practice_app.events import ACTION_ADDED, ACTION_DELETED, ACTION_UPDATED, send_change
+
+# separates the values of a row in the text its content hash is taken of
+CONTENT_SEPARATOR = '\x1f'
+# text columns holding a year and the integer columns the listing filters
+# and sorts them on, filled whenever a row is written
+YEAR_FIELDS = (('objectBeginDate', 'objectBeginDateYear'), ('objectEndDate', 'objectEndDateYear'))
+
+_YEAR_RE = re.compile(r'\s*([+-]?\d{1,9})(?!\d)')
 
 GENDER_CHOICES = (
     ('male', 'Male'),
@@ -79,10 +95,268 @@ class MuseumAPICSV(models.Model):
                               choices=GENDER_CHOICES,
                               default='male'
                               )
+    # fingerprint of all the other columns, used to skip unchanged rows on re-ingest
+    contentHash = models.CharField(max_length=16, blank=True, default='', editable=False)
+    # last time the row was written, used by incremental backups; bulk ingest sets it explicitly
+    modifiedAt = models.DateTimeField(auto_now=True, null=True, db_index=True)
+    # the years of objectBeginDate and objectEndDate, see YEAR_FIELDS; queryset
+    # updates of those columns must set them too
+    objectBeginDateYear = models.IntegerField(null=True, blank=True, editable=False)
+    objectEndDateYear = models.IntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # the filters and sorts of the listing; secondary indexes also hold
+        # objectId, so each one serves the (column, objectId) keyset order
+        indexes = [
+            models.Index(fields=['accessionNumber'], name='museum_accession_idx'),
+            models.Index(fields=['department'], name='museum_department_idx'),
+            models.Index(fields=['artistDisplayName'], name='museum_artist_idx'),
+            models.Index(fields=['classification'], name='museum_classification_idx'),
+            models.Index(fields=['isHighlight'], name='museum_highlight_idx'),
+            models.Index(fields=['department', 'classification'], name='museum_dept_class_idx'),
+            models.Index(fields=['department', 'isHighlight'], name='museum_dept_highlight_idx'),
+            models.Index(fields=['objectBeginDateYear'], name='museum_begin_year_idx'),
+            models.Index(fields=['objectEndDateYear'], name='museum_end_year_idx'),
+            models.Index(fields=['department', 'objectBeginDateYear'], name='museum_dept_begin_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # self.metadataDate = parse_datetime(self.metadataDate)
-        super(MuseumAPICSV, self).save(*args, **kwargs)
+        self.contentHash = self.compute_content_hash()
+        for date_field, year_field in YEAR_FIELDS:
+            setattr(self, year_field, get_year(getattr(self, date_field)))
+        action = ACTION_ADDED if self._state.adding else ACTION_UPDATED
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(MuseumAPICSV)):
+            super(MuseumAPICSV, self).save(*args, **kwargs)
+            send_change(MuseumAPICSV, action, [self.pk])
+
+    def delete(self, *args, **kwargs):
+        object_id = self.pk
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(MuseumAPICSV)):
+            # leave a tombstone so incremental backups can replay the delete
+            DeletedRow.objects.update_or_create(pk=object_id, defaults={'deletedAt': timezone.now()})
+            result = super(MuseumAPICSV, self).delete(*args, **kwargs)
+            send_change(MuseumAPICSV, ACTION_DELETED, [object_id])
+        return result
+
+    def compute_content_hash(self):
+        """
+        Returns the fingerprint of the current content of the row.
+        :return: hex digest
+        """
+        return compute_content_hash(
+            normalize_content_value(field, getattr(self, field.attname)) for field in get_content_fields()
+        )
 
     def __str__(self):
         return str(self.objectId)
+
+
+def get_year(value):
+    """
+    Reads the year a date column of the export starts with, e.g. 1822 from
+    '1822' or -300 from '-300 '.
+    :param value: text of the column
+    :return: int, or None if the text does not start with a year
+    """
+    match = _YEAR_RE.match(value or '')
+    return int(match.group(1)) if match else None
+
+
+def get_content_fields():
+    """
+    Returns the fields of MuseumAPICSV covered by the content hash, i.e. all
+    the concrete fields except the primary key and the bookkeeping fields
+    (the hash itself, modifiedAt and the years), which are not editable.
+    :return: list of fields
+    """
+    return [
+        field for field in MuseumAPICSV._meta.concrete_fields
+        if not field.primary_key and field.editable
+    ]
+
+
+def normalize_content_value(field, value):
+    """
+    Coerces a value to the type ingest produces for the field, so that e.g.
+    -1 or '-1' from a form and -1.0 from a CSV give the same content hash.
+    :param field: model field
+    :param value: python value
+    :return: normalized value
+    """
+    try:
+        value = field.to_python(value)
+    except ValidationError:
+        return value
+    if isinstance(value, datetime.datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value.astimezone(datetime.timezone.utc)
+    return value
+
+
+def compute_content_hash(values):
+    """
+    Returns a compact fingerprint of the content of a MuseumAPICSV row.
+    :param values: python values of the fields returned by
+        get_content_fields, normalized as by normalize_content_value
+    :return: 16 character hex digest
+    """
+    return hash_content_text(CONTENT_SEPARATOR.join(map(str, values)))
+
+
+def hash_content_text(content):
+    """
+    Returns the digest compute_content_hash takes of the text of a row, for
+    callers that join the values themselves.
+    :param content: str() of the values joined with CONTENT_SEPARATOR
+    :return: 16 character hex digest
+    """
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=8).hexdigest()
+
+
+JOB_STATUS_PENDING = 'pending'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_DONE = 'done'
+JOB_STATUS_FAILED = 'failed'
+
+JOB_STATUS_CHOICES = (
+    (JOB_STATUS_PENDING, 'Pending'),
+    (JOB_STATUS_RUNNING, 'Running'),
+    (JOB_STATUS_DONE, 'Done'),
+    (JOB_STATUS_FAILED, 'Failed'),
+)
+
+
+class DeletedRow(models.Model):
+    """
+    Tombstone of a MuseumAPICSV row deleted through the app, so incremental
+    backups can carry the delete. Bulk queryset deletes are not recorded.
+    """
+    objectId = models.IntegerField(primary_key=True)
+    deletedAt = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return str(self.objectId)
+
+
+class CSVUploadJob(models.Model):
+    """
+    Model to track a CSV upload or S3 restore that is ingested in the
+    background.
+    """
+    file_name = models.CharField(max_length=255)
+    spool_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default=JOB_STATUS_PENDING)
+    bytes_total = models.BigIntegerField(default=0)
+    bytes_processed = models.BigIntegerField(default=0)
+    rows_processed = models.BigIntegerField(default=0)
+    rows_inserted = models.BigIntegerField(default=0)
+    rows_updated = models.BigIntegerField(default=0)
+    rows_unchanged = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def rows_per_sec(self):
+        elapsed = self.elapsed
+        return self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """
+        Estimated number of seconds left, extrapolated from the share of the
+        file read so far, or None if it cannot be estimated yet.
+        """
+        if self.status != JOB_STATUS_RUNNING or not self.bytes_processed:
+            return None
+        remaining = max(self.bytes_total - self.bytes_processed, 0)
+        return self.elapsed * remaining / self.bytes_processed
+
+    def as_dict(self):
+        eta = self.eta
+        return {
+            'id': self.pk,
+            'file_name': self.file_name,
+            'status': self.status,
+            'rows_processed': self.rows_processed,
+            'rows_inserted': self.rows_inserted,
+            'rows_updated': self.rows_updated,
+            'rows_unchanged': self.rows_unchanged,
+            'rows_per_sec': round(self.rows_per_sec, 1),
+            'bytes_processed': self.bytes_processed,
+            'bytes_total': self.bytes_total,
+            'eta': round(eta, 1) if eta is not None else None,
+            'error': self.error,
+        }
+
+    def __str__(self):
+        return f'{self.file_name} ({self.status})'
+
+
+NOTIFICATION_STATUS_PENDING = 'pending'
+NOTIFICATION_STATUS_SENT = 'sent'
+NOTIFICATION_STATUS_FAILED = 'failed'
+
+NOTIFICATION_STATUS_CHOICES = (
+    (NOTIFICATION_STATUS_PENDING, 'Pending'),
+    (NOTIFICATION_STATUS_SENT, 'Sent'),
+    (NOTIFICATION_STATUS_FAILED, 'Failed'),
+)
+
+NOTIFICATION_ACTION_ADDED = 'added'
+NOTIFICATION_ACTION_UPDATED = 'updated'
+NOTIFICATION_ACTION_DELETED = 'deleted'
+
+NOTIFICATION_ACTION_CHOICES = (
+    (NOTIFICATION_ACTION_ADDED, 'Added'),
+    (NOTIFICATION_ACTION_UPDATED, 'Updated'),
+    (NOTIFICATION_ACTION_DELETED, 'Deleted'),
+)
+
+
+class Notification(models.Model):
+    """
+    SNS notification waiting in the outbox. Rows are written in the same
+    transaction as the change they announce and published afterwards by the
+    dispatcher, so requests never wait for SNS.
+
+    Rows with an action are change events of a single MuseumAPICSV row;
+    they are never published themselves but merged into digests.
+    """
+    subject = models.CharField(max_length=100)
+    message = models.TextField()
+    status = models.CharField(max_length=20, choices=NOTIFICATION_STATUS_CHOICES, default=NOTIFICATION_STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    action = models.CharField(max_length=20, choices=NOTIFICATION_ACTION_CHOICES, blank=True, default='')
+    object_id = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject or self.action} ({self.status})'
+
+
+class TableVersion(models.Model):
+    """
+    Version of the data of a table, counting the committed changes to its
+    rows, so responses built from the table can be validated with ETag and
+    Last-Modified without reading the rows.
+    """
+    table = models.CharField(max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modifiedAt = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.table} v{self.version}'
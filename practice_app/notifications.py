@@ -0,0 +1,314 @@
+"""
+    Contains the outbox of SNS notifications. Writes enqueue a Notification
+    row inside the transaction of the change it announces, and a dispatcher
+    thread publishes pending rows once that transaction commits, retrying
+    failed ones with exponential backoff.
+
+    Row level changes are not published one by one: their events wait for
+    NOTIFICATION_DIGEST_WINDOW seconds, or until NOTIFICATION_DIGEST_MAX_EVENTS
+    of them pile up, and are then merged into one digest listing the
+    objectIds added, updated and deleted. Messages are sent with SNS
+    publish_batch, up to PUBLISH_BATCH_SIZE per call.
+"""
+
+import datetime
+import logging
+import os
+import random
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from practice_app.models import Notification, NOTIFICATION_ACTION_CHOICES, NOTIFICATION_STATUS_FAILED, \
+    NOTIFICATION_STATUS_PENDING, NOTIFICATION_STATUS_SENT
+from .utils import get_sns_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_RETRY_DELAY = 2
+DEFAULT_MAX_RETRY_DELAY = 600
+# how often the dispatcher looks for due notifications when nothing wakes it
+DEFAULT_POLL_INTERVAL = 30
+# claimed notifications are not picked up again by another dispatcher for this long
+CLAIM_SECONDS = 60
+DISPATCH_BATCH_SIZE = 50
+# most messages SNS accepts in one publish_batch call
+PUBLISH_BATCH_SIZE = 10
+DEFAULT_DIGEST_WINDOW = 60
+DEFAULT_DIGEST_MAX_EVENTS = 500
+# longest subject SNS accepts
+MAX_SUBJECT_LENGTH = 100
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+_wake_up = threading.Event()
+
+
+def get_max_attempts():
+    """
+    :return: number of times a notification is tried before it is given up
+    """
+    return getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+
+
+def get_retry_delay(attempts):
+    """
+    Returns how long to wait before trying a notification again, doubling
+    with every failed attempt up to NOTIFICATION_MAX_RETRY_DELAY. The delay
+    is jittered so notifications failing together are not retried together.
+    :param attempts: number of failed attempts so far
+    :return: delay in seconds
+    """
+    base = getattr(settings, 'NOTIFICATION_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    cap = getattr(settings, 'NOTIFICATION_MAX_RETRY_DELAY', DEFAULT_MAX_RETRY_DELAY)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return random.uniform(delay / 2, delay)
+
+
+def enqueue_notification(subject, message):
+    """
+    Adds a notification to the outbox. Call it inside the transaction of
+    the change it announces: it is only published once that commits, and
+    not at all if it rolls back.
+    :param subject: subject of the SNS message
+    :param message: body of the SNS message
+    :return: Notification object
+    """
+    notification = Notification.objects.create(subject=subject[:MAX_SUBJECT_LENGTH], message=message)
+    transaction.on_commit(wake_dispatcher)
+    return notification
+
+
+def get_digest_window():
+    """
+    :return: number of seconds row events are buffered before their digest
+        is published
+    """
+    return getattr(settings, 'NOTIFICATION_DIGEST_WINDOW', DEFAULT_DIGEST_WINDOW)
+
+
+def get_digest_max_events():
+    """
+    :return: number of buffered row events that makes a digest go out
+        before the end of the window, and the most events one digest lists
+    """
+    return getattr(settings, 'NOTIFICATION_DIGEST_MAX_EVENTS', DEFAULT_DIGEST_MAX_EVENTS)
+
+
+def enqueue_row_event(action, object_id):
+    """
+    Records that a MuseumAPICSV row was added, updated or deleted. Like
+    enqueue_notification, call it inside the transaction of the change. The
+    event is published as part of a digest once the window is over.
+    :param action: one of NOTIFICATION_ACTION_ADDED, NOTIFICATION_ACTION_UPDATED
+        or NOTIFICATION_ACTION_DELETED
+    :param object_id: objectId of the row
+    :return: Notification object
+    """
+    notification = Notification.objects.create(
+        action=action,
+        object_id=object_id,
+        next_attempt_at=timezone.now() + datetime.timedelta(seconds=get_digest_window()),
+    )
+    transaction.on_commit(wake_dispatcher)
+    return notification
+
+
+def format_digest(events):
+    """
+    Builds the digest of a list of row events.
+    :param events: list of (action, object_id) tuples
+    :return: tuple of subject and message
+    """
+    object_ids = {action: set() for action, _ in NOTIFICATION_ACTION_CHOICES}
+    for action, object_id in events:
+        object_ids[action].add(object_id)
+    changed = len({object_id for _, object_id in events})
+
+    lines = [
+        f'{label} ({len(object_ids[action])}): {", ".join(map(str, sorted(object_ids[action])))}'
+        for action, label in NOTIFICATION_ACTION_CHOICES if object_ids[action]
+    ]
+    subject = f'[CRUD App] {changed} row{"s" if changed != 1 else ""} changed - {datetime.datetime.now()}'
+    message = 'Hi,\n\nThe following rows have been changed:\n\n' + '\n'.join(lines) + '\n\nRegards,\nXYZ'
+    return subject, message
+
+
+def coalesce_row_events():
+    """
+    Replaces the buffered row events by digest notifications once the
+    oldest of them is due or there are NOTIFICATION_DIGEST_MAX_EVENTS of
+    them, each digest listing at most that many events.
+    :return: number of digests created
+    """
+    max_events = get_digest_max_events()
+    pending = Notification.objects.filter(status=NOTIFICATION_STATUS_PENDING).exclude(action='')
+    digests = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                _lock_pending(pending).order_by('pk')
+                .values_list('pk', 'action', 'object_id', 'next_attempt_at')[:max_events]
+            )
+            if not events or (len(events) < max_events and events[0][3] > timezone.now()):
+                return digests
+            subject, message = format_digest([(action, object_id) for _, action, object_id, _ in events])
+            Notification.objects.create(subject=subject[:MAX_SUBJECT_LENGTH], message=message)
+            Notification.objects.filter(pk__in=[pk for pk, _, _, _ in events]).delete()
+            digests += 1
+
+
+def _lock_pending(queryset):
+    # dispatchers of other processes skip the rows one of them holds where
+    # the database can, and wait for them otherwise
+    return queryset.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+
+
+def claim_notifications(limit=DISPATCH_BATCH_SIZE):
+    """
+    Picks the pending notifications that are due and pushes their next
+    attempt back by CLAIM_SECONDS, so that dispatchers of other processes
+    skip them while they are being published.
+    :param limit: maximum number of notifications to claim
+    :return: list of Notification objects
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            _lock_pending(Notification.objects)
+            .filter(status=NOTIFICATION_STATUS_PENDING, next_attempt_at__lte=now, action='')
+            .order_by('next_attempt_at')[:limit]
+        )
+        Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(
+            next_attempt_at=now + datetime.timedelta(seconds=CLAIM_SECONDS)
+        )
+    return notifications
+
+
+def _record_failure(notification, error):
+    notification.last_error = str(error)
+    if notification.attempts >= get_max_attempts():
+        notification.status = NOTIFICATION_STATUS_FAILED
+        logger.error('Giving up on notification %s: %s', notification.pk, error)
+    else:
+        delay = get_retry_delay(notification.attempts)
+        notification.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+        logger.warning('Could not publish notification %s, retrying in %.0fs: %s', notification.pk, delay, error)
+    notification.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error'])
+
+
+def publish_notifications(notifications):
+    """
+    Publishes up to PUBLISH_BATCH_SIZE notifications with one SNS
+    publish_batch call and records the outcome of each. A failed
+    notification is scheduled again, or marked failed after
+    NOTIFICATION_MAX_ATTEMPTS attempts.
+    :param notifications: list of Notification objects
+    :return: number of notifications published
+    """
+    for notification in notifications:
+        notification.attempts += 1
+    try:
+        response = get_sns_client().publish_batch(
+            TopicArn=settings.SNS_TOPIC_ARN,
+            PublishBatchRequestEntries=[
+                {'Id': str(notification.pk), 'Subject': notification.subject, 'Message': notification.message}
+                for notification in notifications
+            ]
+        )
+    except Exception as err:
+        for notification in notifications:
+            _record_failure(notification, err)
+        return 0
+
+    errors = {entry['Id']: f'{entry["Code"]}: {entry.get("Message", "")}' for entry in response.get('Failed', ())}
+    sent_at = timezone.now()
+    for notification in notifications:
+        if str(notification.pk) in errors:
+            _record_failure(notification, errors[str(notification.pk)])
+            continue
+        notification.status = NOTIFICATION_STATUS_SENT
+        notification.sent_at = sent_at
+        notification.save(update_fields=['attempts', 'status', 'sent_at'])
+    return len(notifications) - len(errors)
+
+
+def dispatch_notifications():
+    """
+    Turns the buffered row events that are due into digests and publishes
+    every pending notification that is due.
+    :return: tuple of number of notifications published and failed
+    """
+    coalesce_row_events()
+    sent = failed = 0
+    while True:
+        notifications = claim_notifications()
+        for start in range(0, len(notifications), PUBLISH_BATCH_SIZE):
+            batch = notifications[start:start + PUBLISH_BATCH_SIZE]
+            published = publish_notifications(batch)
+            sent += published
+            failed += len(batch) - published
+        if len(notifications) < DISPATCH_BATCH_SIZE:
+            return sent, failed
+
+
+def get_next_wait():
+    """
+    Call it after dispatch_notifications: a notification still due then is
+    held by the dispatcher of another process, which publishes it or pushes
+    it back within CLAIM_SECONDS, so that long is waited for it instead of
+    polling it in a busy loop.
+    :return: number of seconds until the next pending notification is due,
+        at most NOTIFICATION_POLL_INTERVAL, or CLAIM_SECONDS if it is due
+        already
+    """
+    poll_interval = getattr(settings, 'NOTIFICATION_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    next_attempt_at = Notification.objects.filter(status=NOTIFICATION_STATUS_PENDING) \
+        .order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+    if next_attempt_at is None:
+        return poll_interval
+    wait = (next_attempt_at - timezone.now()).total_seconds()
+    if wait <= 0:
+        return CLAIM_SECONDS
+    return min(wait, poll_interval)
+
+
+def run_dispatcher(stop=None):
+    """
+    Publishes notifications as they become due until stop is set.
+    :param stop: optional threading.Event ending the loop
+    """
+    while stop is None or not stop.is_set():
+        _wake_up.clear()
+        try:
+            dispatch_notifications()
+            wait = get_next_wait()
+        except Exception:
+            logger.exception('Notification dispatch failed')
+            wait = DEFAULT_POLL_INTERVAL
+        finally:
+            # the dispatcher owns its database connection
+            connection.close()
+        _wake_up.wait(wait)
+
+
+def wake_dispatcher():
+    """
+    Makes the dispatcher look for due notifications now, starting its
+    thread on first use and again in a forked process. Does nothing when
+    NOTIFICATIONS_ASYNC is False, in which case the dispatch_notifications
+    management command is expected to run.
+    """
+    global _dispatcher, _dispatcher_pid
+    if not getattr(settings, 'NOTIFICATIONS_ASYNC', True):
+        return
+    with _dispatcher_lock:
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = threading.Thread(target=run_dispatcher, name='notification-dispatcher', daemon=True)
+            _dispatcher_pid = os.getpid()
+            _dispatcher.start()
+    _wake_up.set()
@@ -0,0 +1,196 @@
+"""
+    Contains keyset (seek) pagination used by the listing views.
+
+    Pages are addressed by the primary key of the last row of the previous
+    page (``after``) or of the first row of the next page (``before``) instead
+    of an OFFSET, so every page is a single index range scan and costs the
+    same regardless of how deep into the table it is. Pages sorted on another
+    column are addressed by the (value, primary key) pair of that row,
+    encoded as an opaque cursor string.
+"""
+
+import base64
+import binascii
+import json
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 500
+
+
+def _parse_positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def get_page_size(value=None):
+    """
+    Returns the requested page size clamped to CSV_LIST_MAX_PAGE_SIZE,
+    falling back to CSV_LIST_PAGE_SIZE when it is missing or invalid.
+    :param value: requested page size, usually from the query string
+    :return: page size
+    """
+    page_size = _parse_positive_int(value) or getattr(settings, 'CSV_LIST_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    return min(page_size, getattr(settings, 'CSV_LIST_MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE))
+
+
+def encode_cursor(key):
+    """
+    :param key: (sort value, primary key) pair of a row
+    :return: URL safe cursor string
+    """
+    data = json.dumps(list(key), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    :param cursor: string made by encode_cursor
+    :return: (sort value, primary key) tuple, or None if it is not a valid cursor
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    if not (isinstance(key, list) and len(key) == 2 and isinstance(key[1], int)):
+        return None
+    return tuple(key)
+
+
+def get_ordering(order_by=None, reverse=False):
+    """
+    :param order_by: sort column as given to KeysetPage, None for the
+        primary key order
+    :param reverse: True for the opposite order
+    :return: list of order_by arguments, ending with the primary key
+    """
+    if order_by is None:
+        return ['-pk' if reverse else 'pk']
+    name = order_by.lstrip('-')
+    if order_by.startswith('-') != reverse:
+        return [f'-{name}', '-pk']
+    return [name, 'pk']
+
+
+def _seek(name, value, pk, ascending):
+    # rows after (value, pk) in (name, pk) order; NULLs sort first in
+    # ascending order on MySQL and SQLite
+    if ascending:
+        if value is None:
+            return Q(**{f'{name}__isnull': False}) | Q(**{f'{name}__isnull': True, 'pk__gt': pk})
+        return Q(**{f'{name}__gt': value}) | Q(**{name: value, 'pk__gt': pk})
+    if value is None:
+        return Q(**{f'{name}__isnull': True, 'pk__lt': pk})
+    return Q(**{f'{name}__lt': value}) | Q(**{name: value, 'pk__lt': pk}) | Q(**{f'{name}__isnull': True})
+
+
+class KeysetPage:
+    """
+    One page of a queryset ordered by its primary key, or by another column
+    and then its primary key.
+    """
+
+    def __init__(self, queryset, after=None, before=None, page_size=None, key=attrgetter('pk'), order_by=None):
+        """
+        Fetches the page, reading one extra row to find out whether there is
+        another page in the direction of travel.
+        :param queryset: QuerySet object
+        :param after: cursor the page starts after
+        :param before: cursor the page ends before, ignored if after is given
+        :param page_size: number of rows per page
+        :param key: callable returning the primary key of a row, for
+            querysets that do not yield model instances, or its (sort value,
+            primary key) pair when order_by is given
+        :param order_by: name of the column or annotation to sort on before
+            the primary key, prefixed with '-' for descending order; cursors
+            are then strings made by encode_cursor
+        """
+        self.key = key
+        self.order_by = order_by
+        self.page_size = get_page_size(page_size)
+        parse = _parse_positive_int if order_by is None else decode_cursor
+        self.after = parse(after)
+        self.before = None if self.after is not None else parse(before)
+
+        if self.before is not None:
+            queryset = queryset.filter(self._seek(self.before, forward=False))
+            rows = list(queryset.order_by(*get_ordering(order_by, reverse=True))[:self.page_size + 1])
+            self.has_previous = len(rows) > self.page_size
+            self.has_next = True
+            rows = rows[:self.page_size]
+            rows.reverse()
+        else:
+            if self.after is not None:
+                queryset = queryset.filter(self._seek(self.after, forward=True))
+            rows = list(queryset.order_by(*get_ordering(order_by))[:self.page_size + 1])
+            self.has_previous = self.after is not None
+            self.has_next = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+
+        self.object_list = rows
+        # taken now, so callers may trim columns off the rows afterwards
+        self.first_key = key(rows[0]) if rows else None
+        self.last_key = key(rows[-1]) if rows else None
+
+    def _seek(self, cursor, forward):
+        if self.order_by is None:
+            return Q(pk__gt=cursor) if forward else Q(pk__lt=cursor)
+        ascending = self.order_by.startswith('-') != forward
+        return _seek(self.order_by.lstrip('-'), cursor[0], cursor[1], ascending)
+
+    def _format(self, key):
+        return key if self.order_by is None else encode_cursor(key)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        """
+        :return: value for the after parameter of the next page, or None
+        """
+        if not self.has_next or self.last_key is None:
+            return None
+        return self._format(self.last_key)
+
+    @property
+    def previous_cursor(self):
+        """
+        :return: value for the before parameter of the previous page, or None
+        """
+        if not self.has_previous:
+            return None
+        if self.first_key is None:
+            # paged past the end, step back from where we were
+            return self._format(self.after)
+        return self._format(self.first_key)
+
+
+def get_cursor_url(request, after=None, before=None):
+    """
+    Returns the query string for another page, keeping every other
+    parameter of the current request.
+    :param request: HTTPRequest object
+    :param after: cursor of the next page
+    :param before: cursor of the previous page
+    :return: query string starting with '?'
+    """
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    if after is not None:
+        params['after'] = after
+    if before is not None:
+        params['before'] = before
+    return f'?{params.urlencode()}'
@@ -0,0 +1,196 @@
+"""
+    Contains the multi-process CSV ingest, which splits a CSV file into
+    byte-range shards on record boundaries and ingests them concurrently.
+"""
+
+import io
+import logging
+import os
+from concurrent.futures import as_completed
+
+from django.conf import settings
+from django.db import NotSupportedError, connections, router
+
+from practice_app.ingest import IngestStats, get_ingest_batch_size, get_ingest_engine, get_ingest_mode, ingest_csv, \
+    resource
+from practice_app.models import MuseumAPICSV
+from practice_app.processes import get_process_pool, run_in_worker
+from practice_app.search import suspend_search_index
+
+logger = logging.getLogger(__name__)
+
+
+def get_peak_children_rss_kb():
+    """
+    Returns the largest peak resident set size of the terminated worker
+    processes in kilobytes.
+    :return: peak RSS in KB or None if it cannot be determined on this platform
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def get_ingest_processes():
+    """
+    Returns the number of processes used to ingest a CSV file, 1 meaning
+    the file is ingested in the calling process.
+    :return: number of processes
+    """
+    return getattr(settings, 'CSV_INGEST_PROCESSES', 1)
+
+
+def _count_quotes(file_ptr, start, end, block_size=1 << 20):
+    file_ptr.seek(start)
+    count = 0
+    while start < end:
+        block = file_ptr.read(min(block_size, end - start))
+        if not block:
+            break
+        count += block.count(b'"')
+        start += len(block)
+    return count
+
+
+def compute_csv_shards(path, count):
+    """
+    Splits the body of a CSV file into at most count byte ranges of roughly
+    equal size, each starting at the beginning of a record.
+
+    A line break is only taken as a shard boundary when an even number of
+    quote characters precedes it, so that quoted fields containing line
+    breaks are never split. This reads the whole file once.
+    :param path: path of the CSV file
+    :param count: desired number of shards
+    :return: tuple of the header line (bytes) and a list of (start, end) offsets
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file_ptr:
+        header = file_ptr.readline()
+        body_start = file_ptr.tell()
+        quotes = header.count(b'"')
+
+        bounds = [body_start]
+        for index in range(1, count):
+            target = body_start + (size - body_start) * index // count
+            if target <= bounds[-1]:
+                continue
+            quotes += _count_quotes(file_ptr, bounds[-1], target)
+            file_ptr.seek(target)
+            # the record containing target belongs to the previous shard
+            line = file_ptr.readline()
+            quotes += line.count(b'"')
+            while quotes % 2 and line:
+                line = file_ptr.readline()
+                quotes += line.count(b'"')
+            position = file_ptr.tell()
+            if position >= size:
+                break
+            bounds.append(position)
+        bounds.append(size)
+
+    shards = [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+    return header, shards
+
+
+class CSVShard(io.RawIOBase):
+    """
+    Read-only file object exposing the header line followed by the bytes
+    start..end of a CSV file, so a shard can be passed to ingest_csv as if
+    it were a complete file.
+    """
+
+    def __init__(self, path, header, start, end):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._prefix = header
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        if self._remaining <= 0:
+            return 0
+        data = self._file.read(min(len(buffer), self._remaining))
+        size = len(data)
+        buffer[:size] = data
+        self._remaining -= size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _ingest_shard(path, header, start, end, batch_size, engine, mode):
+    with io.BufferedReader(CSVShard(path, header, start, end)) as shard:
+        stats = ingest_csv(shard, batch_size=batch_size, engine=engine, mode=mode)
+    return stats, end - start
+
+
+def ingest_csv_parallel(path, processes=None, batch_size=None, engine=None, progress=None, mode=None):
+    """
+    Ingests a CSV file with a pool of processes, each parsing and converting
+    its own shard of the file and inserting it through its own database
+    connection.
+    :param path: path of the CSV file
+    :param processes: number of worker processes, defaults to
+        settings.CSV_INGEST_PROCESSES; SQLite only accepts 1
+    :param batch_size: number of rows inserted per batch
+    :param engine: ingest engine used by the workers
+    :param mode: 'insert' or 'upsert', defaults to settings.CSV_INGEST_MODE
+    :param progress: optional callable invoked with the IngestStats each
+        time a shard completes
+    :return: IngestStats object
+    :raises NotSupportedError: if several processes would write to SQLite
+    """
+    processes = processes or get_ingest_processes()
+    using = router.db_for_write(MuseumAPICSV)
+    if processes > 1 and connections[using].vendor == 'sqlite':
+        # a worker holding a read lock cannot upgrade it while another one
+        # writes, so SQLite fails the batch at once instead of waiting
+        raise NotSupportedError('SQLite accepts a single writer, ingest with 1 process')
+    batch_size = batch_size or get_ingest_batch_size()
+    engine = engine or get_ingest_engine()
+    mode = mode or get_ingest_mode()
+
+    stats = IngestStats(mode)
+    stats.bytes_read = 0
+    header, shards = compute_csv_shards(path, processes)
+
+    if processes == 1:
+        with suspend_search_index(using):
+            for start, end in shards:
+                shard_stats, size = _ingest_shard(path, header, start, end, batch_size, engine, mode)
+                stats.add(shard_stats)
+                stats.bytes_read += size
+                if progress is not None:
+                    progress(stats)
+        stats.finish()
+        return stats
+
+    with get_process_pool(processes, using) as executor:
+        futures = [
+            executor.submit(run_in_worker, _ingest_shard, path, header, start, end, batch_size, engine, mode)
+            for start, end in shards
+        ]
+        for future in as_completed(futures):
+            shard_stats, size = future.result()
+            stats.add(shard_stats)
+            stats.bytes_read += size
+            if progress is not None:
+                progress(stats)
+    stats.finish()
+
+    logger.info(
+        'Ingested CSV with %s processes: %s, peak worker RSS %s KB',
+        processes, stats.as_dict(), get_peak_children_rss_kb()
+    )
+    return stats
@@ -0,0 +1,58 @@
+"""
+    Contains helpers for running ingest work in a pool of worker processes.
+
+    This module must not import models at import time: spawned workers
+    import it before Django has been set up.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.db import connections
+
+
+def init_worker(alias, database_name):
+    """
+    Sets up Django in a freshly spawned worker process. The database name is
+    passed on in case the parent switched to a test database.
+    :param alias: database alias used by the workers
+    :param database_name: name of the database the parent is using
+    """
+    if not apps.ready:
+        django.setup()
+    connections.databases[alias]['NAME'] = database_name
+    connections[alias].settings_dict['NAME'] = database_name
+
+
+def get_process_pool(processes, alias):
+    """
+    Creates a pool of spawned worker processes that share the database the
+    calling process is connected to. Workers are spawned rather than forked:
+    ingests also run from threads of the web process, and forked children
+    would inherit its database connections.
+    :param processes: number of worker processes
+    :param alias: database alias used by the workers
+    :return: ProcessPoolExecutor object
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(alias, connections[alias].settings_dict['NAME'])
+    )
+
+
+def run_in_worker(func, *args):
+    """
+    Runs func in a worker process and closes the worker's database
+    connections afterwards.
+    :param func: function to run
+    :param args: arguments for func
+    :return: return value of func
+    """
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
@@ -0,0 +1,237 @@
+"""
+    Contains the full-text search over the title, artistDisplayName, medium,
+    culture and tags of MuseumAPICSV rows.
+
+    The index is maintained by the database itself, so every write path
+    (single row edits, bulk ingest, restores and deletes) keeps it in sync in
+    the same transaction as the change: MySQL uses an InnoDB FULLTEXT index,
+    SQLite an external content FTS5 table updated by triggers. SQLite bulk
+    loads suspend the triggers and reindex the table once when they end.
+
+    Words of the query must all match, each one also matching longer words
+    it is a prefix of. Results are ranked by relevance and paged by page
+    number: every matching row has to be ranked before the first page can be
+    returned anyway, so seeking past the previous page would not save work.
+
+    Every match is ranked by the database, which keeps only the best of them
+    while ranking, and only the best SEARCH_MAX_RANKED_MATCHES matches are
+    listed, so that paging deep into words found in a large part of the
+    collection does not read ever larger sorted results.
+"""
+
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import NotSupportedError, connections, router, transaction
+
+from practice_app.models import MuseumAPICSV
+from practice_app.pagination import get_page_size
+
+SEARCH_COLUMNS = ('title', 'artistDisplayName', 'medium', 'culture', 'tags')
+# relative weight of a match in each of SEARCH_COLUMNS when ranking on SQLite
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 2.0, 2.0)
+# words after these are ignored
+MAX_SEARCH_TERMS = 10
+DEFAULT_MAX_RANKED_MATCHES = 10000
+
+SEARCH_TABLE = 'museum_search'
+SEARCH_INDEX = 'museum_search_idx'
+TRIGGER_PREFIX = 'museum_search'
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def get_search_terms(query):
+    """
+    Splits a search query into the words it is matched on, ignoring
+    punctuation and operators of the database's query syntax.
+    :param query: text typed by the user
+    :return: list of lowercase words, at most MAX_SEARCH_TERMS
+    """
+    terms = []
+    for term in _WORD_RE.findall((query or '').lower()):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_SEARCH_TERMS]
+
+
+def get_max_ranked_matches():
+    """
+    :return: number of the best matches of a query that are listed, 0 for
+        all of them
+    """
+    return getattr(settings, 'SEARCH_MAX_RANKED_MATCHES', DEFAULT_MAX_RANKED_MATCHES)
+
+
+def _get_sqlite_statements():
+    table = MuseumAPICSV._meta.db_table
+    pk = MuseumAPICSV._meta.pk.column
+    columns = ', '.join(SEARCH_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5({columns}, content='{table}', "
+        f"content_rowid='{pk}', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) "
+        f"VALUES ('rank', 'bm25({', '.join(map(str, SEARCH_WEIGHTS))})')",
+    ] + _get_sqlite_trigger_statements()
+
+
+def _get_sqlite_trigger_statements():
+    table = MuseumAPICSV._meta.db_table
+    pk = MuseumAPICSV._meta.pk.column
+    columns = ', '.join(SEARCH_COLUMNS)
+
+    def values(prefix):
+        return ', '.join(f'{prefix}.{column}' for column in (pk,) + SEARCH_COLUMNS)
+
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {SEARCH_TABLE}(rowid, {columns}) VALUES ({values("new")}); END',
+        f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns}) VALUES ('delete', {values('old')}); END",
+        f'CREATE TRIGGER IF NOT EXISTS {TRIGGER_PREFIX}_update AFTER UPDATE OF {pk}, {columns} ON {table} BEGIN '
+        f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, {columns}) VALUES ('delete', {values('old')}); "
+        f'INSERT INTO {SEARCH_TABLE}(rowid, {columns}) VALUES ({values("new")}); END',
+    ]
+
+
+def create_search_index(connection):
+    """
+    Creates the full-text index and indexes the existing rows. It is safe
+    to call again, which restores the SQLite triggers should a migration
+    rebuilding the MuseumAPICSV table have dropped them.
+    :param connection: database connection
+    :raises NotSupportedError: if the database has no full-text index
+    """
+    table = MuseumAPICSV._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'SHOW INDEX FROM {table} WHERE Key_name = %s', [SEARCH_INDEX])
+            if not cursor.fetchall():
+                cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {SEARCH_INDEX} ({", ".join(SEARCH_COLUMNS)})')
+        elif connection.vendor == 'sqlite':
+            with transaction.atomic(using=connection.alias):
+                for statement in _get_sqlite_statements():
+                    cursor.execute(statement)
+                cursor.execute(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+        else:
+            raise NotSupportedError(f'Full-text search is not supported on {connection.vendor}')
+
+
+@contextmanager
+def suspend_search_index(using=None):
+    """
+    Lets the enclosed bulk load write without the SQLite triggers, which
+    would cost it half its speed, and reindexes the table once when it is
+    over, in one transaction with the triggers being created again. Rows
+    written meanwhile, by this load or by other connections, are only found
+    by the search once the load ends. Nested calls do nothing, and MySQL
+    maintains its index itself.
+    :param using: database alias, defaults to the router's choice
+    """
+    connection = connections[using or router.db_for_write(MuseumAPICSV)]
+    if connection.vendor != 'sqlite' or getattr(connection, 'search_index_suspended', False):
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_TABLE])
+        if cursor.fetchone() is None:
+            # no index until rebuild_search_index creates it
+            yield
+            return
+        for suffix in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_{suffix}')
+    connection.search_index_suspended = True
+    try:
+        yield
+    finally:
+        connection.search_index_suspended = False
+        # a failed statement leaves an enclosing transaction to roll back,
+        # the dropped triggers with it
+        if not connection.needs_rollback:
+            create_search_index(connection)
+
+
+def _get_ranked_sql(connection, terms):
+    # returns the SQL and parameters selecting the objectIds of the matching
+    # rows, best match first
+    if connection.vendor == 'mysql':
+        match = f'MATCH ({", ".join(SEARCH_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)'
+        query = ' '.join(f'+{term}*' for term in terms)
+        pk = MuseumAPICSV._meta.pk.column
+        sql = f'SELECT {pk} FROM {MuseumAPICSV._meta.db_table} WHERE {match} ORDER BY {match} DESC, {pk}'
+        return sql, [query, query]
+    if connection.vendor == 'sqlite':
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank, rowid'
+        return sql, [' '.join(f'"{term}"*' for term in terms)]
+    raise NotSupportedError(f'Full-text search is not supported on {connection.vendor}')
+
+
+class SearchPage:
+    """
+    One page of the rows matching a search query, best match first.
+    """
+
+    def __init__(self, query, columns, page=None, page_size=None, using=None):
+        """
+        Fetches the page, ranking the matches in the database and then
+        reading the selected columns of the rows of the page only.
+        :param query: text typed by the user
+        :param columns: names of the columns to read, including objectId
+        :param page: page number, starting at 1
+        :param page_size: number of rows per page
+        :param using: database alias, defaults to the router's choice
+        """
+        self.query = query
+        self.terms = get_search_terms(query)
+        self.page_size = get_page_size(page_size)
+        try:
+            self.page = max(int(page), 1)
+        except (TypeError, ValueError):
+            self.page = 1
+        self.has_previous = self.page > 1
+        self.has_next = False
+        self.object_list = []
+        if not self.terms:
+            return
+
+        using = using or router.db_for_read(MuseumAPICSV)
+        connection = connections[using]
+        max_ranked = get_max_ranked_matches()
+        sql, params = _get_ranked_sql(connection, self.terms)
+        offset = (self.page - 1) * self.page_size
+        limit = self.page_size + 1
+        if max_ranked:
+            limit = max(min(limit, max_ranked - offset), 0)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{sql} LIMIT %s OFFSET %s', params + [limit, offset])
+            object_ids = [row[0] for row in cursor.fetchall()]
+        self.has_next = len(object_ids) > self.page_size
+        object_ids = object_ids[:self.page_size]
+
+        key_index = list(columns).index(MuseumAPICSV._meta.pk.name)
+        rows = {
+            row[key_index]: row
+            for row in MuseumAPICSV.objects.using(using).filter(pk__in=object_ids).values_list(*columns)
+        }
+        self.object_list = [rows[object_id] for object_id in object_ids if object_id in rows]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_page(self):
+        """
+        :return: number of the next page, or None
+        """
+        return self.page + 1 if self.has_next else None
+
+    @property
+    def previous_page(self):
+        """
+        :return: number of the previous page, or None
+        """
+        return self.page - 1 if self.has_previous else None
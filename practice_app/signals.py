@@ -1,9 +1,43 @@
-from django.db.models.signals import post_save
+import logging
+from functools import partial
+
+from django.db import transaction
 from django.dispatch import receiver
 
+from practice_app.events import ACTION_WRITTEN, rows_changed
+from practice_app.facets import apply_change
 from practice_app.models import MuseumAPICSV
+from practice_app.notifications import enqueue_row_event
+from practice_app.versions import bump_table_version
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(rows_changed, sender=MuseumAPICSV)
+def log_change(sender, event, **kwargs):
+    if event.bulk:
+        logger.info('%s rows %s in bulk', event.rows, event.action)
+    else:
+        logger.debug('Row %s %s', ', '.join(map(str, event.object_ids)), event.action)
+
+
+@receiver(rows_changed, sender=MuseumAPICSV)
+def bump_version(sender, event, **kwargs):
+    # inside the transaction writing the rows, so that the new version
+    # commits with them: bulk loads send one event per batch transaction,
+    # which holds the version row only until that batch commits
+    bump_table_version(sender)
+
+
+@receiver(rows_changed, sender=MuseumAPICSV)
+def update_facet_index(sender, event, **kwargs):
+    transaction.on_commit(partial(apply_change, event))
 
 
-@receiver(post_save, sender=MuseumAPICSV)
-def update_csv_data(sender, instance, **kwargs):
-    print(instance.accessionNumber)
+@receiver(rows_changed, sender=MuseumAPICSV)
+def notify_change(sender, event, **kwargs):
+    # bulk loads are reported once by their upload or restore job
+    if event.bulk or event.action == ACTION_WRITTEN:
+        return
+    for object_id in event.object_ids:
+        enqueue_row_event(event.action, object_id)
@@ -1,12 +1,21 @@
 from django.urls import path, include
 from practice_app.views import csv_file_upload_view, list_csv_content_view, csv_row_delete_view, CSVEditRowView, \
-    CSVAddNewRowView, backup_to_s3_view, restore_from_s3_view
+    CSVAddNewRowView, backup_to_s3_view, restore_from_s3_view, upload_job_status_view, list_csv_rows_api_view, \
+    export_csv_view, search_view, search_api_view, facets_api_view, \
+    cache_metrics_view
 
 app_name = 'practice_app'
 urlpatterns = [
     path('', list_csv_content_view, name='index'),
+    path('rows/', list_csv_rows_api_view, name='rows_api'),
+    path('search/', search_view, name='search'),
+    path('search/rows/', search_api_view, name='search_api'),
+    path('facets/', facets_api_view, name='facets_api'),
+    path('metrics/cache/', cache_metrics_view, name='cache_metrics'),
     path('upload_csv/', csv_file_upload_view, name='upload_csv'),
+    path('upload_csv/<int:job_id>/status/', upload_job_status_view, name='upload_job_status'),
     path('add_new_row/', CSVAddNewRowView.as_view(), name='add_new_row'),
+    path('export_csv/', export_csv_view, name='export_csv'),
     path('backup_to_s3/', backup_to_s3_view, name='backup_to_s3'),
     path('restore_from_s3/', restore_from_s3_view, name='restore_from_s3'),
     path('<int:objectId>/', include([
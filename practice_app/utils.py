@@ -1,22 +1,74 @@
+import os
+import threading
 
 import boto3
+from botocore.config import Config
+from django.conf import settings
 
+# botocore's own default
+DEFAULT_MAX_POOL_CONNECTIONS = 10
 
-def get_s3_client(profile_name='default', region_name=None):
-    session = boto3.session.Session(
-        profile_name=profile_name,
-        region_name=region_name
-    )
-    s3 = session.client('s3')
+_clients = {}
+_clients_lock = threading.Lock()
+_clients_pid = os.getpid()
 
-    return s3
 
+def get_max_pool_connections():
+    """
+    :return: size of the HTTP connection pool of each AWS client
+    """
+    return getattr(settings, 'AWS_MAX_POOL_CONNECTIONS', DEFAULT_MAX_POOL_CONNECTIONS)
+
+
+def get_client(service_name, profile_name='default', region_name=None):
+    """
+    Returns a boto3 client shared by the whole process, creating it on first
+    use. Building a session loads the botocore data files and credentials,
+    so clients are cached by (service, profile, region) instead. boto3
+    clients are thread-safe; a forked child (e.g. a gunicorn worker) gets
+    its own clients, since connections must not be shared across processes.
+    :param service_name: name of the AWS service, e.g. 's3'
+    :param profile_name: name of the AWS profile
+    :param region_name: name of the AWS region, None for the profile's default
+    :return: boto3 client
+    """
+    global _clients_lock, _clients_pid
+
+    if _clients_pid != os.getpid():
+        # the lock may have been held by another thread at fork time
+        _clients_lock = threading.Lock()
+        _clients.clear()
+        _clients_pid = os.getpid()
+
+    key = (service_name, profile_name, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                session = boto3.session.Session(
+                    profile_name=profile_name,
+                    region_name=region_name
+                )
+                client = session.client(
+                    service_name,
+                    config=Config(max_pool_connections=get_max_pool_connections())
+                )
+                _clients[key] = client
+    return client
 
-def get_sns_client(profile_name='default', region_name='ap-south-1'):
-    session = boto3.session.Session(
-        profile_name=profile_name,
-        region_name=region_name
-    )
-    sns = session.client('sns')
 
-    return sns
+def clear_clients():
+    """
+    Drops the cached clients, e.g. after the AWS credentials changed.
+    """
+    with _clients_lock:
+        _clients.clear()
+
+
+def get_s3_client(profile_name='default', region_name=None):
+    return get_client('s3', profile_name, region_name)
+
+
+def get_sns_client(profile_name='default', region_name='ap-south-1'):
+    return get_client('sns', profile_name, region_name)
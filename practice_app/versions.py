@@ -0,0 +1,76 @@
+"""
+    Contains the version of the MuseumAPICSV data, which every committed
+    change to its rows increments. Views built from the table send it as
+    their ETag and Last-Modified, so clients polling them get a 304 Not
+    Modified response without the rows being read or a template rendered.
+"""
+
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from practice_app.models import MuseumAPICSV, TableVersion
+
+
+def get_table_version(model=MuseumAPICSV):
+    """
+    :param model: model class of the table
+    :return: TableVersion object of the table
+    """
+    version, _ = TableVersion.objects.get_or_create(
+        pk=model._meta.db_table, defaults={'modifiedAt': timezone.now()}
+    )
+    return version
+
+
+def bump_table_version(model=MuseumAPICSV):
+    """
+    Records a change to the rows of a table. Called inside the transaction
+    writing the rows, so that the new version commits or rolls back with
+    them.
+    :param model: model class of the table
+    """
+    table = model._meta.db_table
+    queryset = TableVersion.objects.filter(pk=table)
+    now = timezone.now()
+    if queryset.update(version=F('version') + 1, modifiedAt=now):
+        return
+    _, created = TableVersion.objects.get_or_create(pk=table, defaults={'version': 1, 'modifiedAt': now})
+    if not created:
+        queryset.update(version=F('version') + 1, modifiedAt=now)
+
+
+def get_etag(version):
+    """
+    :param version: TableVersion object
+    :return: ETag of the responses built from the table
+    """
+    # the time tells apart the versions of a table that was flushed and
+    # written again; weak, since pages carry the CSRF token of the user
+    return f'W/"{version.version}-{version.modifiedAt.timestamp():.6f}"'
+
+
+def get_request_version(request):
+    """
+    Reads the version of MuseumAPICSV once per request, for the ETag, the
+    Last-Modified and the cache key of the response.
+    :param request: HTTPRequest object
+    :return: TableVersion object
+    """
+    if not hasattr(request, 'table_version'):
+        request.table_version = get_table_version()
+    return request.table_version
+
+
+def _get_request_etag(request, *args, **kwargs):
+    return get_etag(get_request_version(request))
+
+
+def _get_request_last_modified(request, *args, **kwargs):
+    return get_request_version(request).modifiedAt
+
+
+# view decorator answering conditional GETs from the version of MuseumAPICSV
+conditional_on_table_version = condition(
+    etag_func=_get_request_etag, last_modified_func=_get_request_last_modified
+)
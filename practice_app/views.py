@@ -2,121 +2,203 @@
     Contains all the views for performing CRUD operations.
 """
 
-import csv
 import datetime
-from io import TextIOWrapper
+import time
 
 from botocore.exceptions import ClientError
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.forms.models import model_to_dict
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render, redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from django.views.generic import UpdateView, CreateView
-from museum_api.utils import Converter
 
+from practice_app.backup import backup_to_s3, get_entry_keys, has_pending_deletes
+from practice_app.caching import get_cache_metrics, record_cache_use
+from practice_app.export import iter_csv_bytes
+from practice_app.facets import DEFAULT_FACET_LIMIT, FACET_FIELDS, get_facet_index
+from practice_app.filters import EXACT_FILTERS, SORT_CHOICES, get_filters
 from practice_app.forms import UploadCSVFileForm, CreateCSVRowForm, EditCSVRowForm
-from practice_app.models import MuseumAPICSV
-from .utils import get_s3_client, get_sns_client
+from practice_app.jobs import create_restore_job, create_upload_job, submit_restore_job, submit_upload_job
+from practice_app.listing import HEADINGS, get_listing_columns, get_listing_page
+from practice_app.models import CSVUploadJob, JOB_STATUS_DONE, JOB_STATUS_FAILED, MuseumAPICSV
+from practice_app.notifications import enqueue_notification
+from practice_app.pagination import get_cursor_url, get_page_size
+from practice_app.search import SearchPage
+from practice_app.versions import conditional_on_table_version
+from .utils import get_s3_client
+
+
+LISTING_METRICS = ('index', 'rows_api')
+
+
+def _record_listing_timing(response, name, page, started):
+    # counts the response and tells the client how it was built
+    elapsed = time.perf_counter() - started
+    record_cache_use(name, page.from_cache, elapsed)
+    response['Server-Timing'] = f'listing;desc="{"hit" if page.from_cache else "miss"}";dur={elapsed * 1000:.2f}'
+    return response
 
 
 @require_http_methods(["GET"])
+@conditional_on_table_version
 def list_csv_content_view(request):
     """
-    Homepage of the website. Displays uploaded CSV file in table form.
+    Homepage of the website. Displays uploaded CSV file in table form, one
+    page at a time using the after/before cursors and page_size from the
+    query string, showing only the columns listed in its columns parameter
+    and the rows matching its filters, in the order of its sort parameter.
+    Answers 304 Not Modified while the table is unchanged since the ETag or
+    Last-Modified the client sends.
     :param request: HTTPRequest object
     :return: HttpResponse object
     """
     if request.method == 'GET':
-        headings = [f.name for f in MuseumAPICSV._meta.get_fields()]
-        museum_api_csv_objs = MuseumAPICSV.objects.all()
-
-        return render(request, 'practice_app/index.html', {
-            'headings': headings,
-            'csv_objs': museum_api_csv_objs,
+        started = time.perf_counter()
+        columns, page = get_listing_page(request)
+
+        response = render(request, 'practice_app/index.html', {
+            'headings': columns,
+            'all_headings': HEADINGS,
+            'filter_values': [(name, request.GET.get(name, '')) for name in EXACT_FILTERS if name != 'isHighlight'],
+            'filtered': bool(get_filters(request.GET)),
+            'sort_choices': SORT_CHOICES,
+            'sort': request.GET.get('sort', ''),
+            'csv_objs': page,
+            'page': page,
+            'page_size': page.page_size,
+            'next_page_url': get_cursor_url(request, after=page.next_cursor) if page.next_cursor else None,
+            'previous_page_url': get_cursor_url(request, before=page.previous_cursor)
+            if page.previous_cursor else None,
             })
+        return _record_listing_timing(response, 'index', page, started)
+
+
+@require_http_methods(["GET"])
+@conditional_on_table_version
+def list_csv_rows_api_view(request):
+    """
+    JSON version of the homepage table. Accepts the same columns, filter,
+    sort, after, before and page_size query parameters.
+    :param request: HTTPRequest object
+    :return: JsonResponse object
+    """
+    started = time.perf_counter()
+    columns, page = get_listing_page(request)
+
+    response = JsonResponse({
+        'columns': columns,
+        'rows': [list(row) for row in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+    return _record_listing_timing(response, 'rows_api', page, started)
+
+
+@require_http_methods(["GET"])
+def cache_metrics_view(request):
+    """
+    Reports the hit rate of the listing cache and the time it saved, for
+    the homepage and the rows API.
+    :param request: HTTPRequest object
+    :return: JsonResponse object
+    """
+    return JsonResponse({name: get_cache_metrics(name) for name in LISTING_METRICS})
+
+
+def get_search_page(request):
+    """
+    Fetches the page of search results addressed by the q, page, page_size
+    and columns parameters of a request.
+    :param request: HTTPRequest object
+    :return: tuple of list of column names and SearchPage object
+    """
+    columns = get_listing_columns(request.GET.getlist('columns'))
+    page = SearchPage(
+        request.GET.get('q', ''), columns, page=request.GET.get('page'), page_size=request.GET.get('page_size')
+    )
+    return columns, page
 
 
-def csv_to_museum_api_objects(csv_content):
-    list_of_dicts = list(csv.DictReader(csv_content.split('\n')))
-    rows = [x.values() for x in list_of_dicts]
-    objects = []
-
-    for row in rows:
-        columns = []
-        for column in row:
-            columns.append(column)
-        objects.append(MuseumAPICSV(
-            pk=columns[0],
-            isHighlight=columns[1],
-            accessionNumber=columns[2],
-            accessionYear=columns[3],
-            isPublicDomain=columns[4],
-            primaryImage=columns[5],
-            primaryImageSmall=columns[6],
-            additionalImages=columns[7] or '',
-            department=columns[8] or '',
-            objectName=columns[9] or '',
-            title=columns[10] or '',
-            culture=columns[11] or '',
-            period=columns[12] or '',
-            dynasty=columns[13] or '',
-            reign=columns[14] or '',
-            portfolio=columns[15] or '',
-            artistRole=columns[16] or '',
-            artistPrefix=columns[17] or '',
-            artistDisplayName=columns[18] or '',
-            artistDisplayBio=columns[19] or '',
-            artistSuffix=columns[20] or '',
-            artistAlphaSort=columns[21] or '',
-            artistNationality=columns[22] or '',
-            artistBeginDate=columns[23] or '',
-            artistEndDate=columns[24] or '',
-            artistGender=columns[25] or 'm',
-            artistWikidata_URL=columns[26] or '',
-            artistULAN_URL=columns[27] or '',
-            objectDate=columns[28] or '',
-            objectBeginDate=columns[29] or '',
-            objectEndDate=columns[30] or '',
-            medium=columns[31] or '',
-            dimensions=columns[32] or '',
-            measurements=columns[33] or '',
-            creditLine=columns[34] or '',
-            geographyType=columns[35] or '',
-            city=columns[36] or '',
-            state=columns[37] or '',
-            county=columns[38] or '',
-            country=columns[39] or '',
-            region=columns[40] or '',
-            subregion=columns[41] or '',
-            locale=columns[42] or '',
-            locus=columns[43] or '',
-            excavation=columns[44] or '',
-            river=columns[45] or '',
-            classification=columns[46] or '',
-            rightsAndReproduction=columns[47],
-            linkResource=columns[48] or '',
-            metadataDate=columns[49] or '',
-            repository=columns[50] or '',
-            objectURL=columns[51] or '',
-            tags=columns[52] or '',
-            objectWikidata_URL=columns[53] or '',
-            isTimelineWork=columns[54] or '',
-            galleryNumber=columns[55] or -1,
-            constituentID=columns[56] or -1,
-            role=columns[57] or '',
-            name=columns[58] or '',
-            constituentULAN_URL=columns[59] or '',
-            constituentWikidata_URL=columns[60] or '',
-            gender=columns[61] or 'male',
-        ))
-    return objects
+def _get_page_url(request, page_number):
+    params = request.GET.copy()
+    params['page'] = page_number
+    return f'?{params.urlencode()}'
 
 
+@require_http_methods(["GET"])
+def search_view(request):
+    """
+    Displays the rows whose title, artist, medium, culture or tags contain
+    the words of the q parameter, best match first.
+    :param request: HTTPRequest object
+    :return: HttpResponse object
+    """
+    columns, page = get_search_page(request)
+
+    return render(request, 'practice_app/search.html', {
+        'headings': columns,
+        'query': page.query,
+        'page': page,
+        'next_page_url': _get_page_url(request, page.next_page) if page.next_page else None,
+        'previous_page_url': _get_page_url(request, page.previous_page) if page.previous_page else None,
+    })
+
+
+@require_http_methods(["GET"])
+def search_api_view(request):
+    """
+    JSON version of the search page. Accepts the same q, page, page_size and
+    columns query parameters.
+    :param request: HTTPRequest object
+    :return: JsonResponse object
+    """
+    columns, page = get_search_page(request)
+
+    return JsonResponse({
+        'columns': columns,
+        'rows': [list(row) for row in page],
+        'page': page.page,
+        'next': page.next_page,
+        'previous': page.previous_page,
+    })
+
+
+@require_http_methods(["GET"])
+def facets_api_view(request):
+    """
+    Faceted browsing, answered from the in-memory facet index. Rows having
+    any of the values given for a facet column (e.g. ?department=Asian
+    Art&culture=Chinese&culture=Japanese) are selected; the response lists
+    their count, one page of their objectIds and the most frequent values
+    of every facet among them, facet_limit per facet.
+    :param request: HTTPRequest object
+    :return: JsonResponse object
+    """
+    filters = {field: request.GET.getlist(field) for field in FACET_FIELDS if request.GET.getlist(field)}
+    page_size = get_page_size(request.GET.get('page_size'))
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    try:
+        limit = max(int(request.GET.get('facet_limit', DEFAULT_FACET_LIMIT)), 0)
+    except ValueError:
+        limit = DEFAULT_FACET_LIMIT
+
+    result = get_facet_index().query(filters, offset=(page - 1) * page_size, page_size=page_size, limit=limit)
+    return JsonResponse({
+        **result.as_dict(),
+        'page': page,
+        'next': page + 1 if page * page_size < result.count else None,
+        'previous': page - 1 if page > 1 else None,
+    })
+
+
+@method_decorator(conditional_on_table_version, name='get')
 class CSVEditRowView(UpdateView):
     """
     View that allows the user to edit a CSV row.
@@ -128,20 +210,6 @@ class CSVEditRowView(UpdateView):
     success_url = reverse_lazy('practice_app:index')
     required_css_class = 'required'
 
-    def get_success_url(self):
-        try:
-            sns = get_sns_client()
-            obj = self.get_object()
-
-            sns.publish(
-                TopicArn=settings.SNS_TOPIC_ARN,
-                Subject=f'[CRUD App] Row id {str(obj.pk)} updated - {datetime.datetime.now()}',
-                Message=f'Hi,\n\nA row with id {str(obj.pk)} has been updated\n\nRegards,\nXYZ'
-            )
-        except ClientError as cl_e:
-            pass
-        return super(CSVEditRowView, self).get_success_url()
-
     @method_decorator(require_http_methods(["GET", "POST"]))
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
@@ -157,20 +225,6 @@ class CSVAddNewRowView(CreateView):
     success_url = reverse_lazy('practice_app:index')
     required_css_class = 'required'
 
-    def get_success_url(self):
-        try:
-            sns = get_sns_client()
-
-            sns.publish(
-                TopicArn=settings.SNS_TOPIC_ARN,
-                Subject=f'[CRUD App] New Row has been added - {datetime.datetime.now()}',
-                Message='Hi,\n\nA new row has been added to the CSV\n\nRegards,\nXYZ'
-            )
-        except ClientError as cl_e:
-            pass
-
-        return super().get_success_url()
-
     @method_decorator(require_http_methods(["GET", "POST"]))
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
@@ -189,54 +243,59 @@ def csv_row_delete_view(request, objectId):
 
     if request.method == 'POST':
         row_obj = get_object_or_404(MuseumAPICSV, pk=objectId)
-        row_id = row_obj.pk
 
         row_obj.delete()
-        try:
-            sns = get_sns_client()
-
-            sns.publish(
-                TopicArn=settings.SNS_TOPIC_ARN,
-                Subject=f'[CRUD App] Row id {row_id} has been deleted - {datetime.datetime.now()}',
-                Message=f'Hi,\n\nA row with id {row_id} has been successfully deleted\n\nRegards,\nXYZ'
-            )
-        except ClientError as cl_e:
-            pass
         return redirect('practice_app:index')
 
 
+@require_http_methods(["GET"])
+@conditional_on_table_version
+def export_csv_view(request):
+    """
+    Downloads the whole table as a CSV file. The file is generated while it
+    is being sent, so the download starts immediately and memory use does
+    not depend on the size of the table. Answers 304 Not Modified while the
+    table is unchanged since the ETag or Last-Modified the client sends.
+    :param request: HTTPRequest object
+    :return: StreamingHttpResponse object
+    """
+    response = StreamingHttpResponse(iter_csv_bytes(), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="museum_data.csv"'
+    return response
+
+
 @require_http_methods(["POST"])
 def backup_to_s3_view(request):
     if request.method == 'POST':
-        # MuseumAPICSV.
-        file_name = 'museum_data.csv'
-        list_of_dicts = []
-        if MuseumAPICSV.objects.all().count() != 0:
-            for obj in MuseumAPICSV.objects.all():
-                list_of_dicts.append(model_to_dict(obj))
-            Converter.convert_to_csv(list_of_dicts, file_name)
+        s3 = get_s3_client('default')
+        try:
+            # an emptied table still has the deletes to back up
+            backup_needed = MuseumAPICSV.objects.exists() or has_pending_deletes(s3, settings.BACKUP_BUCKET_NAME)
+        except ClientError as c_e:
+            return JsonResponse({
+                'error': f'Backup failed :{c_e.args[-1]}'
+            })
+        if backup_needed:
             try:
-                sns = get_sns_client()
-                sns.publish(
-                    TopicArn=settings.SNS_TOPIC_ARN,
-                    Subject=f'[CRUD App] Backup initiated - {datetime.datetime.now()}',
-                    Message='Hi,\n\nA backu p to S3 has been successfully initiated.\n\nRegards,\nXYZ'
+                enqueue_notification(
+                    f'[CRUD App] Backup initiated - {datetime.datetime.now()}',
+                    'Hi,\n\nA backu p to S3 has been successfully initiated.\n\nRegards,\nXYZ'
                 )
 
-                s3 = get_s3_client('default')
-                bucket_name = settings.BACKUP_BUCKET_NAME
-
-                s3.upload_file(file_name, bucket_name, file_name)
+                full = True if request.POST.get('full') else None
+                entry, stats = backup_to_s3(s3, settings.BACKUP_BUCKET_NAME, full=full)
 
-                sns.publish(
-                    TopicArn=settings.SNS_TOPIC_ARN,
-                    Subject=f'[CRUD App] Backup Completed - {datetime.datetime.now()}',
-                    Message=f'Hi,\n\nA backu p to S3 has been successfully completed'
-                            '\n\nRegards,\nXYZ'
+                enqueue_notification(
+                    f'[CRUD App] Backup Completed - {datetime.datetime.now()}',
+                    f'Hi,\n\nA backu p to S3 has been successfully completed'
+                    '\n\nRegards,\nXYZ'
                 )
 
                 return JsonResponse({
-                    'success': 'Backup Completed successfully'
+                    'success': 'Backup Completed successfully',
+                    'keys': get_entry_keys(entry),
+                    'deleted': len(entry['deleted']),
+                    **stats.as_dict(),
                 })
             except ClientError as c_e:
                 return JsonResponse({
@@ -248,48 +307,29 @@ def backup_to_s3_view(request):
             })
 
 
+@require_http_methods(["POST"])
 def restore_from_s3_view(request):
+    """
+    Restores the S3 backups in the background. Responds 202 with the job
+    to poll, or with the outcome when jobs run inline.
+    :param request: HTTPRequest object
+    :return: JsonResponse object
+    """
     if request.method == 'POST':
-        file_name = 'museum_data.csv'
-        bucket_name = settings.BACKUP_BUCKET_NAME
-
-        try:
-            s3 = get_s3_client('default')
-            s3.download_file(bucket_name, file_name, file_name)
-
-            sns = get_sns_client()
-
-            sns.publish(
-                TopicArn=settings.SNS_TOPIC_ARN,
-                Subject=f'[CRUD App] Restoration Completed - {datetime.datetime.now()}',
-                Message='Hi,\n\nData has been successfully restored.\n\nRegards,\nXYZ'
-            )
-        except ClientError as cl_e:
-            if int(cl_e.response['Error']['Code']) == 404:
-                return JsonResponse({
-                    'error': 'Nothing to restore'
-                })
-
-        try:
-            with open(file_name, 'r') as file:
-                objects = csv_to_museum_api_objects(file.read())
-                MuseumAPICSV.objects.bulk_create(
-                    objects,
-                    ignore_conflicts=True
-                )
-                return JsonResponse({
-                    'success': 'Backup restored successfully'
-                })
+        job = create_restore_job(settings.BACKUP_BUCKET_NAME)
+        submit_restore_job(job)
+        job.refresh_from_db()
 
-        except FileNotFoundError as fn_fe:
+        if job.status == JOB_STATUS_FAILED:
             return JsonResponse({
-                'error': f'{file_name} not found'
+                'error': job.error
             })
-
-        except ClientError as cl_e:
+        if job.status == JOB_STATUS_DONE:
             return JsonResponse({
-                'error': f'Error :{cl_e.args[-1]}'
+                'success': 'Backup restored successfully',
+                'job': job.as_dict(),
             })
+        return JsonResponse({'job': job.as_dict()}, status=202)
 
 
 @require_http_methods(["GET", "POST"])
@@ -316,27 +356,26 @@ def csv_file_upload_view(request):
         if extension != 'csv':
             raise ValidationError("Not a valid csv file")
 
-        f = TextIOWrapper(request.FILES['csv_file'].file, encoding='utf-8')
+        if not form.is_valid():
+            return render(request, 'practice_app/csv_upload.html', {'form': form})
 
-        csv_content = f.read()
-        objects = csv_to_museum_api_objects(csv_content)
+        job = create_upload_job(form.cleaned_data['csv_file'])
+        submit_upload_job(job)
 
-        MuseumAPICSV.objects.bulk_create(
-            objects,
-            ignore_conflicts=True
-        )
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse(job.as_dict(), status=202)
 
-        try:
-            sns = get_sns_client()
-
-            sns.publish(
-                TopicArn=settings.SNS_TOPIC_ARN,
-                Subject=f'[CRUD App] CSV file {file_name} has been successfully uploaded - {datetime.datetime.now()}',
-                Message=f'Hi,\n\n A CSV file {file_name} has been successfully uploaded to the server.'
-                        f' \n\nRegards,\nXYZ'
-            )
-        except ClientError as cl_e:
-            pass
-            logging.error()
+        return redirect(f"{reverse('practice_app:index')}?job={job.pk}")
 
-        return redirect('practice_app:index')
+
+@require_http_methods(["GET"])
+def upload_job_status_view(request, job_id):
+    """
+    Reports the progress of a CSV upload or S3 restore that is being
+    ingested in the background.
+    :param request: HTTPRequest object
+    :param job_id: id of the upload job
+    :return: JsonResponse object
+    """
+    job = get_object_or_404(CSVUploadJob, pk=job_id)
+    return JsonResponse(job.as_dict())
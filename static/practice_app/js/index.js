@@ -31,6 +31,10 @@ $(function() {
             if(response.success){
                 $('#spinnerRestoreModal').hide();
                 window.location.reload();
+            } else if(response.job) {
+                $('#spinnerRestoreModal').hide();
+                $('.modal-backdrop').remove();
+                pollUploadJob(response.job.id);
             }
             if(response.error) {
                 $('#spinnerRestoreModal').hide();
@@ -43,4 +47,33 @@ $(function() {
         });
     });
 
-});
\ No newline at end of file
+    let jobId = new URLSearchParams(window.location.search).get('job');
+    if(jobId) {
+        pollUploadJob(jobId);
+    }
+
+});
+
+function pollUploadJob(jobId) {
+    $.ajax({
+    type: "GET",
+    url: upload_job_status_url.replace('/0/', '/' + jobId + '/'),
+    success: function (job) {
+        let status = $('#upload-job-status');
+        status.show();
+        if(job.status === 'done') {
+            status.removeClass('alert-info').addClass('alert-success');
+            status.text('Loaded ' + job.file_name + ': ' + job.rows_processed + ' rows.');
+            setTimeout(() => window.location.replace(window.location.pathname), 2000);
+        } else if(job.status === 'failed') {
+            status.removeClass('alert-info').addClass('alert-danger');
+            status.text('Loading ' + job.file_name + ' failed: ' + job.error);
+        } else {
+            let eta = job.eta === null ? '' : ', about ' + Math.ceil(job.eta) + 's left';
+            status.text('Processing ' + job.file_name + ': ' + job.rows_processed + ' rows (' +
+                job.rows_per_sec + ' rows/sec' + eta + ')');
+            setTimeout(() => pollUploadJob(jobId), 2000);
+        }
+    }
+    });
+}
@@ -0,0 +1,88 @@
+"""
+    Contains a minimal in-memory stand-in for the boto3 S3 client, covering
+    the calls made by the backup and restore code.
+"""
+
+import datetime
+import io
+import itertools
+import threading
+import uuid
+
+from botocore.exceptions import ClientError
+
+
+def _client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class FakeS3Client:
+    """
+    Keeps objects in a dict keyed by (bucket, key). Safe to share between
+    threads like a real client.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.aborted = []
+        self.part_threads = set()
+        self.fail_on_part = None
+        self.modified = {}
+        self._clock = itertools.count()
+        self._lock = threading.Lock()
+
+    def _store(self, bucket, key, body):
+        self.objects[(bucket, key)] = body
+        self.modified[(bucket, key)] = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc) + \
+            datetime.timedelta(seconds=next(self._clock))
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_on_part:
+            raise _client_error('InternalError', 'UploadPart')
+        etag = uuid.uuid4().hex
+        with self._lock:
+            self.part_threads.add(threading.get_ident())
+            self.uploads[UploadId][PartNumber] = (etag, bytes(Body))
+        return {'ETag': etag}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        with self._lock:
+            stored = self.uploads.pop(UploadId)
+            body = b''
+            for part in MultipartUpload['Parts']:
+                etag, data = stored[part['PartNumber']]
+                if etag != part['ETag']:
+                    raise _client_error('InvalidPart', 'CompleteMultipartUpload')
+                body += data
+            self._store(Bucket, Key, body)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self._lock:
+            self.uploads.pop(UploadId, None)
+            self.aborted.append(UploadId)
+        return {}
+
+    def put_object(self, Bucket, Key, Body):
+        with self._lock:
+            self._store(Bucket, Key, Body if isinstance(Body, bytes) else Body.read())
+        return {}
+
+    def get_object(self, Bucket, Key):
+        try:
+            body = self.objects[(Bucket, Key)]
+        except KeyError:
+            raise _client_error('NoSuchKey', 'GetObject') from None
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('404', 'HeadObject')
+        return {'ContentLength': len(self.objects[(Bucket, Key)]), 'LastModified': self.modified[(Bucket, Key)]}
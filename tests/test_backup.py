@@ -0,0 +1,296 @@
+"""
+    Contains tests for backup.py
+"""
+
+import datetime
+import os
+from unittest import mock
+
+from botocore.exceptions import ClientError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from practice_app.backup import backup_to_s3, compute_shard_bounds, find_latest_backup, get_chain_size, \
+    get_entry_keys, get_restore_chain, iter_parts, load_manifest, restore_chain, restore_from_s3, upload_stream
+from practice_app.export import iter_csv_bytes
+from practice_app.formats import FORMAT_CSV, FORMAT_GZIP, iter_backup_bytes
+from practice_app.ingest import ingest_csv
+from practice_app.models import DeletedRow, MuseumAPICSV
+from tests.fake_s3 import FakeS3Client
+
+
+# every column except modifiedAt, which records when the row was written
+STORED_COLUMNS = [field.name for field in MuseumAPICSV._meta.concrete_fields if field.name != 'modifiedAt']
+# stamp of rows and tombstones that are older than the overlap of deltas
+LONG_AGO = datetime.datetime(2022, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class TestS3Backup(TestCase):
+    """
+    Tests the functionality of the streaming multipart S3 backup.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+    bucket = 'test-bucket'
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+    def test_iter_parts(self):
+        """
+        Tests whether a byte stream is regrouped into parts of a fixed size.
+        """
+        self.assertEqual(list(iter_parts([b'abc', b'defgh', b'ij'], 4)), [b'abcd', b'efgh', b'ij'])
+        self.assertEqual(list(iter_parts([b'abcd'], 4)), [b'abcd'])
+        self.assertEqual(list(iter_parts([], 4)), [b''])
+
+    def test_upload_stream_in_parts(self):
+        """
+        Tests whether a stream is uploaded as concurrent parts that are
+        reassembled in order.
+        """
+        s3 = FakeS3Client()
+        chunks = [bytes([i]) * 1000 for i in range(50)]
+        stats = upload_stream(s3, self.bucket, 'key', chunks, part_size=3000, concurrency=4)
+
+        self.assertEqual(s3.objects[(self.bucket, 'key')], b''.join(chunks))
+        self.assertEqual(stats.parts, 17)
+        self.assertEqual(stats.bytes, 50000)
+        self.assertGreater(stats.mb_per_sec, 0)
+
+    def test_upload_stream_aborts_on_failure(self):
+        """
+        Tests whether a failed part aborts the multipart upload.
+        """
+        s3 = FakeS3Client()
+        s3.fail_on_part = 3
+        with self.assertRaises(ClientError):
+            upload_stream(s3, self.bucket, 'key', [b'x' * 10000], part_size=1000, concurrency=2)
+
+        self.assertEqual(len(s3.aborted), 1)
+        self.assertEqual(s3.uploads, {})
+        self.assertNotIn((self.bucket, 'key'), s3.objects)
+
+    def test_backup_to_s3(self):
+        """
+        Tests whether the first backup is a full CSV export of the table
+        recorded in the manifest.
+        """
+        s3 = FakeS3Client()
+        entry, stats = backup_to_s3(s3, self.bucket, backup_format=FORMAT_CSV, part_size=1024)
+
+        self.assertTrue(entry['key'].startswith('museum_data/full-'))
+        body = s3.objects[(self.bucket, entry['key'])]
+        self.assertEqual(body, b''.join(iter_csv_bytes()))
+        self.assertEqual(stats.parts, -(-len(body) // 1024))
+        self.assertEqual(load_manifest(s3, self.bucket), {'full': entry, 'deltas': [], 'until': entry['until']})
+
+    def test_incremental_backup_and_restore(self):
+        """
+        Tests whether later backups only carry the changed and deleted rows,
+        and whether restore replays them on top of the full backup.
+        """
+        s3 = FakeS3Client()
+        # the rows were ingested moments ago, within the overlap
+        MuseumAPICSV.objects.update(modifiedAt=LONG_AGO)
+        backup_to_s3(s3, self.bucket)
+
+        obj = MuseumAPICSV.objects.get(pk=2)
+        obj.title = 'Edited'
+        obj.save()
+        MuseumAPICSV.objects.get(pk=3).delete()
+        entry, _ = backup_to_s3(s3, self.bucket, backup_format=FORMAT_CSV)
+
+        self.assertTrue(entry['key'].startswith('museum_data/delta-'))
+        self.assertEqual(entry['deleted'], [3])
+        rows = s3.objects[(self.bucket, entry['key'])].decode('utf-8').splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].startswith('2,'))
+        self.assertEqual(len(load_manifest(s3, self.bucket)['deltas']), 1)
+
+        expected = list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS))
+        MuseumAPICSV.objects.all().delete()
+        stats = restore_from_s3(s3, self.bucket)
+
+        self.assertEqual(stats.rows, 16)
+        self.assertEqual(list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS)), expected)
+
+    def test_compute_shard_bounds(self):
+        """
+        Tests whether the objectId ranges of the shards are contiguous and
+        split the rows evenly.
+        """
+        queryset = MuseumAPICSV.objects.all()
+        bounds = compute_shard_bounds(queryset, 4)
+
+        self.assertEqual(len(bounds), 4)
+        self.assertIsNone(bounds[0][0])
+        self.assertIsNone(bounds[-1][1])
+        for (_, end), (first, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, first)
+        sizes = [
+            queryset.filter(**{k: v for k, v in (('pk__gte', first), ('pk__lt', end)) if v is not None}).count()
+            for first, end in bounds
+        ]
+        self.assertEqual(sum(sizes), queryset.count())
+        self.assertLessEqual(max(sizes) - min(sizes), 1)
+        self.assertEqual(compute_shard_bounds(queryset, 1), [(None, None)])
+        self.assertEqual(len(compute_shard_bounds(queryset.filter(pk=2), 4)), 1)
+
+    def test_sharded_backup_and_restore(self):
+        """
+        Tests whether a sharded backup uploads one object per objectId range
+        and whether restore loads every shard.
+        """
+        s3 = FakeS3Client()
+        entry, stats = backup_to_s3(s3, self.bucket, backup_format=FORMAT_CSV, shards=3)
+
+        keys = get_entry_keys(entry)
+        self.assertEqual(len(keys), 3)
+        self.assertNotIn('key', entry)
+        self.assertTrue(keys[0].endswith('.part000.csv'))
+        self.assertEqual(stats.bytes, sum(len(s3.objects[(self.bucket, key)]) for key in keys))
+        self.assertEqual(load_manifest(s3, self.bucket)['full'], entry)
+
+        expected = list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS))
+        MuseumAPICSV.objects.all().delete()
+        stats = restore_from_s3(s3, self.bucket, workers=1)
+
+        self.assertEqual(stats.rows, len(expected))
+        self.assertEqual(stats.bytes_read, get_chain_size(s3, self.bucket, get_restore_chain(s3, self.bucket)))
+        self.assertEqual(list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS)), expected)
+
+    def test_periodic_full_backup(self):
+        """
+        Tests whether a full backup is taken once BACKUP_FULL_EVERY
+        incremental ones were, and whether it clears the tombstones.
+        """
+        s3 = FakeS3Client()
+        with self.settings(BACKUP_FULL_EVERY=1):
+            backup_to_s3(s3, self.bucket)
+            MuseumAPICSV.objects.get(pk=3).delete()
+            self.assertTrue(backup_to_s3(s3, self.bucket)[0]['key'].startswith('museum_data/delta-'))
+            DeletedRow.objects.update(deletedAt=LONG_AGO)
+            entry, _ = backup_to_s3(s3, self.bucket)
+
+        self.assertTrue(entry['key'].startswith('museum_data/full-'))
+        self.assertEqual(load_manifest(s3, self.bucket)['deltas'], [])
+        self.assertFalse(DeletedRow.objects.exists())
+
+    def test_delta_rereads_overlap(self):
+        """
+        Tests whether a delta exports a row stamped shortly before the
+        previous backup started, as a transaction committed after that
+        backup read the table would have stamped it.
+        """
+        s3 = FakeS3Client()
+        MuseumAPICSV.objects.update(modifiedAt=LONG_AGO)
+        until = parse_datetime(backup_to_s3(s3, self.bucket)[0]['until'])
+        MuseumAPICSV.objects.filter(pk=2).update(modifiedAt=until - datetime.timedelta(seconds=5))
+
+        entry, _ = backup_to_s3(s3, self.bucket, backup_format=FORMAT_CSV)
+        rows = s3.objects[(self.bucket, entry['key'])].decode('utf-8').splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[1].startswith('2,'))
+
+    def test_failed_full_backup_keeps_tombstones(self):
+        """
+        Tests whether the tombstones survive a full backup whose manifest
+        could not be saved, so the previous chain still carries the deletes.
+        """
+        s3 = FakeS3Client()
+        backup_to_s3(s3, self.bucket)
+        MuseumAPICSV.objects.get(pk=3).delete()
+        DeletedRow.objects.update(deletedAt=LONG_AGO)
+
+        error = ClientError({'Error': {'Code': 'InternalError', 'Message': 'InternalError'}}, 'PutObject')
+        with mock.patch('practice_app.backup.save_manifest', side_effect=error):
+            with self.assertRaises(ClientError):
+                backup_to_s3(s3, self.bucket, full=True)
+        self.assertTrue(DeletedRow.objects.filter(pk=3).exists())
+
+        backup_to_s3(s3, self.bucket, full=True)
+        self.assertFalse(DeletedRow.objects.exists())
+
+    def test_restore_single_file_backup(self):
+        """
+        Tests whether a bucket without a manifest is restored from the most
+        recent single file backup, whatever its format.
+        """
+        s3 = FakeS3Client()
+        self.assertIsNone(restore_from_s3(s3, self.bucket))
+        s3.put_object(Bucket=self.bucket, Key='museum_data.csv', Body=b''.join(iter_backup_bytes(FORMAT_CSV)))
+        s3.put_object(Bucket=self.bucket, Key='museum_data.csv.gz', Body=b''.join(iter_backup_bytes(FORMAT_GZIP)))
+        self.assertEqual(find_latest_backup(s3, self.bucket), 'museum_data.csv.gz')
+
+        expected = list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS))
+        MuseumAPICSV.objects.all().delete()
+        stats = restore_from_s3(s3, self.bucket)
+
+        self.assertEqual(stats.rows, 15)
+        self.assertEqual(list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS)), expected)
+
+    def test_restore_in_batches_with_progress(self):
+        """
+        Tests whether restore writes bounded batches and reports progress
+        over the whole chain, including the bytes read from S3.
+        """
+        s3 = FakeS3Client()
+        MuseumAPICSV.objects.update(modifiedAt=LONG_AGO)
+        backup_to_s3(s3, self.bucket)
+        MuseumAPICSV.objects.get(pk=2).save()
+        backup_to_s3(s3, self.bucket)
+        chain = get_restore_chain(s3, self.bucket)
+        size = get_chain_size(s3, self.bucket, chain)
+
+        reports = []
+        MuseumAPICSV.objects.all().delete()
+        stats = restore_chain(s3, self.bucket, chain, batch_size=4,
+                              progress=lambda current: reports.append((current.rows, current.bytes_read)))
+
+        self.assertEqual(stats.rows, 16)
+        self.assertEqual(stats.batches, 5)
+        self.assertEqual([rows for rows, _ in reports], [4, 8, 12, 15, 16])
+        self.assertEqual(stats.bytes_read, size)
+
+    def test_backup_and_restore_views(self):
+        """
+        Tests whether the backup view uploads the table and reports the
+        throughput, and whether the restore view loads it back.
+        """
+        s3 = FakeS3Client()
+        with mock.patch('practice_app.views.get_s3_client', return_value=s3), \
+                mock.patch('practice_app.jobs.get_s3_client', return_value=s3), \
+                self.settings(BACKUP_BUCKET_NAME=self.bucket, BACKUP_FORMAT=FORMAT_GZIP,
+                              CSV_UPLOAD_JOBS_ASYNC=False):
+            self.assertEqual(self.client.get(reverse('practice_app:restore_from_s3')).status_code, 405)
+            response = self.client.post(reverse('practice_app:restore_from_s3'))
+            self.assertEqual(response.json(), {'error': 'Nothing to restore'})
+
+            response = self.client.post(reverse('practice_app:backup_to_s3'))
+            content = response.json()
+            self.assertIn('success', content)
+            self.assertIn('mb_per_sec', content)
+            self.assertEqual(len(content['keys']), 1)
+            self.assertTrue(content['keys'][0].endswith('.csv.gz'))
+
+            MuseumAPICSV.objects.all().delete()
+            response = self.client.post(reverse('practice_app:restore_from_s3'))
+            content = response.json()
+            self.assertIn('success', content)
+            self.assertEqual(content['job']['rows_processed'], 15)
+            self.assertEqual(MuseumAPICSV.objects.count(), 15)
+
+            # the deletes of an emptied table still need to be backed up
+            for obj in MuseumAPICSV.objects.all():
+                obj.delete()
+            response = self.client.post(reverse('practice_app:backup_to_s3'))
+            self.assertEqual(response.json()['deleted'], 15)
+            DeletedRow.objects.all().delete()
+            response = self.client.post(reverse('practice_app:backup_to_s3'))
+            self.assertEqual(response.json(), {'error': 'Nothing to backup'})
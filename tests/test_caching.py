@@ -0,0 +1,156 @@
+"""
+    Contains tests for caching.py
+"""
+
+import os
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from practice_app.caching import get_cache_metrics, make_cache_key
+from practice_app.ingest import ingest_csv
+from practice_app.jobs import create_upload_job, run_upload_job
+from practice_app.models import MuseumAPICSV
+from practice_app.versions import bump_table_version, get_etag, get_table_version
+
+
+@override_settings(LISTING_CACHE_TIMEOUT=300, CSV_UPLOAD_JOBS_ASYNC=False, NOTIFICATIONS_ASYNC=False)
+class TestListingCache(TestCase):
+    """
+    Tests the cache of the listing pages and its invalidation.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+    def setUp(self):
+        """
+        Starts every test with an empty cache.
+        """
+        cache.clear()
+
+    def get_rows(self, **params):
+        return self.client.get(reverse('practice_app:rows_api'), {'page_size': 5, **params})
+
+    def test_second_request_is_a_hit(self):
+        """
+        Tests whether a repeated request is served from the cache without
+        querying the rows, and says so in its Server-Timing header.
+        """
+        first = self.get_rows()
+        self.assertIn('desc="miss"', first['Server-Timing'])
+        # only the version of the table is read, for the ETag
+        with self.assertNumQueries(1):
+            second = self.get_rows()
+        self.assertIn('desc="hit"', second['Server-Timing'])
+        self.assertEqual(second.json(), first.json())
+
+        # the homepage shows the same page, so it shares the entry
+        response = self.client.get(reverse('practice_app:index'), {'page_size': 5})
+        self.assertIn('desc="hit"', response['Server-Timing'])
+        self.assertTrue(response.context['page'].from_cache)
+
+    def test_keys_depend_on_the_query(self):
+        """
+        Tests whether pages with other columns, filters, sorts or cursors are
+        cached apart.
+        """
+        first = self.get_rows()
+        for params in ({'columns': 'title'}, {'department': 'The American Wing'}, {'sort': '-objectId'},
+                       {'after': first.json()['next']}):
+            response = self.get_rows(**params)
+            self.assertIn('desc="miss"', response['Server-Timing'], params)
+            self.assertIn('desc="hit"', self.get_rows(**params)['Server-Timing'], params)
+
+    def test_version_in_key(self):
+        """
+        Tests whether keys change with the version of the table and the
+        parts of the entry.
+        """
+        key = make_cache_key('prefix', 'W/"1-0.0"', ['title'], 1)
+        self.assertEqual(make_cache_key('prefix', 'W/"1-0.0"', ['title'], 1), key)
+        self.assertNotEqual(make_cache_key('prefix', 'W/"1-0.0"', ['title'], 2), key)
+        self.assertNotEqual(make_cache_key('prefix', 'W/"2-0.0"', ['title'], 1), key)
+
+    def test_writes_invalidate(self):
+        """
+        Tests whether committed edits, additions and deletions are visible
+        on the next request.
+        """
+        self.get_rows(columns=['objectId', 'title'])
+
+        obj = MuseumAPICSV.objects.get(pk=1)
+        obj.title = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+        response = self.get_rows(columns=['objectId', 'title'])
+        self.assertIn('desc="miss"', response['Server-Timing'])
+        self.assertEqual(response.json()['rows'][0], [1, 'Renamed'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('practice_app:delete_row', args=[1]))
+        response = self.get_rows(columns=['objectId', 'title'])
+        self.assertIn('desc="miss"', response['Server-Timing'])
+        self.assertEqual(response.json()['rows'][0][0], 2)
+
+    def test_upload_job_invalidates(self):
+        """
+        Tests whether the rows written by an upload job make the cached
+        pages stale.
+        """
+        self.get_rows()
+        MuseumAPICSV.objects.all().delete()
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            job = create_upload_job(SimpleUploadedFile('museum_data.csv', file_ptr.read()))
+        with self.captureOnCommitCallbacks(execute=True):
+            run_upload_job(job.pk)
+        self.assertIn('desc="miss"', self.get_rows()['Server-Timing'])
+
+    def test_write_of_another_process(self):
+        """
+        Tests whether a write committed by a process that does not share the
+        cache makes the cached pages stale, so that the page sent with the
+        new ETag holds the new rows.
+        """
+        self.get_rows(columns=['objectId', 'title'])
+
+        # what another process leaves behind: new rows and a new version
+        MuseumAPICSV.objects.filter(pk=1).update(title='Elsewhere')
+        bump_table_version()
+        response = self.get_rows(columns=['objectId', 'title'])
+        self.assertIn('desc="miss"', response['Server-Timing'])
+        self.assertEqual(response.json()['rows'][0], [1, 'Elsewhere'])
+        self.assertEqual(response['ETag'], get_etag(get_table_version()))
+
+    def test_metrics(self):
+        """
+        Tests whether the metrics view reports the hits and misses of each
+        listing view.
+        """
+        self.get_rows()
+        self.get_rows()
+        self.get_rows()
+        metrics = self.client.get(reverse('practice_app:cache_metrics')).json()
+        self.assertEqual(metrics['rows_api']['hits'], 2)
+        self.assertEqual(metrics['rows_api']['misses'], 1)
+        self.assertAlmostEqual(metrics['rows_api']['hit_rate'], 2 / 3)
+        self.assertIsNotNone(metrics['rows_api']['saved_ms'])
+        self.assertEqual(metrics['index'], get_cache_metrics('index'))
+        self.assertIsNone(metrics['index']['hit_rate'])
+
+    @override_settings(LISTING_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        """
+        Tests whether a timeout of 0 reads every page from the database.
+        """
+        self.get_rows()
+        response = self.get_rows()
+        self.assertIn('desc="miss"', response['Server-Timing'])
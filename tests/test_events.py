@@ -0,0 +1,91 @@
+"""
+    Contains tests for events.py
+"""
+
+import io
+import os
+
+from django.test import TestCase, override_settings
+
+from practice_app.events import ACTION_ADDED, ACTION_DELETED, ACTION_UPDATED, ACTION_WRITTEN, rows_changed
+from practice_app.ingest import ingest_csv
+from practice_app.models import MuseumAPICSV, Notification
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class TestChangeEvents(TestCase):
+    """
+    Tests the change-event bus of the MuseumAPICSV table.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    def setUp(self):
+        """
+        Records the events sent by each test.
+        """
+        self.events = []
+
+        def record(sender, event, **kwargs):
+            self.events.append(event)
+
+        rows_changed.connect(record, sender=MuseumAPICSV, weak=False)
+        self.addCleanup(rows_changed.disconnect, record, sender=MuseumAPICSV)
+
+    def ingest(self, batch_size=None):
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            return ingest_csv(io.BytesIO(file_ptr.read()), batch_size=batch_size)
+
+    @override_settings(CSV_INGEST_ENGINE='python')
+    def test_one_event_per_batch(self):
+        """
+        Tests whether a bulk ingest sends one event per batch and none for
+        batches whose rows are unchanged.
+        """
+        self.ingest(batch_size=4)
+
+        self.assertEqual([event.rows for event in self.events], [4, 4, 4, 3])
+        self.assertTrue(all(event.bulk and event.action == ACTION_WRITTEN for event in self.events))
+        self.assertEqual(sorted(sum((event.object_ids for event in self.events), ())),
+                         list(MuseumAPICSV.objects.order_by('pk').values_list('pk', flat=True)))
+        # bulk writes are not notified row by row
+        self.assertFalse(Notification.objects.exists())
+
+        self.events.clear()
+        self.ingest(batch_size=4)
+        self.assertEqual(self.events, [])
+
+    def test_one_event_per_row(self):
+        """
+        Tests whether saving and deleting a single row sends one event each
+        and queues its notification.
+        """
+        self.ingest()
+        self.events.clear()
+
+        obj = MuseumAPICSV.objects.get(pk=1)
+        obj.title = 'Edited'
+        obj.save()
+        obj.delete()
+
+        self.assertEqual([(event.action, event.object_ids, event.bulk) for event in self.events], [
+            (ACTION_UPDATED, (1,), False),
+            (ACTION_DELETED, (1,), False),
+        ])
+        self.assertEqual(
+            list(Notification.objects.order_by('pk').values_list('action', 'object_id')),
+            [(ACTION_UPDATED, 1), (ACTION_DELETED, 1)]
+        )
+
+    def test_added_row(self):
+        """
+        Tests whether creating a row sends an added event.
+        """
+        self.ingest()
+        obj = MuseumAPICSV.objects.get(pk=1)
+        obj.pk = 99
+        obj._state.adding = True
+        self.events.clear()
+
+        obj.save()
+
+        self.assertEqual([(event.action, event.object_ids) for event in self.events], [(ACTION_ADDED, (99,))])
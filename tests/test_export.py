@@ -0,0 +1,61 @@
+"""
+    Contains tests for export.py
+"""
+
+import csv
+import io
+import os
+
+from django.test import TestCase
+
+from practice_app.export import EXPORT_COLUMNS, iter_csv, iter_csv_bytes, iter_export_rows
+from practice_app.ingest import MODE_UPSERT, ingest_csv
+from practice_app.models import MuseumAPICSV
+
+
+class TestExportCSV(TestCase):
+    """
+    Tests the functionality of the streaming CSV export.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+    def test_iter_export_rows_in_chunks(self):
+        """
+        Tests whether rows are read chunk by chunk in objectId order without
+        skipping or repeating any.
+        """
+        for chunk_size in (1, 4, 15, 100):
+            with self.assertNumQueries(15 // chunk_size + 1):
+                rows = list(iter_export_rows(columns=('title',), chunk_size=chunk_size))
+            self.assertEqual(rows, list(MuseumAPICSV.objects.order_by('pk').values_list('title')))
+
+    def test_iter_csv_yields_chunks(self):
+        """
+        Tests whether the CSV is yielded as the header followed by one string
+        per chunk of rows.
+        """
+        chunks = list(iter_csv(chunk_size=4))
+        self.assertEqual(len(chunks), 4)
+
+        rows = list(csv.reader(io.StringIO(''.join(chunks))))
+        self.assertEqual(rows[0], list(EXPORT_COLUMNS))
+        self.assertEqual(len(rows), 16)
+        self.assertEqual(rows[1][EXPORT_COLUMNS.index('title')], MuseumAPICSV.objects.get(pk=1).title)
+
+    def test_export_round_trip(self):
+        """
+        Tests whether ingesting an export leaves every row unchanged.
+        """
+        content = b''.join(iter_csv_bytes())
+        stats = ingest_csv(io.BytesIO(content), mode=MODE_UPSERT)
+
+        self.assertEqual(stats.rows, 15)
+        self.assertEqual(stats.unchanged, 15)
@@ -0,0 +1,178 @@
+"""
+    Contains tests for facets.py
+"""
+
+import io
+import os
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from practice_app.facets import FacetIndex, get_facet_index, reset_facet_index
+from practice_app.ingest import ingest_csv
+from practice_app.models import DeletedRow, MuseumAPICSV
+
+AMERICAN_WING = 'The American Wing'
+ARMS_AND_ARMOR = 'Arms and Armor'
+
+
+@override_settings(FACET_SYNC_INTERVAL=3600, NOTIFICATIONS_ASYNC=False)
+class TestFacetIndex(TestCase):
+    """
+    Tests the facet index and its upkeep.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing: rows 1-12
+        are Coins of The American Wing, 13 and 14 Coins of Arms and Armor and
+        15 a Medal of Arms and Armor.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        MuseumAPICSV.objects.update(classification='Coins')
+        MuseumAPICSV.objects.filter(pk__gte=13).update(department=ARMS_AND_ARMOR)
+        MuseumAPICSV.objects.filter(pk=15).update(classification='Medals')
+
+    def setUp(self):
+        """
+        Starts every test with an index loaded from its data.
+        """
+        reset_facet_index()
+        self.addCleanup(reset_facet_index)
+
+    def test_counts(self):
+        """
+        Tests whether every facet is counted, the most frequent value first.
+        """
+        result = get_facet_index().query()
+        self.assertEqual(result.count, 15)
+        self.assertEqual(result.object_ids, list(range(1, 16)))
+        self.assertEqual(result.facets, {
+            'department': [(AMERICAN_WING, 12), (ARMS_AND_ARMOR, 3)],
+            'classification': [('Coins', 14), ('Medals', 1)],
+            'culture': [('Mexican', 1)],
+            'artistNationality': [('American', 2)],
+        })
+        self.assertEqual(get_facet_index().query(limit=1).facets['department'], [(AMERICAN_WING, 12)])
+
+    def test_filters(self):
+        """
+        Tests whether values of one column are ORed, columns are ANDed and
+        the counts of a filtered column ignore its own filter.
+        """
+        index = get_facet_index()
+        with self.assertNumQueries(0):
+            result = index.query({'department': [ARMS_AND_ARMOR], 'classification': ['Coins']})
+        self.assertEqual((result.count, result.object_ids), (2, [13, 14]))
+        self.assertEqual(result.facets['department'], [(AMERICAN_WING, 12), (ARMS_AND_ARMOR, 2)])
+        self.assertEqual(result.facets['classification'], [('Coins', 2), ('Medals', 1)])
+
+        result = index.query({'department': [ARMS_AND_ARMOR, AMERICAN_WING], 'classification': ['Medals']})
+        self.assertEqual(result.object_ids, [15])
+        result = index.query({'classification': ['Coins', 'Medals'], 'artistNationality': ['American']})
+        self.assertEqual(result.object_ids, [1, 12])
+        result = index.query({'department': ['Asian Art'], 'classification': ['Coins']})
+        self.assertEqual((result.count, result.object_ids), (0, []))
+        self.assertEqual(index.query({'classification': ['Coins']}, offset=10, page_size=3).object_ids, [11, 12, 13])
+        self.assertRaises(ValueError, index.query, {'title': ['Coin']})
+
+    def test_row_changes(self):
+        """
+        Tests whether edits, additions and deletes are applied once they
+        are committed.
+        """
+        index = get_facet_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            row = MuseumAPICSV.objects.get(pk=3)
+            row.culture = 'Peruvian'
+            row.department = ARMS_AND_ARMOR
+            row.save()
+            row.pk = 900
+            row._state.adding = True
+            row.save()
+            MuseumAPICSV.objects.get(pk=15).delete()
+
+        result = index.query({'department': [ARMS_AND_ARMOR]})
+        self.assertEqual(result.object_ids, [3, 13, 14, 900])
+        self.assertEqual(result.facets['culture'], [('Peruvian', 2)])
+        self.assertEqual(result.facets['classification'], [('Coins', 4)])
+        self.assertEqual(index.query().count, 15)
+
+    def test_bulk_changes(self):
+        """
+        Tests whether rows written by a bulk ingest are applied.
+        """
+        index = get_facet_index()
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            content = file_ptr.read().replace(b'Mexican', b'Spanish')
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_csv(io.BytesIO(content), mode='upsert')
+        self.assertEqual(index.query().facets['culture'], [('Spanish', 1)])
+        # only row 15 differs from the file, the others are skipped as unchanged
+        self.assertEqual(index.query({'classification': ['Medals']}).count, 0)
+        self.assertEqual(index.query({'classification': ['Coins']}).count, 14)
+
+    def test_sync(self):
+        """
+        Tests whether changes made without events, as by another process,
+        are picked up from modifiedAt and the tombstones.
+        """
+        index = get_facet_index()
+        MuseumAPICSV.objects.filter(pk=2).update(artistNationality='French', modifiedAt=timezone.now())
+        DeletedRow.objects.create(pk=15, deletedAt=timezone.now())
+        MuseumAPICSV.objects.filter(pk=15).delete()
+        self.assertEqual(index.query().count, 15)
+
+        # rows written within SYNC_OVERLAP of loading are read again
+        self.assertEqual(index.sync()[1], 1)
+        result = index.query()
+        self.assertEqual(result.count, 14)
+        self.assertEqual(result.facets['artistNationality'], [('American', 2), ('French', 1)])
+        self.assertEqual(result.facets['culture'], [])
+
+    def test_update_rows(self):
+        """
+        Tests whether posting lists stay sorted and counts right as rows
+        are added, moved and removed.
+        """
+        index = FacetIndex(fields=('department',))
+        self.assertEqual(index.update_rows([(5000, 'A'), (7, 'B'), (3, 'A'), (9, 'A')]), 4)
+        self.assertEqual(index.update_rows([(9, 'B'), (4, '')]), 2)
+        self.assertEqual(index.remove_rows([3, 123456]), 1)
+        result = index.query({'department': ['A', 'B']})
+        self.assertEqual(result.object_ids, [7, 9, 5000])
+        self.assertEqual(result.facets['department'], [('B', 2), ('A', 1)])
+        self.assertEqual(index.query().count, 4)
+
+    def test_sparse_object_ids(self):
+        """
+        Tests whether the memory held does not grow with the largest
+        objectId, and whether negative objectIds are ignored.
+        """
+        index = FacetIndex(fields=('department',))
+        self.assertEqual(index.update_rows([(2147483647, 'A'), (1023, 'B'), (-1, 'C')]), 2)
+        self.assertLess(index._ids.nbytes + index._row_codes['department'].nbytes, 100)
+        self.assertEqual(index.query().object_ids, [1023, 2147483647])
+        self.assertEqual(index.query({'department': ['C']}).object_ids, [])
+        self.assertEqual(index.query({'department': ['B']}).object_ids, [1023])
+        self.assertEqual(index.remove_rows([-1, 2147483647, 2147483648]), 1)
+        self.assertEqual((index.query().count, index.query().object_ids), (1, [1023]))
+        self.assertEqual(index.query(offset=1).object_ids, [])
+
+    def test_facets_api(self):
+        """
+        Tests whether the facets endpoint answers from the index, page by page.
+        """
+        url = reverse('practice_app:facets_api')
+        content = self.client.get(url, {'classification': 'Coins', 'page_size': 10, 'page': 2}).json()
+        self.assertEqual(content['count'], 14)
+        self.assertEqual(content['object_ids'], [11, 12, 13, 14])
+        self.assertEqual((content['next'], content['previous']), (None, 1))
+        self.assertEqual(content['facets']['department'], [[AMERICAN_WING, 12], [ARMS_AND_ARMOR, 2]])
+
+        content = self.client.get(url, {'department': ARMS_AND_ARMOR, 'facet_limit': 1}).json()
+        self.assertEqual(content['facets']['classification'], [['Coins', 2]])
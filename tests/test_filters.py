@@ -0,0 +1,182 @@
+"""
+    Contains tests for filters.py
+"""
+
+import io
+import os
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import NotSupportedError, connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from practice_app.filters import find_table_scans, get_filters, get_sort
+from practice_app.ingest import ENGINE_PANDAS, ENGINE_PYTHON, ingest_csv
+from practice_app.models import MuseumAPICSV
+
+
+class TestListingFilters(TestCase):
+    """
+    Tests the filters and sorts of the listing.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        MuseumAPICSV.objects.filter(artistDisplayName='').update(artistDisplayName=None)
+        MuseumAPICSV.objects.filter(pk=2).update(isHighlight=True, department='Arms and Armor')
+
+    def setUp(self):
+        """
+        Starts every test with an empty cache: writes rolled back by other
+        tests never increment the version of the table.
+        """
+        cache.clear()
+
+    def get_ids(self, params, page_size=50):
+        response = self.client.get(reverse('practice_app:rows_api'), {'page_size': page_size, **params})
+        content = response.json()
+        return [row[0] for row in content['rows']], content['next'], content['previous']
+
+    def test_get_filters(self):
+        """
+        Tests whether the filters are read from the query string and invalid
+        values are ignored.
+        """
+        filters = get_filters(QueryDict(
+            'department=Asian Art&department=Egyptian Art&classification=&isHighlight=yes&isHighlight=true'
+            '&objectBeginDate__gte=1800&objectEndDate__lt=abc&title=Coin'
+        ))
+        self.assertEqual(filters, {
+            'department__in': ['Asian Art', 'Egyptian Art'],
+            'isHighlight__in': [True],
+            'objectBeginDateYear__gte': 1800,
+        })
+        self.assertEqual(get_sort('-department'), ('department', True))
+        self.assertEqual(get_sort('title'), (None, False))
+        self.assertEqual(get_sort('objectId'), (None, False))
+
+    def test_exact_filters(self):
+        """
+        Tests whether the rows are filtered on exact values.
+        """
+        self.assertEqual(self.get_ids({'department': 'Arms and Armor'})[0], [2])
+        self.assertEqual(self.get_ids({'isHighlight': 'true'})[0], [2])
+        self.assertEqual(self.get_ids({'artistDisplayName': 'Christian Gobrecht'})[0], [2, 11, 14])
+        self.assertEqual(
+            self.get_ids({'artistDisplayName': ['Bela Lyon Pratt', 'James Barton Longacre']})[0], [1, 10, 12, 13]
+        )
+        obj = MuseumAPICSV.objects.get(pk=5)
+        self.assertIn(5, self.get_ids({'accessionNumber': obj.accessionNumber})[0])
+
+    def test_range_filters(self):
+        """
+        Tests whether the years are compared as numbers and the rows sorted
+        on them when no sort is given.
+        """
+        ids, _, _ = self.get_ids({'objectBeginDate__gte': 1900, 'objectBeginDate__lt': 1910})
+        self.assertEqual(ids, [2, 11, 14, 3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(self.get_ids({'objectEndDate__lte': 1853})[0], [15, 1])
+
+    def test_years_written_with_rows(self):
+        """
+        Tests whether saves and both ingest engines fill the year columns,
+        leaving them empty for dates that are not a number.
+        """
+        row = MuseumAPICSV.objects.get(pk=1)
+        row.objectBeginDate, row.objectEndDate = 'ca. 1850', '-300'
+        row.save()
+        self.assertEqual(MuseumAPICSV.objects.filter(pk=1).values_list('objectBeginDateYear', 'objectEndDateYear')
+                         .get(), (None, -300))
+
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            content = file_ptr.read()
+        for engine in (ENGINE_PYTHON, ENGINE_PANDAS):
+            MuseumAPICSV.objects.all().delete()
+            ingest_csv(io.BytesIO(content), engine=engine)
+            self.assertEqual(
+                list(MuseumAPICSV.objects.values_list('objectBeginDateYear', flat=True).order_by('pk')),
+                [int(value) for value in MuseumAPICSV.objects.values_list('objectBeginDate', flat=True).order_by('pk')],
+            )
+        ids, _, _ = self.get_ids({'objectBeginDate__gte': 1900, 'objectBeginDate__lt': 1910})
+        self.assertEqual(ids, [2, 11, 14, 3, 4, 5, 6, 7, 8, 9])
+
+    def test_sorted_pages(self):
+        """
+        Tests whether every row is listed once, in order, when paging through
+        a sort with ties and NULLs, in both directions.
+        """
+        for sort in ('artistDisplayName', '-artistDisplayName', 'objectBeginDate', '-objectEndDate', 'isHighlight'):
+            name = sort.lstrip('-')
+            rows = MuseumAPICSV.objects.values_list('pk', name)
+            key = (lambda row: (row[1] is not None, int(row[1]) if name.endswith('Date') else row[1], row[0]))
+            expected = [pk for pk, _ in sorted(rows, key=key, reverse=sort.startswith('-'))]
+
+            ids = []
+            pages = []
+            after = None
+            while True:
+                page, after, previous = self.get_ids({'sort': sort, **({'after': after} if after else {})}, 4)
+                ids.extend(page)
+                pages.append((page, previous))
+                if after is None:
+                    break
+            self.assertEqual(ids, expected, sort)
+
+            for (page, _), (_, previous) in zip(pages, pages[1:]):
+                self.assertEqual(self.get_ids({'sort': sort, 'before': previous}, 4)[0], page, sort)
+
+    def test_listing_with_filters(self):
+        """
+        Tests whether the homepage keeps the filters in its page links and
+        says so when nothing matches.
+        """
+        response = self.client.get(reverse('practice_app:index'), {'department': 'The American Wing', 'page_size': 4})
+        self.assertEqual(len(response.context['page']), 4)
+        self.assertIn('department=The+American+Wing', response.context['next_page_url'])
+
+        response = self.client.get(reverse('practice_app:index'), {'department': 'Unknown'})
+        self.assertContains(response, 'No rows match the filters.')
+
+    @override_settings(LISTING_CACHE_TIMEOUT=0)
+    def test_filters_use_indexes(self):
+        """
+        Tests whether every supported filter and sort is read through an
+        index rather than a table scan.
+        """
+        accession_number = MuseumAPICSV.objects.get(pk=5).accessionNumber
+        cases = [
+            {'accessionNumber': accession_number},
+            {'department': 'Asian Art'},
+            {'artistDisplayName': 'Christian Gobrecht'},
+            {'classification': 'Coins'},
+            {'isHighlight': 'true'},
+            {'objectBeginDate__gte': 1900},
+            {'objectEndDate__lte': 1800},
+            {'department': 'Asian Art', 'classification': 'Coins'},
+            {'department': 'Asian Art', 'isHighlight': 'false'},
+            {'department': 'Asian Art', 'objectBeginDate__gte': 1900},
+            {'sort': '-department'},
+            {'sort': 'objectEndDate'},
+        ]
+        for params in cases:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('practice_app:rows_api'), params)
+            # besides the version of the table, read by its primary key
+            select = [
+                query['sql'] for query in queries.captured_queries
+                if query['sql'].startswith('SELECT') and 'practice_app_tableversion' not in query['sql']
+            ]
+            self.assertEqual(len(select), 1)
+            self.assertEqual(find_table_scans(select[0]), [], params)
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'), self.assertRaises(NotSupportedError):
+            find_table_scans('SELECT 1')
@@ -0,0 +1,93 @@
+"""
+    Contains tests for formats.py
+"""
+
+import gzip
+import io
+import os
+from unittest import skipIf
+
+from django.test import TestCase
+
+from practice_app import formats
+from practice_app.export import iter_csv_bytes
+from practice_app.formats import FORMAT_CSV, FORMAT_GZIP, FORMAT_PARQUET, FORMAT_ZSTD, FORMATS, detect_format, \
+    ingest_backup, iter_backup_bytes
+from practice_app.ingest import MODE_UPSERT, ingest_csv
+from practice_app.models import MuseumAPICSV
+
+
+# every column except modifiedAt, which records when the row was written
+STORED_COLUMNS = [field.name for field in MuseumAPICSV._meta.concrete_fields if field.name != 'modifiedAt']
+
+
+class TestBackupFormats(TestCase):
+    """
+    Tests the functionality of the backup encoders and decoders.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+    def assertRoundTrip(self, backup_format):
+        """
+        Asserts that a backup in the given format restores the exact rows,
+        whether or not the format is given.
+        """
+        expected = list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS))
+        content = b''.join(iter_backup_bytes(backup_format))
+        self.assertEqual(detect_format(content[:4]), backup_format)
+
+        for given_format in (backup_format, None):
+            MuseumAPICSV.objects.all().delete()
+            stats = ingest_backup(io.BytesIO(content), backup_format=given_format)
+            self.assertEqual(stats.rows, 15)
+            self.assertEqual(list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS)), expected)
+
+        stats = ingest_backup(io.BytesIO(content), mode=MODE_UPSERT)
+        self.assertEqual(stats.unchanged, 15)
+
+    def test_csv_round_trip(self):
+        """
+        Tests whether a plain CSV backup restores the exact rows.
+        """
+        self.assertRoundTrip(FORMAT_CSV)
+
+    def test_gzip_round_trip(self):
+        """
+        Tests whether a gzip backup is the compressed CSV export and restores
+        the exact rows.
+        """
+        content = b''.join(iter_backup_bytes(FORMAT_GZIP))
+        self.assertEqual(gzip.decompress(content), b''.join(iter_csv_bytes()))
+        self.assertRoundTrip(FORMAT_GZIP)
+
+    @skipIf(formats.zstandard is None, 'zstandard is not installed')
+    def test_zstd_round_trip(self):
+        """
+        Tests whether a zstd backup restores the exact rows.
+        """
+        self.assertRoundTrip(FORMAT_ZSTD)
+
+    @skipIf(formats.pq is None, 'pyarrow is not installed')
+    def test_parquet_round_trip(self):
+        """
+        Tests whether a Parquet backup written in several row groups
+        restores the exact rows.
+        """
+        with self.settings(BACKUP_PARQUET_ROW_GROUP_SIZE=4):
+            self.assertRoundTrip(FORMAT_PARQUET)
+
+    def test_detect_format(self):
+        """
+        Tests whether plain CSV is assumed when no magic bytes match.
+        """
+        self.assertEqual(detect_format(b'obje'), FORMAT_CSV)
+        self.assertEqual(detect_format(b''), FORMAT_CSV)
+        self.assertEqual(len(FORMATS), 4)
@@ -0,0 +1,233 @@
+"""
+    Contains tests for ingest.py
+"""
+
+import csv
+import datetime
+import io
+import os
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from practice_app.ingest import CSVColumnMapping, CSVSource, ENGINE_PANDAS, ENGINE_PYTHON, MODE_INSERT, \
+    MODE_UPSERT, ingest_csv, ingest_csv_vectorized, ingest_objects, iter_batches, iter_museum_api_objects, \
+    load_content_hashes, open_csv_text
+from practice_app.models import MuseumAPICSV
+
+
+# every column except modifiedAt, which records when the row was written
+STORED_COLUMNS = [field.name for field in MuseumAPICSV._meta.concrete_fields if field.name != 'modifiedAt']
+
+
+class TestIngestCSV(TestCase):
+    """
+    Tests the functionality of the streaming CSV ingest pipeline.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    def test_iter_batches(self):
+        """
+        Tests whether iter_batches splits an iterable into bounded batches.
+        """
+        batches = list(iter_batches(range(7), 3))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_iter_objects_skips_blank_lines(self):
+        """
+        Tests whether blank lines in the CSV are ignored.
+        """
+        objects = list(iter_museum_api_objects(['objectID,title\n', '1,Coin\n', '\n', '2,Vase\n']))
+        self.assertEqual([obj.pk for obj in objects], [1, 2])
+
+    def test_mapping_resolves_columns_by_header(self):
+        """
+        Tests whether columns are mapped by name, so reordered and extra
+        columns are handled and missing columns get their defaults.
+        """
+        mapping = CSVColumnMapping(['title', 'unknownColumn', 'GalleryNumber', 'objectID', 'isHighlight',
+                                    'metadataDate'])
+        obj = mapping.to_object(['Coin', 'ignored', '', '7', 'True', '2021-04-06T04:41:04.967Z'])
+
+        self.assertEqual(obj.objectId, 7)
+        self.assertEqual(obj.title, 'Coin')
+        self.assertTrue(obj.isHighlight)
+        self.assertFalse(obj.isPublicDomain)
+        self.assertEqual(obj.galleryNumber, -1)
+        self.assertEqual(obj.constituentID, -1)
+        self.assertEqual(obj.gender, 'male')
+        self.assertEqual(obj.artistGender, 'male')
+        self.assertEqual(obj.medium, '')
+        self.assertEqual(obj.metadataDate.year, 2021)
+        self.assertEqual(obj.metadataDate.tzinfo, datetime.timezone.utc)
+
+    def test_mapping_requires_object_id(self):
+        """
+        Tests whether a header without the objectId column is rejected.
+        """
+        with self.assertRaises(ValidationError):
+            CSVColumnMapping(['title', 'department'])
+
+    def test_validated_sample_is_replayed(self):
+        """
+        Tests whether the rows converted while validating a CSVSource are
+        yielded again when it is iterated, so the file is read only once.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'r', encoding='utf-8', newline='') as file_ptr:
+            csv_source = CSVSource(file_ptr)
+            csv_source.validate(sample_size=5)
+            self.assertEqual(len(csv_source.sample), 5)
+            objects = list(csv_source)
+
+        self.assertEqual(len(objects), 15)
+        self.assertEqual(objects[0].pk, 1)
+
+    def test_validate_rejects_invalid_rows(self):
+        """
+        Tests whether validate raises ValidationError for rows that fail
+        type conversion and for headers missing required columns.
+        """
+        header = 'objectID,isHighlight,accessionNumber,accessionYear,isPublicDomain,department,objectName,' \
+                 'isTimelineWork\n'
+        with self.assertRaises(ValidationError):
+            CSVSource([header, 'abc,False,1,1979,False,Wing,Coin,False\n']).validate()
+        with self.assertRaises(ValidationError):
+            CSVSource(['objectID,title\n', '1,Coin\n']).validate()
+        with self.assertRaisesMessage(ValidationError, "'yes' is not a valid boolean"):
+            CSVSource([header, '1,yes,1,1979,False,Wing,Coin,False\n']).validate()
+
+    def test_invalid_booleans_are_refused_by_both_engines(self):
+        """
+        Tests whether boolean values that are neither true nor false stop
+        the ingest instead of being stored as False.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            content = file_ptr.read().replace(b'1,False,1979.486.1,', b'1,Flase,1979.486.1,')
+        for engine in (ENGINE_PYTHON, ENGINE_PANDAS):
+            with self.assertRaisesMessage(ValueError, "'Flase' is not a valid boolean"):
+                ingest_csv(io.BytesIO(content), engine=engine)
+            self.assertFalse(MuseumAPICSV.objects.filter(pk=1).exists())
+
+    def test_validate_rejects_unreadable_files(self):
+        """
+        Tests whether validate raises ValidationError for files that are not
+        text in the expected encoding or not CSV.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            lines = file_ptr.read().splitlines(keepends=True)
+        with self.assertRaises(ValidationError):
+            CSVSource(open_csv_text(io.BytesIO(b''.join(lines[:3] + [b'\xff\xfe\n'] + lines[3:])))).validate()
+        with self.assertRaises(ValidationError):
+            CSVSource(open_csv_text(io.BytesIO(b'\xff\xfe' + b''.join(lines))))
+        with self.assertRaisesMessage(ValidationError, 'line 3'):
+            long_field = b'"' + b'x' * (csv.field_size_limit() + 1) + b'"\n'
+            CSVSource(open_csv_text(io.BytesIO(b''.join(lines[:2] + [long_field])))).validate()
+
+    def test_ingest_csv_in_batches(self):
+        """
+        Tests whether all the rows of a CSV file are inserted batch by batch.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            stats = ingest_csv(file_ptr, batch_size=4)
+
+        self.assertEqual(stats.rows, 15)
+        self.assertEqual(stats.batches, 4)
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+        self.assertGreater(stats.as_dict()['rows_per_sec'], 0)
+
+    def test_pandas_engine_matches_python_engine(self):
+        """
+        Tests whether the vectorized pandas engine stores exactly the same
+        rows as the row by row engine, content hashes included, however the
+        file is split into chunks and batches.
+        """
+        csv_path = os.path.join(self.base_dir, 'museum_data.csv')
+        with open(csv_path, 'rb') as file_ptr:
+            stats = ingest_csv_vectorized(file_ptr, batch_size=3, chunk_size=7)
+        self.assertEqual((stats.rows, stats.batches), (15, 7))
+        vectorized = list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS))
+
+        MuseumAPICSV.objects.all().delete()
+        with open(csv_path, 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        self.assertEqual(vectorized, list(MuseumAPICSV.objects.order_by('pk').values(*STORED_COLUMNS)))
+
+    def test_upsert_updates_only_changed_rows(self):
+        """
+        Tests whether re-ingesting a corrected export in upsert mode updates
+        the changed rows, inserts the new ones and counts the rest as unchanged.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'r', encoding='utf-8') as file_ptr:
+            lines = file_ptr.read().splitlines(keepends=True)
+        ingest_objects(iter_museum_api_objects(lines), mode=MODE_UPSERT)
+
+        corrected = lines[:1] + [lines[1].replace('One-dollar', 'Two-dollar')] + lines[2:]
+        for engine in (ENGINE_PYTHON, ENGINE_PANDAS):
+            MuseumAPICSV.objects.filter(pk=15).delete()
+            stats = ingest_csv(io.StringIO(''.join(corrected)), engine=engine, mode=MODE_UPSERT)
+
+            self.assertEqual(stats.as_dict()['inserted'], 1)
+            self.assertEqual(MuseumAPICSV.objects.count(), 15)
+            self.assertTrue(MuseumAPICSV.objects.filter(title__startswith='Two-dollar').exists())
+            # only the first engine sees the corrected title as a change
+            self.assertEqual(stats.updated, 1 if engine == ENGINE_PYTHON else 0)
+            self.assertEqual(stats.unchanged, 14 - stats.updated)
+
+    def test_insert_mode_keeps_existing_rows(self):
+        """
+        Tests whether insert mode leaves rows whose objectId already exists
+        untouched.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'r', encoding='utf-8') as file_ptr:
+            content = file_ptr.read()
+        ingest_csv(io.StringIO(content), mode=MODE_INSERT)
+        MuseumAPICSV.objects.filter(pk=1).update(title='Edited')
+
+        ingest_csv(io.StringIO(content), mode=MODE_INSERT)
+        self.assertEqual(MuseumAPICSV.objects.get(pk=1).title, 'Edited')
+
+    def test_content_hash_matches_saved_rows(self):
+        """
+        Tests whether ingest computes the same content hash as saving the row
+        through the model, and whether editing a row changes its hash.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+        obj = MuseumAPICSV.objects.get(pk=1)
+        ingested_hash = obj.contentHash
+        self.assertEqual(len(ingested_hash), 16)
+        self.assertEqual(obj.compute_content_hash(), ingested_hash)
+
+        obj.title = 'Edited'
+        obj.save()
+        self.assertNotEqual(obj.contentHash, ingested_hash)
+        self.assertEqual(load_content_hashes([1, 404]), {1: obj.contentHash})
+
+    def test_naive_dates_hash_alike(self):
+        """
+        Tests whether a date time without UTC offset gets the same content
+        hash from both engines and from the model, so re-ingesting it with
+        either engine finds the row unchanged.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'r', encoding='utf-8') as file_ptr:
+            lines = file_ptr.read().splitlines(keepends=True)
+        header = next(csv.reader(lines[:1]))
+        row = next(csv.reader(lines[1:2]))
+        row[[name.lower() for name in header].index('metadatadate')] = '2021-05-04 10:00:00'
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([header, row])
+        content = buffer.getvalue()
+
+        hashes = []
+        for engine in (ENGINE_PYTHON, ENGINE_PANDAS):
+            MuseumAPICSV.objects.all().delete()
+            ingest_csv(io.StringIO(content), engine=engine, mode=MODE_UPSERT)
+            obj = MuseumAPICSV.objects.get()
+            self.assertEqual(obj.metadataDate, datetime.datetime(2021, 5, 4, 10, tzinfo=datetime.timezone.utc))
+            self.assertEqual(obj.compute_content_hash(), obj.contentHash)
+            hashes.append(obj.contentHash)
+            for second_engine in (ENGINE_PYTHON, ENGINE_PANDAS):
+                stats = ingest_csv(io.StringIO(content), engine=second_engine, mode=MODE_UPSERT)
+                self.assertEqual((stats.updated, stats.unchanged), (0, 1))
+        self.assertEqual(hashes[0], hashes[1])
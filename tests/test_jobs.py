@@ -0,0 +1,150 @@
+"""
+    Contains tests for jobs.py
+"""
+
+import os
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from practice_app.backup import backup_to_s3
+from practice_app.ingest import ingest_csv
+from practice_app.jobs import _record_progress, create_restore_job, create_upload_job, run_restore_job, \
+    run_upload_job
+from practice_app.models import CSVUploadJob, MuseumAPICSV, Notification, JOB_STATUS_DONE, JOB_STATUS_FAILED
+from tests.fake_s3 import FakeS3Client
+
+
+@override_settings(CSV_UPLOAD_JOBS_ASYNC=False)
+class TestUploadJobs(TestCase):
+    """
+    Tests the background ingest of uploaded CSV files.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    def get_csv_file(self):
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            return SimpleUploadedFile('museum_data.csv', file_ptr.read())
+
+    def test_run_upload_job(self):
+        """
+        Tests whether a job ingests its spooled file, records its progress
+        and removes the spooled file.
+        """
+        job = create_upload_job(self.get_csv_file())
+        self.assertTrue(os.path.exists(job.spool_path))
+
+        run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS_DONE)
+        self.assertEqual(job.rows_processed, 15)
+        self.assertEqual(job.bytes_processed, job.bytes_total)
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+        self.assertFalse(os.path.exists(job.spool_path))
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_failed_job_records_error(self):
+        """
+        Tests whether a job whose file cannot be ingested is marked as failed.
+        """
+        job = create_upload_job(SimpleUploadedFile('broken.csv', b'title\nCoin\n'))
+
+        run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+        self.assertIn('objectId', job.error)
+
+    @override_settings(CSV_INGEST_ENGINE='python', CSV_INGEST_BATCH_SIZE=2)
+    def test_invalid_sample_fails_job_before_writing(self):
+        """
+        Tests whether a job validates the first rows of its file before
+        writing any of them, reporting the invalid value in its error.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), encoding='utf-8') as file_ptr:
+            lines = file_ptr.read().splitlines(keepends=True)
+        lines[4] = lines[4].replace(',False,', ',maybe,', 1)
+        job = create_upload_job(SimpleUploadedFile('museum_data.csv', ''.join(lines).encode()))
+
+        run_upload_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+        self.assertIn('line 5', job.error)
+        self.assertIn("'maybe' is not a valid boolean", job.error)
+        self.assertEqual(MuseumAPICSV.objects.count(), 0)
+
+    def test_upload_returns_job_and_status(self):
+        """
+        Tests whether an ajax upload returns the job and whether its progress
+        can be polled from the status endpoint.
+        """
+        response = self.client.post(
+            reverse('practice_app:upload_csv'),
+            data={'csv_file': [self.get_csv_file()]},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+
+        response = self.client.get(reverse('practice_app:upload_job_status', kwargs={'job_id': job_id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], JOB_STATUS_DONE)
+        self.assertEqual(response.json()['rows_processed'], 15)
+
+    def test_status_of_non_existent_job(self):
+        """
+        Tests whether polling an unknown job returns 404.
+        """
+        self.assertFalse(CSVUploadJob.objects.filter(pk=404).exists())
+        response = self.client.get(reverse('practice_app:upload_job_status', kwargs={'job_id': 404}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CSV_UPLOAD_JOBS_ASYNC=False, BACKUP_BUCKET_NAME='test-bucket', BACKUP_RESTORE_BATCH_SIZE=4)
+class TestRestoreJobs(TestCase):
+    """
+    Tests the background restore of S3 backups.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    def test_run_restore_job(self):
+        """
+        Tests whether a job restores the backups batch by batch and records
+        its progress.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        s3 = FakeS3Client()
+        backup_to_s3(s3, 'test-bucket')
+        MuseumAPICSV.objects.all().delete()
+
+        job = create_restore_job('test-bucket')
+        with mock.patch('practice_app.jobs.get_s3_client', return_value=s3), \
+                mock.patch('practice_app.jobs._record_progress', wraps=_record_progress) as record_progress:
+            run_restore_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS_DONE)
+        self.assertEqual(job.rows_processed, 15)
+        self.assertEqual(job.bytes_processed, job.bytes_total)
+        self.assertGreater(job.bytes_total, 0)
+        # one report per batch of 4 rows, plus the final one
+        self.assertEqual(record_progress.call_count, 5)
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_nothing_to_restore(self):
+        """
+        Tests whether a job fails when the bucket holds no backup.
+        """
+        job = create_restore_job('test-bucket')
+        with mock.patch('practice_app.jobs.get_s3_client', return_value=FakeS3Client()):
+            run_restore_job(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+        self.assertEqual(job.error, 'Nothing to restore')
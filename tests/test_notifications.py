@@ -0,0 +1,226 @@
+"""
+    Contains tests for notifications.py
+"""
+
+import datetime
+import os
+from unittest import mock
+
+from botocore.exceptions import EndpointConnectionError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from practice_app.ingest import ingest_csv
+from practice_app.models import Notification, NOTIFICATION_ACTION_ADDED, NOTIFICATION_ACTION_DELETED, \
+    NOTIFICATION_ACTION_UPDATED, NOTIFICATION_STATUS_FAILED, NOTIFICATION_STATUS_PENDING, NOTIFICATION_STATUS_SENT
+from practice_app.notifications import CLAIM_SECONDS, _lock_pending, claim_notifications, coalesce_row_events, \
+    dispatch_notifications, enqueue_notification, enqueue_row_event, format_digest, get_next_wait, get_retry_delay
+
+
+def publish_batch(TopicArn, PublishBatchRequestEntries):
+    return {'Successful': [{'Id': entry['Id']} for entry in PublishBatchRequestEntries], 'Failed': []}
+
+
+@override_settings(SNS_TOPIC_ARN='arn:aws:sns:test', NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_DELAY=2)
+@mock.patch('practice_app.notifications.get_sns_client')
+class TestNotificationOutbox(TestCase):
+    """
+    Tests the outbox of SNS notifications and its dispatcher.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    def get_published(self, get_sns_client):
+        return [
+            entry
+            for call in get_sns_client.return_value.publish_batch.call_args_list
+            for entry in call.kwargs['PublishBatchRequestEntries']
+        ]
+
+    def test_enqueue_wakes_dispatcher_on_commit(self, get_sns_client):
+        """
+        Tests whether enqueuing only stores the notification, and wakes the
+        dispatcher once the transaction commits.
+        """
+        with mock.patch('practice_app.notifications.wake_dispatcher') as wake_dispatcher, \
+                self.captureOnCommitCallbacks(execute=True):
+            notification = enqueue_notification('Subject', 'Message')
+            wake_dispatcher.assert_not_called()
+
+        wake_dispatcher.assert_called_once()
+        get_sns_client.assert_not_called()
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_PENDING)
+
+    def test_dispatch_publishes_pending(self, get_sns_client):
+        """
+        Tests whether the dispatcher publishes the due notifications once.
+        """
+        get_sns_client.return_value.publish_batch.side_effect = publish_batch
+        enqueue_notification('First', 'Message')
+        enqueue_notification('Second', 'Message')
+
+        self.assertEqual(dispatch_notifications(), (2, 0))
+        self.assertEqual(dispatch_notifications(), (0, 0))
+
+        self.assertEqual(get_sns_client.return_value.publish_batch.call_count, 1)
+        self.assertEqual([entry['Subject'] for entry in self.get_published(get_sns_client)], ['First', 'Second'])
+        self.assertEqual(Notification.objects.filter(status=NOTIFICATION_STATUS_SENT).count(), 2)
+
+    def test_failed_publish_is_retried_with_backoff(self, get_sns_client):
+        """
+        Tests whether a failed notification is scheduled again later and
+        given up after NOTIFICATION_MAX_ATTEMPTS attempts.
+        """
+        get_sns_client.return_value.publish_batch.side_effect = EndpointConnectionError(endpoint_url='https://sns')
+        notification = enqueue_notification('Subject', 'Message')
+
+        self.assertEqual(dispatch_notifications(), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_PENDING)
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('https://sns', notification.last_error)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        # not due yet
+        self.assertEqual(dispatch_notifications(), (0, 0))
+
+        for _ in range(2):
+            Notification.objects.update(next_attempt_at=timezone.now())
+            dispatch_notifications()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, NOTIFICATION_STATUS_FAILED)
+        self.assertEqual(notification.attempts, 3)
+        self.assertEqual(get_sns_client.return_value.publish_batch.call_count, 3)
+
+    def test_retry_delay(self, get_sns_client):
+        """
+        Tests whether the retry delay doubles per attempt and is capped.
+        """
+        self.assertTrue(1 <= get_retry_delay(1) <= 2)
+        self.assertTrue(4 <= get_retry_delay(3) <= 8)
+        with self.settings(NOTIFICATION_MAX_RETRY_DELAY=10):
+            self.assertTrue(5 <= get_retry_delay(20) <= 10)
+
+    def test_claimed_notifications_are_skipped(self, get_sns_client):
+        """
+        Tests whether a notification claimed by one dispatcher is not picked
+        up by another one.
+        """
+        enqueue_notification('Subject', 'Message')
+
+        self.assertEqual(len(claim_notifications()), 1)
+        self.assertEqual(claim_notifications(), [])
+        Notification.objects.update(next_attempt_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(len(claim_notifications()), 1)
+
+    def test_locks_skip_held_rows_where_supported(self, get_sns_client):
+        """
+        Tests whether pending notifications are locked with SKIP LOCKED only
+        on databases that support it.
+        """
+        for supported in (True, False):
+            with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', supported):
+                query = _lock_pending(Notification.objects).query
+            self.assertTrue(query.select_for_update)
+            self.assertEqual(query.select_for_update_skip_locked, supported)
+
+    @override_settings(NOTIFICATION_POLL_INTERVAL=30)
+    def test_next_wait(self, get_sns_client):
+        """
+        Tests whether the dispatcher waits for the next notification to be
+        due, and for the claim of another dispatcher to expire rather than
+        polling in a loop while it holds a due one.
+        """
+        self.assertEqual(get_next_wait(), 30)
+        notification = enqueue_notification('Subject', 'Message')
+        Notification.objects.update(next_attempt_at=timezone.now() + datetime.timedelta(seconds=10))
+        self.assertTrue(9 < get_next_wait() <= 10)
+        Notification.objects.update(next_attempt_at=timezone.now() + datetime.timedelta(seconds=100))
+        self.assertEqual(get_next_wait(), 30)
+
+        # due, but left unclaimed since another dispatcher holds it
+        Notification.objects.filter(pk=notification.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(get_next_wait(), CLAIM_SECONDS)
+
+    def test_delete_view_does_not_call_sns(self, get_sns_client):
+        """
+        Tests whether deleting a row enqueues its notification instead of
+        publishing it inside the request.
+        """
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+        response = self.client.post(reverse('practice_app:delete_row', kwargs={'objectId': 1}))
+
+        self.assertEqual(response.status_code, 302)
+        get_sns_client.assert_not_called()
+        notification = Notification.objects.get()
+        self.assertEqual((notification.action, notification.object_id), (NOTIFICATION_ACTION_DELETED, 1))
+
+    def test_failed_entries_of_a_batch(self, get_sns_client):
+        """
+        Tests whether only the entries SNS rejected are retried.
+        """
+        first = enqueue_notification('First', 'Message')
+        second = enqueue_notification('Second', 'Message')
+        get_sns_client.return_value.publish_batch.return_value = {
+            'Successful': [{'Id': str(first.pk)}],
+            'Failed': [{'Id': str(second.pk), 'Code': 'Throttled', 'Message': 'Rate exceeded', 'SenderFault': False}],
+        }
+
+        self.assertEqual(dispatch_notifications(), (1, 1))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, NOTIFICATION_STATUS_SENT)
+        self.assertEqual(second.status, NOTIFICATION_STATUS_PENDING)
+        self.assertEqual(second.last_error, 'Throttled: Rate exceeded')
+
+    def test_format_digest(self, get_sns_client):
+        """
+        Tests whether a digest lists the objectIds once per action.
+        """
+        subject, message = format_digest([
+            (NOTIFICATION_ACTION_UPDATED, 2), (NOTIFICATION_ACTION_ADDED, 7),
+            (NOTIFICATION_ACTION_UPDATED, 1), (NOTIFICATION_ACTION_UPDATED, 2),
+        ])
+
+        self.assertTrue(subject.startswith('[CRUD App] 3 rows changed - '))
+        self.assertIn('Added (1): 7\nUpdated (2): 1, 2\n', message)
+        self.assertNotIn('Deleted', message)
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60, NOTIFICATION_DIGEST_MAX_EVENTS=100)
+    def test_row_events_are_sent_as_one_digest(self, get_sns_client):
+        """
+        Tests whether row events wait for the window and are then published
+        as a single digest.
+        """
+        get_sns_client.return_value.publish_batch.side_effect = publish_batch
+        for object_id in range(1, 31):
+            enqueue_row_event(NOTIFICATION_ACTION_UPDATED, object_id)
+        enqueue_row_event(NOTIFICATION_ACTION_DELETED, 31)
+
+        self.assertEqual(dispatch_notifications(), (0, 0))
+        get_sns_client.return_value.publish_batch.assert_not_called()
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(dispatch_notifications(), (1, 0))
+
+        published = self.get_published(get_sns_client)
+        self.assertEqual(len(published), 1)
+        self.assertIn('31 rows changed', published[0]['Subject'])
+        self.assertIn('Updated (30): 1, 2, 3', published[0]['Message'])
+        self.assertIn('Deleted (1): 31', published[0]['Message'])
+        self.assertFalse(Notification.objects.exclude(action='').exists())
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=60, NOTIFICATION_DIGEST_MAX_EVENTS=10)
+    def test_full_digest_is_sent_before_the_window_ends(self, get_sns_client):
+        """
+        Tests whether NOTIFICATION_DIGEST_MAX_EVENTS buffered events make a
+        digest go out at once, leaving the rest for the next one.
+        """
+        for object_id in range(1, 26):
+            enqueue_row_event(NOTIFICATION_ACTION_UPDATED, object_id)
+
+        self.assertEqual(coalesce_row_events(), 2)
+        self.assertEqual(Notification.objects.filter(action='').count(), 2)
+        self.assertEqual(Notification.objects.exclude(action='').count(), 5)
@@ -0,0 +1,127 @@
+"""
+    Contains tests for parallel.py
+"""
+
+import csv
+import io
+import os
+import tempfile
+from unittest import skipIf
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from practice_app.models import MuseumAPICSV
+from practice_app.parallel import CSVShard, compute_csv_shards, ingest_csv_parallel
+
+
+class TestParallelIngest(TestCase):
+    """
+    Tests splitting a CSV file into shards and ingesting them.
+    """
+    csv_path = os.path.join(os.path.abspath('tests/Truth/'), 'museum_data.csv')
+
+    def test_shards_cover_the_body_on_line_boundaries(self):
+        """
+        Tests whether the shards are contiguous, start on line boundaries and
+        together contain every data line exactly once.
+        """
+        header, shards = compute_csv_shards(self.csv_path, 4)
+        with open(self.csv_path, 'rb') as file_ptr:
+            content = file_ptr.read()
+
+        self.assertEqual(len(shards), 4)
+        self.assertEqual(shards[0][0], len(header))
+        self.assertEqual(shards[-1][1], len(content))
+        for (_, end), (start, _) in zip(shards, shards[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[start - 1:start], b'\n')
+
+    def test_shards_keep_quoted_line_breaks(self):
+        """
+        Tests whether no shard starts inside a quoted field spanning several
+        lines.
+        """
+        with open(self.csv_path, newline='', encoding='utf-8') as file_ptr:
+            rows = list(csv.reader(file_ptr))
+        title = rows[0].index('title')
+        for row in rows[1:]:
+            row[title] = f'First line\nsecond "line"\nthird line of {row[0]}'
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'museum_data.csv')
+            with open(path, 'w', newline='', encoding='utf-8') as file_ptr:
+                csv.writer(file_ptr).writerows(rows)
+
+            for count in (2, 4, 7, 40):
+                header, shards = compute_csv_shards(path, count)
+                records = []
+                for start, end in shards:
+                    with io.BufferedReader(CSVShard(path, header, start, end)) as shard:
+                        records.extend(list(csv.reader(io.TextIOWrapper(shard, encoding='utf-8', newline='')))[1:])
+                self.assertEqual(records, rows[1:], count)
+
+    def test_shard_reads_header_and_its_range(self):
+        """
+        Tests whether a CSVShard yields the header followed by its own bytes.
+        """
+        header, shards = compute_csv_shards(self.csv_path, 3)
+        start, end = shards[1]
+        with open(self.csv_path, 'rb') as file_ptr:
+            file_ptr.seek(start)
+            expected = header + file_ptr.read(end - start)
+
+        with io.BufferedReader(CSVShard(self.csv_path, header, start, end)) as shard:
+            self.assertEqual(shard.read(), expected)
+
+    def test_more_shards_than_lines(self):
+        """
+        Tests whether asking for more shards than lines yields no empty shards.
+        """
+        _, shards = compute_csv_shards(self.csv_path, 100)
+        self.assertEqual(len(shards), 15)
+        self.assertTrue(all(end > start for start, end in shards))
+
+    def test_ingest_shards_in_process(self):
+        """
+        Tests whether every row is ingested when the shards are processed in
+        the calling process.
+        """
+        header, _ = compute_csv_shards(self.csv_path, 1)
+        stats = ingest_csv_parallel(self.csv_path, processes=1)
+        self.assertEqual(stats.rows, 15)
+        self.assertEqual(stats.bytes_read, os.path.getsize(self.csv_path) - len(header))
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+
+    @skipIf(connection.vendor != 'sqlite', 'SQLite only')
+    def test_several_processes_refused_on_sqlite(self):
+        """
+        Tests whether several processes are refused on SQLite before any row
+        is written, and whether one is used by default.
+        """
+        with self.assertRaisesMessage(CommandError, 'SQLite accepts a single writer'):
+            call_command('ingest_csv', self.csv_path, processes=2, stdout=io.StringIO())
+        self.assertEqual(MuseumAPICSV.objects.count(), 0)
+
+        call_command('ingest_csv', self.csv_path, stdout=io.StringIO())
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite accepts a single writer')
+class TestParallelIngestProcesses(TransactionTestCase):
+    """
+    Tests ingesting the shards of a CSV file with worker processes, which
+    need the rows committed to the database file they share.
+    """
+    csv_path = TestParallelIngest.csv_path
+
+    def test_ingest_with_two_processes(self):
+        """
+        Tests whether two worker processes ingest every row once.
+        """
+        out = io.StringIO()
+        call_command('ingest_csv', self.csv_path, processes=2, stdout=out)
+        self.assertIn('Ingested 15 rows', out.getvalue())
+        self.assertEqual(MuseumAPICSV.objects.count(), 15)
+        self.assertEqual(MuseumAPICSV.objects.filter(objectId__in=range(1, 16)).count(), 15)
@@ -0,0 +1,178 @@
+"""
+    Contains tests for search.py
+"""
+
+import io
+import os
+from unittest import mock, skipIf
+
+from django.db import NotSupportedError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from practice_app.ingest import ENGINE_PANDAS, ENGINE_PYTHON, MODE_UPSERT, ingest_csv
+from practice_app.models import MuseumAPICSV
+from practice_app.search import create_search_index, get_search_terms, SearchPage
+
+
+class TestSearch(TestCase):
+    """
+    Tests the full-text search and the upkeep of its index.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            cls.csv_content = file_ptr.read()
+        ingest_csv(io.BytesIO(cls.csv_content))
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('practice_app:search_api'), {'q': query, **params})
+        return response.json()
+
+    def get_ids(self, query, **params):
+        return [row[0] for row in self.search(query, **params)['rows']]
+
+    def test_get_search_terms(self):
+        """
+        Tests whether queries are split into unique lowercase words, dropping
+        the operators of the query syntax.
+        """
+        self.assertEqual(get_search_terms('Liberty "head" -coin* liberty'), ['liberty', 'head', 'coin'])
+        self.assertEqual(get_search_terms(' ( ) '), [])
+        self.assertEqual(get_search_terms(None), [])
+
+    def test_ranked_results(self):
+        """
+        Tests whether every word must match, prefixes match longer words and
+        rows matching in the title rank above those matching elsewhere.
+        """
+        self.assertEqual(sorted(self.get_ids('gobrecht')), [2, 11, 14])
+        self.assertEqual(sorted(self.get_ids('liberty head')), [1, 2, 11, 12, 14])
+        self.assertEqual(sorted(self.get_ids('pra')), [10, 13])
+        self.assertEqual(self.get_ids('mexican silver'), [15])
+        self.assertEqual(self.get_ids('gold mexican'), [])
+
+        MuseumAPICSV.objects.filter(pk=3).update(title='Silver Medal')
+        self.assertEqual(self.get_ids('silver'), [3, 15])
+
+    def test_pages(self):
+        """
+        Tests whether the results are paged and the columns picked.
+        """
+        content = self.search('coin', page_size=6, columns='title')
+        self.assertEqual(content['columns'], ['objectId', 'title'])
+        self.assertEqual(len(content['rows']), 6)
+        self.assertEqual((content['next'], content['previous']), (2, None))
+
+        ids = [row[0] for row in content['rows']]
+        for page in (2, 3):
+            content = self.search('coin', page_size=6, page=page)
+            ids.extend(row[0] for row in content['rows'])
+        self.assertEqual((content['next'], content['previous']), (None, 2))
+        self.assertEqual(sorted(ids), list(range(1, 16)))
+
+        self.assertEqual(self.search('')['rows'], [])
+        self.assertEqual(SearchPage('coin', ['objectId'], page='x').page, 1)
+
+    @override_settings(SEARCH_MAX_RANKED_MATCHES=4)
+    def test_max_ranked_matches(self):
+        """
+        Tests whether only the best SEARCH_MAX_RANKED_MATCHES matches are
+        listed, whatever their place in the index.
+        """
+        content = self.search('coin', page_size=3)
+        self.assertEqual((len(content['rows']), content['next']), (3, 2))
+        content = self.search('coin', page_size=3, page=2)
+        self.assertEqual((len(content['rows']), content['next']), (1, None))
+        self.assertEqual(self.search('coin', page_size=3, page=3)['rows'], [])
+
+        MuseumAPICSV.objects.filter(pk=3).update(medium='Silver')
+        MuseumAPICSV.objects.filter(pk=15).update(title='Silver Medal')
+        with self.settings(SEARCH_MAX_RANKED_MATCHES=1):
+            self.assertEqual(self.get_ids('silver'), [15])
+
+    def test_index_follows_writes(self):
+        """
+        Tests whether edits, deletes and re-ingests are searchable at once.
+        """
+        row = MuseumAPICSV.objects.get(pk=5)
+        row.artistDisplayName = 'Augustus Saint-Gaudens'
+        row.save()
+        self.assertEqual(self.get_ids('gaudens'), [5])
+
+        self.client.post(reverse('practice_app:delete_row', args=[5]))
+        self.assertEqual(self.get_ids('gaudens'), [])
+
+        ingest_csv(io.BytesIO(self.csv_content.replace(b'Silver', b'Bronze')), mode='upsert')
+        self.assertEqual(self.get_ids('bronze'), [15])
+        self.assertEqual(self.get_ids('silver'), [])
+        self.assertIn(5, self.get_ids('dollar'))
+
+    def test_index_follows_bulk_upserts(self):
+        """
+        Tests whether rows renamed by a bulk upsert are found by their new
+        title only, with either ingest engine.
+        """
+        for engine, word, previous in ((ENGINE_PYTHON, 'eagle', 'five'), (ENGINE_PANDAS, 'ducat', 'eagle')):
+            content = self.csv_content.replace(b'Five-dollar Indian Head Coin', f'Quintuple {word}'.encode())
+            ingest_csv(io.BytesIO(content), engine=engine, mode=MODE_UPSERT)
+            self.assertEqual(self.get_ids(word), [13])
+            self.assertNotIn(13, self.get_ids(previous))
+            self.assertEqual(sorted(self.get_ids('pratt')), [10, 13])
+
+    @skipIf(connection.vendor != 'sqlite', 'SQLite only')
+    def test_bulk_load_suspends_triggers_once(self):
+        """
+        Tests whether a bulk load drops the triggers once, not per batch, and
+        creates them again when it ends, whether it succeeds, fails or found
+        one of them missing.
+        """
+        def count_triggers():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'museum_search_%'")
+                return cursor.fetchone()[0]
+
+        with CaptureQueriesContext(connection) as queries:
+            ingest_csv(io.BytesIO(self.csv_content), batch_size=4, mode=MODE_UPSERT)
+        self.assertEqual(sum(query['sql'].startswith('DROP TRIGGER') for query in queries.captured_queries), 3)
+        self.assertEqual(count_triggers(), 3)
+
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER museum_search_update')
+        with self.assertRaises(ValueError):
+            ingest_csv(io.BytesIO(self.csv_content.replace(b'1,False,', b'1,Flase,')), engine=ENGINE_PANDAS)
+        self.assertEqual(count_triggers(), 3)
+
+        MuseumAPICSV.objects.filter(pk=2).update(title='Double Eagle')
+        self.assertEqual(self.get_ids('eagle'), [2])
+
+    def test_create_search_index(self):
+        """
+        Tests whether creating the index again reindexes the rows without
+        duplicating them.
+        """
+        create_search_index(connection)
+        self.assertEqual(sorted(self.get_ids('gobrecht')), [2, 11, 14])
+
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with self.assertRaises(NotSupportedError):
+                create_search_index(connection)
+            with self.assertRaises(NotSupportedError):
+                SearchPage('gobrecht', ['objectId'])
+
+    def test_search_page(self):
+        """
+        Tests whether the search page lists the matching rows.
+        """
+        response = self.client.get(reverse('practice_app:search'), {'q': 'indian'})
+        self.assertEqual(sorted(row[0] for row in response.context['page']), [10, 13])
+        self.assertIsNone(response.context['next_page_url'])
+
+        response = self.client.get(reverse('practice_app:search'), {'q': 'unicorn'})
+        self.assertContains(response, 'No rows match')
@@ -0,0 +1,73 @@
+"""
+    Contains tests for utils.py
+"""
+
+import threading
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from practice_app import utils
+
+
+@mock.patch('practice_app.utils.boto3.session.Session')
+class TestClientCache(TestCase):
+    """
+    Tests the process-wide cache of AWS clients.
+    """
+
+    def setUp(self):
+        """
+        Starts every test with an empty cache.
+        """
+        utils.clear_clients()
+        self.addCleanup(utils.clear_clients)
+
+    def test_clients_are_reused(self, session):
+        """
+        Tests whether a client is built once per service, profile and region.
+        """
+        session.return_value.client.side_effect = lambda *args, **kwargs: object()
+
+        s3 = utils.get_s3_client('default')
+        self.assertIs(utils.get_s3_client('default'), s3)
+        self.assertIsNot(utils.get_sns_client(), s3)
+        self.assertIsNot(utils.get_s3_client('default', 'us-east-1'), s3)
+        self.assertIsNot(utils.get_s3_client('other'), s3)
+        self.assertEqual(session.call_count, 4)
+
+    @override_settings(AWS_MAX_POOL_CONNECTIONS=32)
+    def test_pool_size(self, session):
+        """
+        Tests whether clients are built with the configured connection pool size.
+        """
+        utils.get_sns_client()
+
+        config = session.return_value.client.call_args.kwargs['config']
+        self.assertEqual(config.max_pool_connections, 32)
+
+    def test_concurrent_first_use(self, session):
+        """
+        Tests whether threads asking for the same client at once share it.
+        """
+        session.return_value.client.side_effect = lambda *args, **kwargs: object()
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(utils.get_s3_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(map(id, clients))), 1)
+        self.assertEqual(session.call_count, 1)
+
+    def test_recreated_after_fork(self, session):
+        """
+        Tests whether a forked process builds its own clients.
+        """
+        session.return_value.client.side_effect = lambda *args, **kwargs: object()
+        s3 = utils.get_s3_client()
+
+        with mock.patch('practice_app.utils.os.getpid', return_value=utils._clients_pid + 1):
+            self.assertIsNot(utils.get_s3_client(), s3)
+        self.assertEqual(session.call_count, 2)
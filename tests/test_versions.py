@@ -0,0 +1,128 @@
+"""
+    Contains tests for versions.py
+"""
+
+import os
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from practice_app.ingest import ingest_csv
+from practice_app.models import MuseumAPICSV, TableVersion
+from practice_app.versions import bump_table_version, get_etag, get_table_version
+
+
+@override_settings(NOTIFICATIONS_ASYNC=False)
+class TestTableVersion(TestCase):
+    """
+    Tests the version of the table and the conditional GETs it answers.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        with open(os.path.join(cls.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+
+    def get_urls(self):
+        return (
+            reverse('practice_app:index'),
+            reverse('practice_app:rows_api'),
+            reverse('practice_app:edit_row', args=[1]),
+            reverse('practice_app:export_csv'),
+        )
+
+    def test_bump(self):
+        """
+        Tests whether the version is created on first use and incremented
+        by each bump.
+        """
+        # the ingest of setUpTestData already bumped it
+        TableVersion.objects.all().delete()
+        bump_table_version()
+        version = get_table_version()
+        self.assertEqual(version.version, 1)
+        bump_table_version()
+        bumped = get_table_version()
+        self.assertEqual(bumped.version, 2)
+        self.assertGreaterEqual(bumped.modifiedAt, version.modifiedAt)
+        self.assertNotEqual(get_etag(bumped), get_etag(version))
+
+    def test_not_modified(self):
+        """
+        Tests whether the responses carry the ETag and Last-Modified of the
+        table, and whether clients sending them back get 304 without the
+        rows being read.
+        """
+        etag = get_etag(get_table_version())
+        for url in self.get_urls():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response['ETag'], etag, url)
+            self.assertIn('Last-Modified', response, url)
+
+            # the version is the only row read
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'')
+
+            last_modified = self.client.get(url)['Last-Modified']
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_writes_change_version(self):
+        """
+        Tests whether saves, deletes and ingests change the ETag in the
+        transaction writing the rows, without waiting for on-commit
+        callbacks.
+        """
+        etag = self.client.get(reverse('practice_app:rows_api'))['ETag']
+
+        def assert_modified():
+            nonlocal etag
+            response = self.client.get(reverse('practice_app:rows_api'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+        obj = MuseumAPICSV.objects.get(pk=1)
+        obj.title = 'Renamed'
+        obj.save()
+        assert_modified()
+
+        self.client.post(reverse('practice_app:delete_row', args=[1]))
+        assert_modified()
+
+        with open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        assert_modified()
+
+    def test_rolled_back_write_keeps_version(self):
+        """
+        Tests whether the version bumped by a write rolls back with it.
+        """
+        version = get_table_version().version
+        obj = MuseumAPICSV.objects.get(pk=1)
+        obj.title = 'Renamed'
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            obj.save()
+            self.assertEqual(get_table_version().version, version + 1)
+            raise IntegrityError('rolled back')
+        self.assertEqual(get_table_version().version, version)
+
+    def test_unchanged_ingest_keeps_version(self):
+        """
+        Tests whether ingesting rows that are already stored leaves the
+        ETag alone.
+        """
+        etag = get_etag(get_table_version())
+        with self.captureOnCommitCallbacks(execute=True), \
+                open(os.path.join(self.base_dir, 'museum_data.csv'), 'rb') as file_ptr:
+            ingest_csv(file_ptr)
+        response = self.client.get(reverse('practice_app:export_csv'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
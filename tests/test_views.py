@@ -8,14 +8,16 @@ import logging
 import os
 import sys
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from practice_app.models import MuseumAPICSV
+from practice_app.models import CSVUploadJob, JOB_STATUS_FAILED, MuseumAPICSV
 
+os.makedirs('tests/logs', exist_ok=True)
 logging.basicConfig(
     filename='tests/logs/test_views_error.log',
     level=logging.ERROR,
@@ -122,6 +124,13 @@ class TestListCSVContentView(TestCase):
         """
         populate_tmp_data(os.path.join(cls.base_dir, 'museum_data.csv'))
 
+    def setUp(self):
+        """
+        Starts every test with an empty cache: writes rolled back by other
+        tests never increment the version of the table.
+        """
+        cache.clear()
+
     def test_url_exists(self):
         """
         Tests whether the url exists and is a valid url.
@@ -161,6 +170,88 @@ class TestListCSVContentView(TestCase):
         self.assertTrue(response.context['headings'], headings)
         self.assertTrue(response.context['csv_objs'], museum_api_csv_objs)
 
+    @override_settings(CSV_LIST_PAGE_SIZE=4)
+    def test_keyset_pagination(self):
+        """
+        Tests whether the rows are listed page by page using the next and
+        previous cursors.
+        """
+        response = self.client.get(reverse('practice_app:index'))
+        page = response.context['page']
+        self.assertEqual([row[0] for row in page], [1, 2, 3, 4])
+        self.assertIsNone(response.context['previous_page_url'])
+        self.assertEqual(response.context['next_page_url'], '?after=4')
+
+        response = self.client.get(reverse('practice_app:index'), {'after': 12})
+        page = response.context['page']
+        self.assertEqual([row[0] for row in page], [13, 14, 15])
+        self.assertIsNone(response.context['next_page_url'])
+        self.assertEqual(response.context['previous_page_url'], '?before=13')
+
+        response = self.client.get(reverse('practice_app:index'), {'before': 13})
+        self.assertEqual([row[0] for row in response.context['page']], [9, 10, 11, 12])
+        self.assertEqual(response.context['next_page_url'], '?after=12')
+
+        response = self.client.get(reverse('practice_app:index'), {'before': 4})
+        self.assertEqual([row[0] for row in response.context['page']], [1, 2, 3])
+        self.assertIsNone(response.context['previous_page_url'])
+
+    def test_page_size_is_clamped(self):
+        """
+        Tests whether page_size from the query string is honoured up to
+        CSV_LIST_MAX_PAGE_SIZE and invalid values fall back to the default.
+        """
+        response = self.client.get(reverse('practice_app:index'), {'page_size': 2})
+        self.assertEqual(len(response.context['page']), 2)
+        self.assertEqual(response.context['next_page_url'], '?page_size=2&after=2')
+
+        with self.settings(CSV_LIST_MAX_PAGE_SIZE=5):
+            response = self.client.get(reverse('practice_app:index'), {'page_size': 1000})
+            self.assertEqual(len(response.context['page']), 5)
+
+        response = self.client.get(reverse('practice_app:index'), {'page_size': 'abc', 'after': 'abc'})
+        self.assertEqual(len(response.context['page']), 15)
+
+    def test_column_projection(self):
+        """
+        Tests whether only the picked columns are queried and rendered, in
+        model order, with objectId always included.
+        """
+        response = self.client.get(reverse('practice_app:index'), {'columns': ['title', 'department', 'unknown']})
+        self.assertEqual(response.context['headings'], ['objectId', 'department', 'title'])
+        row = response.context['page'].object_list[0]
+        obj = MuseumAPICSV.objects.get(pk=1)
+        self.assertEqual(row, (1, obj.department, obj.title))
+        self.assertNotContains(response, f'<td>{obj.accessionNumber}</td>', html=True)
+
+        response = self.client.get(reverse('practice_app:index'), {'columns': 'accessionNumber,title'})
+        self.assertEqual(response.context['headings'], ['objectId', 'accessionNumber', 'title'])
+        self.assertContains(response, f'<td>{obj.accessionNumber}</td>', html=True)
+
+    def test_default_columns(self):
+        """
+        Tests whether CSV_LIST_DEFAULT_COLUMNS is shown when no valid
+        columns are picked.
+        """
+        with self.settings(CSV_LIST_DEFAULT_COLUMNS=['title']):
+            response = self.client.get(reverse('practice_app:index'), {'columns': 'unknown'})
+        self.assertEqual(response.context['headings'], ['objectId', 'title'])
+
+    def test_rows_api(self):
+        """
+        Tests whether the rows api returns the picked columns of a page
+        together with its cursors.
+        """
+        response = self.client.get(reverse('practice_app:rows_api'),
+                                   {'columns': 'title', 'page_size': 2, 'after': 2})
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        self.assertEqual(content['columns'], ['objectId', 'title'])
+        self.assertEqual([row[0] for row in content['rows']], [3, 4])
+        self.assertEqual(content['rows'][0][1], MuseumAPICSV.objects.get(pk=3).title)
+        self.assertEqual(content['next'], 4)
+        self.assertEqual(content['previous'], 3)
+
     def test_response_invalid_for_disallowed_methods(self):
         """
         Tests whether the response is not ok when request method is
@@ -248,6 +339,7 @@ class TestCSVRowDeleteView(TestCase):
         self.assertNotEqual(response.status_code, 200)
 
 
+@override_settings(CSV_UPLOAD_JOBS_ASYNC=False)
 class TestCSVUploadFileView(TestCase):
     """
     Tests functionality of csv_file_upload_view function.
@@ -306,6 +398,23 @@ class TestCSVUploadFileView(TestCase):
         })
         self.assertEqual(response.status_code, 302)
 
+    def test_upload_csv_file_with_invalid_header(self):
+        """
+        Tests whether the upload job fails with the validation error instead
+        of ingesting a CSV file whose header does not match the model.
+        """
+        file_obj = SimpleUploadedFile('museum_data.csv', 'objectID,title\n1,Coin\n'.encode())
+        count = MuseumAPICSV.objects.count()
+
+        response = self.client.post(reverse('practice_app:upload_csv'), data={
+            'csv_file': [file_obj]
+        })
+        self.assertEqual(response.status_code, 302)
+        job = CSVUploadJob.objects.get()
+        self.assertEqual(job.status, JOB_STATUS_FAILED)
+        self.assertIn('missing required columns', job.error)
+        self.assertEqual(MuseumAPICSV.objects.count(), count)
+
     def test_upload_non_csv(self):
         """
         Test whether the view raises ValidationError when user tries to upload a
@@ -526,3 +635,39 @@ class TestCSVAddNewRowView(TestCase):
         self.assertNotEqual(response.status_code, 200)
         response = self.client.patch(endpoint)
         self.assertNotEqual(response.status_code, 200)
+
+
+class TestExportCSVView(TestCase):
+    """
+    Tests the functionality of export_csv_view function.
+    """
+    base_dir = os.path.abspath('tests/Truth/')
+
+    @classmethod
+    def setUpTestData(cls):
+        """
+        Sets up temporary data in the test database for testing.
+        """
+        populate_tmp_data(os.path.join(cls.base_dir, 'museum_data.csv'))
+
+    def test_export_csv(self):
+        """
+        Tests whether the whole table is streamed as a CSV attachment.
+        """
+        response = self.client.get(reverse('practice_app:export_csv'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8').splitlines()))
+        self.assertEqual(rows[0][0], 'objectId')
+        self.assertEqual([int(row[0]) for row in rows[1:]], list(range(1, 16)))
+
+    def test_response_invalid_for_disallowed_methods(self):
+        """
+        Tests whether the response is not ok when request method is
+        not get.
+        """
+        response = self.client.post(reverse('practice_app:export_csv'))
+        self.assertNotEqual(response.status_code, 200)